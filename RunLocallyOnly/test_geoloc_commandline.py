@@ -1,20 +1,21 @@
 import pytest
+import json
 import subprocess
 
 
 class TestGeolocUtil:
     @pytest.mark.parametrize("locations, expected_output", [
-        (["123, MI"], "Location: Škofljica"),
+        (["123, MI"], "Invalid location: Invalid city name: 123"),
         (["12345", "02135", "10001"], "Location: Schenectady"),
-        (["qweqeqeqwe,qweqweq"], "No data found for http://api.openweathermap.org/geo/1.0/direct?q=qweqeqeqwe"),
+        (["qweqeqeqwe,qweqweq"], "Invalid location: Invalid State Code: qweqweq"),
         (["Columbus, OH"], "Location: Columbus, Ohio"),
         (["Columbus, OH", "Chicago, IL"], "Location: Columbus, Ohio"),
-        ([";;;;;"], "Location: Unknown"),
-        ([""], "Location: Unknown"),
-        (["123123123123"], "Location: Unknown"),
+        ([";;;;;"], "Invalid location: Invalid ZIP code: ;;;;;"),
+        ([""], "Invalid location: Empty location"),
+        (["123123123123"], "Invalid location: Invalid ZIP code: 123123123123"),
         (["12312"], "Location: Unknown"),
         (["90210"], "Location: Beverly Hills"),
-        (["9021090210"], "Location: Unknown"),
+        (["9021090210"], "Invalid location: Invalid ZIP code: 9021090210"),
         (["9 0 2 1 0"], "Location: Beverly Hills"),
         (["<<9 0 2 1 0>>"], "Location: Beverly Hills"),
         (["Columbus, OH", "Chicago, IL", "12345", "02135", "10001", "123123123123"], "Location: Columbus, Ohio")
@@ -31,4 +32,16 @@ class TestGeolocUtil:
 
         # Validate expected output
         actual_output = result.stdout.strip().split("\n")  # Normalize output for comparison
-        assert any(expected_output in line for line in actual_output), f"Expected {expected_output}, but got {actual_output}"
\ No newline at end of file
+        assert any(expected_output in line for line in actual_output), f"Expected {expected_output}, but got {actual_output}"
+    @pytest.mark.parametrize("locations, expected_rows", [
+        (["Columbus, OH"], [{"name": "Columbus", "state": "Ohio"}]),
+        (["12345", "02135"], [{"name": "Schenectady", "state": "New York"}, {"name": "Boston", "state": "Massachusetts"}]),
+    ])
+    def test_geoloc_jsonl_output(self, locations, expected_rows):
+        # Structured output can be parsed directly instead of scraping the text layout
+        cmd = ["python", "../Utility/geoloc_util.py", "--format", "jsonl", "--locations"] + locations
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        assert result.returncode == 0, f"Script failed for input {locations}"
+
+        rows = [json.loads(line) for line in result.stdout.splitlines()]
+        assert [{"name": row["name"], "state": row["state"]} for row in rows] == expected_rows
@@ -0,0 +1,345 @@
+# Asyncio counterpart of GeoLocationUtility for services that already run an event loop.
+# Requires aiohttp (see requirements.txt); the sync utility works without it.
+
+import asyncio
+import copy
+import sys
+import time
+import aiohttp
+from geoloc_breaker import FATAL_STATUSES, CircuitOpenError
+from geoloc_decode import decode_response
+from geoloc_io import ResultWriter
+from geoloc_parser import InvalidLocationError
+from geoloc_timeouts import DeadlineExceeded, deadline, remaining, request_timeout
+from geoloc_util import BaseGeoLocationUtility
+
+
+class AsyncGeoLocationUtility(BaseGeoLocationUtility):
+    """Non-blocking geolocation utility. At most max_concurrency requests are in flight at once."""
+
+    def __init__(self, api_key, cache=None, max_concurrency=100, **options):
+        """max_concurrency bounds the requests in flight; options are BaseGeoLocationUtility's."""
+        super().__init__(api_key, cache=cache, **options)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        self._inflight = {}  # cache_key -> Task of the request in flight, shared by concurrent callers
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Closes the aiohttp session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # The session has to be created inside a running event loop, so it is built on first use
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def fetch_state_from_lat_lon(self, lat, lon):
+        with self.metrics.timer('parse'):
+            url, cache_key = self.build_reverse_query(lat, lon)
+
+        # Make the API request
+        response = await self._make_api_request(url, cache_key=cache_key)
+        return self._reverse_result(lat, lon, response)
+
+    async def fetch_location_data(self, location):
+        """Fetches location data based on city/state or zip code. Returns None for input that is neither."""
+        self.metrics.increment('lookups')
+        with self.metrics.timer('lookup'):
+            try:
+                with self.metrics.timer('parse'):
+                    url, cache_key, query = self.build_location_query(location)
+            except InvalidLocationError as e:
+                return self._invalid_location(e)
+
+            local = self.lookup_offline(location)
+            if local is not None:
+                return local
+
+            # Make the API request
+            response = self._api_miss(location, await self._make_api_request(url, cache_key=cache_key))
+            return self._location_result(query, response)
+
+    async def _make_api_request(self, url, cache_key=None):
+        """Helper function to make API request and handle errors."""
+        found, data = self._cached_response(cache_key)
+        if found or self.offline:
+            return data
+
+        if cache_key is None:
+            return await self._request_uncached(url, cache_key)
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            # Someone is already fetching this query; wait for theirs and take a private copy
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = self._inflight[cache_key] = asyncio.ensure_future(self._request_uncached(url, cache_key))
+        try:
+            # Shielded so a cancelled caller doesn't cancel the request others are waiting on
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(cache_key) is task:
+                del self._inflight[cache_key]
+
+    async def _request_uncached(self, url, cache_key):
+        """Sends the request (with rate limiting and retries) and caches the decoded response."""
+        if isinstance(url, tuple):
+            return await self._request_routed(url, cache_key)
+        try:
+            for attempt in range(self.retry_policy.max_retries + 1):
+                if not self._breaker_allows():
+                    return self._fail_fast(cache_key)
+                recorded = False
+                try:
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.acquire_async()
+
+                    async with self._semaphore:
+                        self.metrics.increment('requests')
+                        with self.metrics.timer('network'):
+                            status, retry_after, body = await self._send(url)
+                    self._record_response(status)
+                    recorded = True
+                finally:
+                    if not recorded:  # Raised or cancelled before an outcome, e.g. DeadlineExceeded
+                        self._release_probe()
+                if not self.retry_policy.retryable(status):
+                    break
+
+                # Back off outside the semaphore so the slot is free for other lookups meanwhile
+                if attempt == self.retry_policy.max_retries:
+                    return self._retries_exhausted(status, cache_key)
+                self.metrics.increment('retries')
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+            if status >= 400:
+                self.metrics.increment('error_responses')
+            with self.metrics.timer('decode'):
+                # Decoded from the body rather than by content type: the API does not always
+                # send application/json on error bodies
+                data = decode_response(status, body, self.local_names)
+
+            if not data:
+                print(f"No data found for {url}.", file=sys.stderr)
+                self._store_in_cache(cache_key, None)
+                return None
+
+            self._store_in_cache(cache_key, data)
+            return data
+
+        except DeadlineExceeded:
+            raise  # A TimeoutError, but one for the whole lookup rather than this request
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return self._request_failed(e, cache_key)
+
+    async def _request_routed(self, request, cache_key):
+        """Sends an (endpoint, query) request to the router's backends, moving on from one that fails.
+
+        The async counterpart of GeoLocationUtility._request_routed.
+        """
+        endpoint, query = request
+        for attempt in range(self.retry_policy.max_retries + 1):
+            status = error = rejected = retry_after = None
+            refused = False
+            for backend in self.router.order():
+                if not self.router.allow(backend):
+                    refused = True
+                    continue
+                if not self._breaker_allows():
+                    self.router.release(backend)
+                    return self._fail_fast(cache_key)
+                start = time.perf_counter()
+                recorded = False
+                try:
+                    try:
+                        answer = await self._ask(backend, endpoint, query)
+                    except DeadlineExceeded:
+                        raise
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        self._routed_error(backend, e)
+                        recorded = True
+                        status, error = None, e
+                        continue
+                    if answer is None:
+                        self.router.record_miss(backend)
+                        continue  # Not something this backend knows; ask the next one
+                    answer_status, answer_retry_after, data = answer
+                    failed = self._routed_attempt(backend, answer_status, time.perf_counter() - start)
+                    recorded = True
+                finally:
+                    if not recorded:  # No answer, or raised before one (e.g. DeadlineExceeded)
+                        self._release_probe()
+                        self.router.release(backend)
+                if not failed:
+                    return self._routed_result(request, cache_key, data)
+                if answer_status in FATAL_STATUSES:
+                    rejected = data
+                else:
+                    status, retry_after, error = answer_status, answer_retry_after, None
+
+            if (status is None and error is None) or attempt == self.retry_policy.max_retries:
+                return self._routing_failed(request, cache_key, status, error, rejected, refused)
+            self.metrics.increment('retries')
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def _ask(self, backend, endpoint, query):
+        """One attempt at a backend: (status, Retry-After, records), or None when an in-process backend has no answer."""
+        if backend.in_process:
+            # Their answer() may block, so it runs off the event loop like any other synchronous call
+            return await asyncio.to_thread(self._answer_in_process, backend, endpoint, query)
+        rate_limiter = backend.rate_limiter or self.rate_limiter
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async()
+        async with self._semaphore:
+            self.metrics.increment('requests')
+            with self.metrics.timer('network'):
+                status, retry_after, body = await self._send(backend.url(endpoint, query))
+        if self.retry_policy.retryable(status):
+            return status, retry_after, None
+        if status >= 400:
+            self.metrics.increment('error_responses')
+        with self.metrics.timer('decode'):
+            return status, None, decode_response(status, body, self.local_names)
+
+    async def _get(self, url, timeout):
+        async with self._get_session().get(url, timeout=timeout) as response:
+            return response.status, response.headers.get('Retry-After'), await response.read()
+
+    async def _send(self, url):
+        """GETs url within the timeouts and the batch deadline, returning (status, Retry-After, body).
+
+        With a HedgePolicy, a second copy is sent if the first is slow; the first response wins
+        and the other copy is cancelled.
+        """
+        connect, read = request_timeout(self.connect_timeout, self.read_timeout)
+        timeout = aiohttp.ClientTimeout(total=remaining(), sock_connect=connect, sock_read=read)
+        if self.hedge is None:
+            return await self._get(url, timeout)
+
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self._get(url, timeout))
+        primary.add_done_callback(lambda future: not future.cancelled() and future.exception() is None
+                                  and self.hedge.observe(time.perf_counter() - start))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge.delay())
+        if done or not self.hedge.should_hedge():
+            return await primary
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        self.metrics.increment('hedges')
+        backup = asyncio.ensure_future(self._get(url, timeout))
+        pending = {primary, backup}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None or not pending:
+                        if future is backup:
+                            self.metrics.increment('hedge_wins')
+                        return future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def resolve_state(self, lat, lon):
+        """Returns the state name for a coordinate, answering offline when possible."""
+        state = self.lookup_state_offline(lat, lon)
+        if state:
+            return state
+        try:
+            return self._state_from_reverse(await self.fetch_state_from_lat_lon(lat, lon))
+        except (DeadlineExceeded, CircuitOpenError):
+            return 'Unknown'
+
+    async def enrich_states(self, results):
+        """Fills in missing states for a whole batch, resolving each distinct coordinate once."""
+        with self.metrics.timer('enrich'):
+            pending = self._pending_states(results)
+            states = await asyncio.gather(*(self.resolve_state(lat, lon) for lat, lon in pending))
+            self._apply_states(pending, states)
+        return results
+
+    async def enrich_location_data(self, location_data):
+        """Fills in the state for results that came back without one (e.g. zip code lookups)."""
+        await self.enrich_states([location_data])
+        return location_data
+
+    async def display_location_data(self, location_data):
+        """Displays the fetched location data."""
+        await self.enrich_location_data(location_data)
+        self.print_location_data(location_data)
+
+    async def _fetch_result(self, location):
+        """Fetches a single location, capturing any error instead of raising it."""
+        try:
+            data = await self.fetch_location_data(location)
+        except Exception as e:
+            return {'location': location, 'data': None, 'error': str(e)}
+        return self._located(location, data)
+
+    async def resolve_location(self, location):
+        """Fetches and enriches a single location, capturing any error instead of raising it."""
+        with deadline(self.batch_deadline):
+            result = await self._fetch_result(location)
+            await self.enrich_states([result['data']])
+        return result
+
+    async def resolve_many(self, locations):
+        """Resolves many locations concurrently, returning results in input order.
+
+        With a batch_deadline, lookups that would start or retry after it fail with "deadline exceeded".
+        """
+        with deadline(self.batch_deadline):
+            return await self._resolve_batch(locations)
+
+    async def _resolve_batch(self, locations):
+        locations = list(locations)  # Walked twice below, so a generator must be materialized first
+        unique, keys, positions = self._dedupe_batch(locations)
+        results, pending = self._replay_journal(unique, keys)
+        # The semaphore in _make_api_request bounds the network work, so every location can be scheduled up front
+        fetched = await asyncio.gather(*(self._fetch_result(unique[index]) for index in pending))
+        await self.enrich_states([result['data'] for result in fetched])
+        results = self._record_journal(results, keys, pending, fetched)
+        return self._spread_batch(locations, positions, results)
+
+    async def reverse_many(self, points):
+        """Reverse geocodes many points concurrently, returning results in input order.
+
+        As with the sync utility, points are snapped to reverse_precision decimal places and each
+        distinct grid point is looked up once, offline when the polygon indexes can answer.
+        """
+        with deadline(self.batch_deadline):
+            locations, unique, positions = self._snap_batch(points)
+            answers, pending = self._reverse_offline_batch(unique)
+            fetched = await asyncio.gather(*(self._fetch_reverse(unique[index]) for index in pending))
+            for index, answer in zip(pending, fetched):
+                answers[index] = answer
+        return self._reverse_results(locations, positions, answers)
+
+    async def _fetch_reverse(self, point):
+        """Looks up one point with /reverse, capturing any error instead of raising it."""
+        try:
+            return {'data': await self.fetch_state_from_lat_lon(*point), 'error': None}
+        except Exception as e:
+            return {'data': None, 'error': str(e)}
+
+    async def process_locations(self, locations, output_format='text', stream=None):
+        """Process and display location data for multiple locations, returning the structured results."""
+        results = await self.resolve_many(locations)
+        writer = ResultWriter(stream if stream is not None else sys.stdout, output_format)
+        for result in results:
+            writer.write(result)
+        writer.flush()
+        return results
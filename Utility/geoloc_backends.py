@@ -0,0 +1,279 @@
+# Geocoding backends and the router that spreads lookups over them. Without a router the utility
+# sends every request to one OpenWeatherMap base_url, so its throughput is one API key's quota and
+# its latency one provider's. A BackendRouter holds several backends: more OpenWeatherMap keys or
+# servers, the in-process MockBackend, or the OfflineBackend over local data. It tries them in
+# failover, round-robin or latency order, moving on from a backend that fails, and stops sending to
+# one that keeps failing until it recovers.
+#
+#   python geoloc_util.py --backend https://api.openweathermap.org/geo/1.0 \
+#       --backend API_KEY_2=https://api.openweathermap.org/geo/1.0 --route round-robin --input addresses.txt
+#   python geoloc_util.py --backend mock --input addresses.txt            # No network at all
+#
+# A backend has a name and either url(endpoint, query), for one the utility sends HTTP requests to,
+# or answer(endpoint, query) returning (status, decoded body), or None when it doesn't know, for one
+# that answers in process. endpoint is 'direct' (query "City, State Name"), 'zip' (query "12345")
+# or 'reverse' (query (lat, lon)).
+
+import random
+import threading
+import time
+from collections import Counter
+from geoloc_breaker import CircuitBreaker
+
+DEFAULT_BASE_URL = "https://api.openweathermap.org/geo/1.0"
+STRATEGIES = ('failover', 'round-robin', 'latency')
+LATENCY_WEIGHT = 0.2  # Weight of the newest sample in each backend's moving average latency
+FAILURE_LATENCY = 10.0  # Seconds a failed attempt counts as in that average, so failing backends sink
+
+
+def api_url(base_url, api_key, endpoint, query):
+    """The OpenWeatherMap Geocoding API URL for a request."""
+    if endpoint == 'direct':
+        return f"{base_url}/direct?q={query}&limit=1&appid={api_key}"
+    if endpoint == 'zip':
+        return f"{base_url}/zip?zip={query},US&appid={api_key}"
+    lat, lon = query
+    return f"{base_url}/reverse?lat={lat}&lon={lon}&limit=1&appid={api_key}"
+
+
+class OpenWeatherMapBackend:
+    """The OpenWeatherMap Geocoding API, or another server speaking it such as geoloc_mockserver.py.
+
+    Give each API key its own backend to use each key's quota. rate_limiter, an optional
+    TokenBucket, holds this backend to its quota; the utility's own rate_limiter is used otherwise.
+    """
+
+    in_process = False
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, name=None, rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.name = name or self.base_url.split('://')[-1].split('/')[0]
+        self.rate_limiter = rate_limiter
+
+    def url(self, endpoint, query):
+        return api_url(self.base_url, self.api_key, endpoint, query)
+
+    def __repr__(self):
+        return f"OpenWeatherMapBackend({self.name!r})"
+
+
+class MockBackend:
+    """Answers like geoloc_mockserver.py, in process: deterministic places, no sockets, no API key.
+
+    latency seconds are slept before every answer and error_rate of them are 503s, so failover and
+    latency routing can be tested; seed makes the errors reproducible. requests counts the answers
+    per endpoint, like MockGeocodingServer.requests.
+    """
+
+    in_process = True
+
+    def __init__(self, name='mock', latency=0.0, error_rate=0.0, seed=None):
+        from geoloc_mockserver import ANSWERS  # Shares the mock server's answers; http.server comes with it
+
+        self._answers = ANSWERS
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+
+    def answer(self, endpoint, query):
+        self.requests[f"/{endpoint}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return 503, {'cod': 503, 'message': 'Service unavailable'}
+        if endpoint == 'direct':
+            params = {'q': query}
+        elif endpoint == 'zip':
+            params = {'zip': f"{query},US"}
+        else:
+            params = {'lat': query[0], 'lon': query[1]}
+        return self._answers[f"/{endpoint}"](params)
+
+    def __repr__(self):
+        return f"MockBackend({self.name!r})"
+
+
+class OfflineBackend:
+    """Answers from local files: a Gazetteer for cities and ZIPs, polygon indexes for reverse lookups.
+
+    Anything they don't cover is left to the next backend, so it can sit in front of the API (as
+    the utility's gazetteer does) or behind it, to keep answering while every provider is down.
+    """
+
+    in_process = True
+
+    def __init__(self, gazetteer=None, state_index=None, place_index=None, name='offline'):
+        self.gazetteer = gazetteer
+        self.state_index = state_index
+        self.place_index = place_index
+        self.name = name
+
+    def answer(self, endpoint, query):
+        if endpoint == 'reverse':
+            return self._reverse(*query)
+        if self.gazetteer is None:
+            return None
+        if endpoint == 'zip':
+            record = self.gazetteer.lookup_zip(query)
+        else:
+            city, _, state = query.rpartition(', ')
+            record = self.gazetteer.lookup_city(city, state)
+        return None if record is None else (200, [record])
+
+    def _reverse(self, lat, lon):
+        state = self.state_index.lookup(lat, lon) if self.state_index is not None else None
+        place = self.place_index.lookup_feature(lat, lon) if self.place_index is not None else None
+        if state is None and place is not None:
+            state = place[1].get('state')
+        if state is None:
+            return None
+        record = {'lat': lat, 'lon': lon, 'country': 'US', 'state': state}
+        if place is not None:
+            record['name'] = place[0]
+        return 200, [record]
+
+    def __repr__(self):
+        return f"OfflineBackend({self.name!r})"
+
+
+class _BackendState:
+    """What the router knows about one backend."""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.latency = None  # Moving average of attempts, in seconds; failures count as FAILURE_LATENCY
+        self.requests = 0
+        self.failures = 0
+        self.misses = 0  # Requests an in-process backend had no answer for
+
+
+class BackendRouter:
+    """Picks the backends a request goes to, and in what order.
+
+    'failover' tries them in the order given, so the first takes all the traffic while it is
+    healthy. 'round-robin' starts each request at the next backend, spreading the load over their
+    quotas. 'latency' tries the backend with the lowest moving average latency first, counting a
+    failure as FAILURE_LATENCY; one not tried yet goes first, so each gets measured, and one that
+    has only ever had no answer goes last. Each backend has its own CircuitBreaker
+    (failure_rate, min_requests and reset_timeout are passed to it): a backend that keeps failing,
+    or rejects the API key, is skipped until a probe finds it working again.
+    """
+
+    def __init__(self, backends, strategy='failover', failure_rate=0.5, min_requests=5, reset_timeout=30.0):
+        if not backends:
+            raise ValueError("a router needs at least one backend")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r}; expected one of {', '.join(STRATEGIES)}")
+        self.backends = list(backends)
+        self.strategy = strategy
+        self._states = {id(backend): _BackendState(CircuitBreaker(failure_rate=failure_rate,
+                                                                  min_requests=min_requests,
+                                                                  reset_timeout=reset_timeout))
+                        for backend in self.backends}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def order(self):
+        """The backends to try for one request, best first."""
+        if self.strategy == 'round-robin':
+            with self._lock:
+                start = self._next
+                self._next = (self._next + 1) % len(self.backends)
+            return self.backends[start:] + self.backends[:start]
+        if self.strategy == 'latency':
+            return sorted(self.backends, key=self._latency)
+        return list(self.backends)
+
+    def _latency(self, backend):
+        state = self._states[id(backend)]
+        if state.latency is not None:
+            return state.latency
+        return float('inf') if state.misses else 0.0
+
+    def allow(self, backend):
+        """True when a request may go to backend now (its circuit is closed, or it is due a probe)."""
+        return self._states[id(backend)].breaker.allow()
+
+    def release(self, backend):
+        """Gives back a probe allow() handed out for an attempt that ended with no outcome."""
+        self._states[id(backend)].breaker.release()
+
+    def record_success(self, backend, seconds):
+        state = self._states[id(backend)]
+        with self._lock:
+            state.requests += 1
+            state.latency = _moving_average(state.latency, seconds)
+        state.breaker.record_success()
+
+    def record_failure(self, backend, reason, fatal=False):
+        """Counts a failed attempt: a 429 or 5xx, a network error, or with fatal=True a rejected key."""
+        state = self._states[id(backend)]
+        with self._lock:
+            state.requests += 1
+            state.failures += 1
+            state.latency = _moving_average(state.latency, FAILURE_LATENCY)
+        state.breaker.record_failure(reason, fatal=fatal)
+
+    def record_miss(self, backend):
+        """Counts a request an in-process backend had no answer for; it is neither a success nor a failure."""
+        state = self._states[id(backend)]
+        with self._lock:
+            state.misses += 1
+
+    def snapshot(self):
+        """{backend name: {'state', 'latency_ms', 'requests', 'failures'}}, e.g. for /healthz."""
+        snapshot = {}
+        for backend in self.backends:
+            state = self._states[id(backend)]
+            snapshot[backend.name] = {
+                'state': state.breaker.state,
+                'latency_ms': None if state.latency is None else round(state.latency * 1000, 3),
+                'requests': state.requests,
+                'failures': state.failures,
+            }
+        return snapshot
+
+
+def _moving_average(average, sample):
+    return sample if average is None else LATENCY_WEIGHT * sample + (1 - LATENCY_WEIGHT) * average
+
+
+def parse_backend(spec):
+    """argparse type for --backend: "mock", "offline", or an API root URL, optionally as KEY_VAR=URL.
+
+    KEY_VAR names the environment variable holding that backend's API key (default API_KEY).
+    Returns (kind, url, key_var).
+    """
+    import argparse
+
+    if spec in ('mock', 'offline'):
+        return spec, None, None
+    key_var, url = 'API_KEY', spec
+    if not spec.startswith(('http://', 'https://')):  # A URL may hold '=' in its query string
+        key_var, _, url = spec.partition('=')
+    if not url.startswith(('http://', 'https://')) or not key_var.isidentifier():
+        raise argparse.ArgumentTypeError(f'expected "mock", "offline", URL or KEY_VAR=URL, got {spec!r}')
+    return 'api', url, key_var
+
+
+def build_backends(specs, environ, gazetteer=None, state_index=None, place_index=None):
+    """The backends for parsed --backend specs; API keys are read from environ (e.g. os.environ)."""
+    backends = []
+    names = Counter()
+    for kind, url, key_var in specs:
+        if kind == 'mock':
+            backend = MockBackend()
+        elif kind == 'offline':
+            backend = OfflineBackend(gazetteer, state_index, place_index)
+        else:
+            backend = OpenWeatherMapBackend(environ.get(key_var), url)
+            if key_var != 'API_KEY':
+                backend.name = f"{backend.name} ({key_var})"
+        names[backend.name] += 1
+        if names[backend.name] > 1:  # Names identify backends in /healthz, so keep them apart
+            backend.name = f"{backend.name} #{names[backend.name]}"
+        backends.append(backend)
+    return backends
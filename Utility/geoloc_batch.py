@@ -0,0 +1,215 @@
+# Multi-process batch runner for very large input files. The input is split into chunks that a
+# pool of worker processes resolve in parallel, each with its own utility and connection pool, so
+# parsing, JSON decoding and output formatting use every core rather than one.
+#
+# Workers write each finished chunk to a part file in a work directory next to the output; the
+# coordinator appends the parts to the output strictly in input order and records its progress
+# in a checkpoint. After a crash the same command picks up from the checkpoint: merged chunks and
+# chunks whose part file is complete are never queried again.
+#
+#   python geoloc_util.py --input addresses.txt --output results.jsonl --format jsonl \
+#       --workers 8 --concurrency 8 --rate-limit 50/s
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from itertools import islice
+from multiprocessing.managers import BaseManager, BaseProxy
+from multiprocessing.util import Finalize
+from geoloc_io import ResultWriter, read_locations
+from geoloc_ratelimit import TokenBucket
+
+DEFAULT_CHUNK_SIZE = 10000
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+class _TokenBucketProxy(BaseProxy):
+    """Worker-side handle on the coordinator's TokenBucket.
+
+    The token is reserved in the coordinator, which keeps one budget for every worker, but the
+    wait happens in the worker so a slow caller never holds up the others.
+    """
+
+    _exposed_ = ('_reserve',)
+
+    def acquire(self):
+        wait_seconds = self._callmethod('_reserve')
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+class RateBudgetManager(BaseManager):
+    """Serves one TokenBucket from a helper process so worker processes share a single request rate."""
+
+
+RateBudgetManager.register('TokenBucket', TokenBucket, proxytype=_TokenBucketProxy)
+
+
+# Set in each worker process by _init_worker: (utility, concurrency)
+_worker = None
+
+
+def _init_worker(utility_factory, concurrency, rate_limiter):
+    global _worker
+    resources = ExitStack()
+    utility = resources.enter_context(utility_factory(resources, rate_limiter=rate_limiter))
+    # Worker processes skip atexit handlers; a multiprocessing finalizer still runs on exit
+    Finalize(None, resources.close, exitpriority=10)
+    _worker = (utility, concurrency)
+
+
+def _resolve_chunk(index, locations, path, output_format, reverse=False):
+    """Resolves one chunk in a worker and writes it to path, atomically, so a part is complete or absent."""
+    utility, concurrency = _worker
+    resolve_many = utility.reverse_many if reverse else utility.resolve_many
+    temporary = path + ".tmp"
+    with open(temporary, 'w', encoding='utf-8', newline='') as stream:
+        # Only the first chunk carries the CSV header, so the merged parts form one CSV file
+        writer = ResultWriter(stream, output_format, header=index == 0)
+        for result in resolve_many(locations, max_concurrency=concurrency):
+            writer.write(result)
+        writer.flush()
+    os.replace(temporary, path)
+    return len(locations)
+
+
+class BatchJob:
+    """Resolves input_path into output_path with a pool of worker processes, resuming from a checkpoint.
+
+    utility_factory(resources, rate_limiter=...) is called once in every worker to build its utility; it
+    must be picklable (a module-level function or a functools.partial of one). rate is the total
+    request rate of all workers together, in requests per second. With reverse, the input holds
+    "lat,lon" points for reverse_many rather than locations.
+    """
+
+    def __init__(self, utility_factory, input_path, output_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 concurrency=8, rate=None, input_format='auto', output_format='jsonl', workdir=None, reverse=False):
+        self.utility_factory = utility_factory
+        self.input_path = input_path
+        self.output_path = output_path
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.rate = rate
+        self.input_format = input_format
+        self.output_format = output_format
+        self.reverse = reverse
+        self.workdir = workdir or output_path + ".parts"
+        self.checkpoint_path = os.path.join(self.workdir, CHECKPOINT_NAME)
+        self.merged = 0  # Chunks appended to the output so far
+        self.output_bytes = 0
+        self.resumed = 0  # Chunks finished by an earlier run
+        self.locations = 0
+        self._ready = {}  # chunk index -> locations, for parts that are complete but not yet merged
+        self._output = None
+
+    def _settings(self):
+        # A checkpoint is only valid for the same input, chunking and output format
+        return {
+            'input': os.path.abspath(self.input_path),
+            'input_size': os.path.getsize(self.input_path),
+            'chunk_size': self.chunk_size,
+            'input_format': self.input_format,
+            'output_format': self.output_format,
+            'reverse': self.reverse,
+        }
+
+    def _part_path(self, index):
+        return os.path.join(self.workdir, f"part-{index:08d}")
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, encoding='utf-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['settings'] != self._settings():
+            raise ValueError(f"{self.checkpoint_path} belongs to a run with different input or options; "
+                             f"remove {self.workdir} to start over")
+        self.merged = checkpoint['merged']
+        self.output_bytes = checkpoint['output_bytes']
+        self.locations = checkpoint['locations']
+        return True
+
+    def _save_checkpoint(self):
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump({'settings': self._settings(), 'merged': self.merged, 'output_bytes': self.output_bytes,
+                       'locations': self.locations}, checkpoint_file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def _merge_ready(self):
+        """Appends finished parts to the output in input order, checkpointing after each one."""
+        while self.merged in self._ready:
+            part_path = self._part_path(self.merged)
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, self._output)
+            self._output.flush()
+            os.fsync(self._output.fileno())  # Durable before the checkpoint says so
+            self.output_bytes = self._output.tell()
+            self.locations += self._ready.pop(self.merged)
+            self.merged += 1
+            self._save_checkpoint()
+            os.remove(part_path)
+
+    def _collect(self, pending):
+        """Waits for at least one chunk to finish and merges whatever is ready."""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            self._ready[pending.pop(future)] = future.result()
+        self._merge_ready()
+
+    def run(self):
+        """Runs (or resumes) the job; returns a summary dict."""
+        start = time.perf_counter()
+        os.makedirs(self.workdir, exist_ok=True)
+        resuming = self._load_checkpoint()
+        for name in os.listdir(self.workdir):
+            # Half-written parts are always discarded; complete ones only count with a checkpoint
+            if name.endswith(".tmp") or (not resuming and name.startswith("part-")):
+                os.remove(os.path.join(self.workdir, name))
+        if not resuming:
+            self._save_checkpoint()
+
+        with ExitStack() as resources:
+            self._output = resources.enter_context(open(self.output_path, 'r+b' if resuming else 'wb'))
+            # Anything after the checkpointed size is a half-written chunk from the crashed run
+            self._output.truncate(self.output_bytes)
+            self._output.seek(self.output_bytes)
+
+            rate_limiter = None
+            if self.rate:
+                manager = resources.enter_context(RateBudgetManager())
+                rate_limiter = manager.TokenBucket(self.rate)
+
+            input_file = resources.enter_context(open(self.input_path, newline='', encoding='utf-8'))
+            locations = read_locations(input_file, self.input_format, name=self.input_path)
+            chunks = iter(lambda: list(islice(locations, self.chunk_size)), [])
+
+            pool = resources.enter_context(ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(self.utility_factory, self.concurrency, rate_limiter)))
+            pending = {}  # future -> chunk index
+            for index, chunk in enumerate(chunks):
+                if index < self.merged:
+                    self.resumed += 1
+                    continue
+                if os.path.exists(self._part_path(index)):
+                    self.resumed += 1
+                    self._ready[index] = len(chunk)
+                    self._merge_ready()
+                    continue
+                # A couple of chunks queued per worker keeps them busy without reading the whole input
+                while len(pending) >= 2 * self.workers:
+                    self._collect(pending)
+                pending[pool.submit(_resolve_chunk, index, chunk, self._part_path(index), self.output_format,
+                                    self.reverse)] = index
+            while pending:
+                self._collect(pending)
+
+        os.remove(self.checkpoint_path)
+        os.rmdir(self.workdir)
+        return {'chunks': self.merged, 'resumed': self.resumed, 'locations': self.locations,
+                'seconds': round(time.perf_counter() - start, 3)}
@@ -0,0 +1,237 @@
+# Benchmarks the utility against geoloc_mockserver.py, so the numbers measure this code rather
+# than internet latency, and the suite runs without network access or an API key.
+#
+#   python geoloc_bench.py                                          # every mode at 10 and 1000 locations
+#   python geoloc_bench.py --scales 10 1000 100000 --latency 0.005  # add the 100k run and server latency
+#   python geoloc_bench.py --save-baseline bench_baseline.json      # record a baseline
+#   python geoloc_bench.py --compare bench_baseline.json            # exit status 1 on a regression
+#
+# Modes:
+#   sequential  one lookup at a time through resolve_iter, as the CLI does by default
+#   concurrent  resolve_iter with --concurrency worker threads
+#   cached      every location already in the in-memory cache (the warm-up run is not timed)
+#   offline     answered from a gazetteer built from the same synthetic places; no HTTP at all
+#   in-process  every request routed to geoloc_backends.MockBackend: the whole request path, minus HTTP
+#
+# Latency is per location fetch (state enrichment is counted in throughput, not latency).
+# Peak memory is the Python heap high-water mark reported by tracemalloc. Tracing slows the
+# code down several times, so it is measured on a second, untimed pass (--no-memory skips it).
+
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from geoloc_backends import BackendRouter, MockBackend
+from geoloc_cache import GeoCache
+from geoloc_gazetteer import Gazetteer, build_gazetteer
+from geoloc_mockserver import MockServerProcess, synthetic_state, synthetic_zip
+from geoloc_ratelimit import RetryPolicy
+from geoloc_util import GeoLocationUtility, positive_int
+
+MODES = ('sequential', 'concurrent', 'cached', 'offline', 'in-process')
+DEFAULT_SCALES = (10, 1000)
+BASELINE_VERSION = 1
+
+
+class TimedGeoLocationUtility(GeoLocationUtility):
+    """GeoLocationUtility that records how long each location fetch takes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _fetch_result(self, location):
+        start = time.perf_counter()
+        result = super()._fetch_result(location)
+        self.latencies.append(time.perf_counter() - start)  # list.append is atomic, so worker threads can share it
+        return result
+
+
+def make_locations(count):
+    """count distinct ZIP codes (they repeat only beyond 99,999), all known to the mock server."""
+    return [f"{index % 99999 + 1:05d}" for index in range(count)]
+
+
+def build_offline_gazetteer(locations, directory):
+    """Writes a gazetteer holding the synthetic place of every location and returns its path."""
+    csv_path = os.path.join(directory, "bench_zips.csv")
+    with open(csv_path, "w", newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['zip', 'name', 'state', 'lat', 'lon'])
+        for zip_code in sorted(set(locations)):
+            place = synthetic_zip(zip_code)
+            writer.writerow([zip_code, place['name'], synthetic_state(place['lat'], place['lon']),
+                             place['lat'], place['lon']])
+    gaz_path = os.path.join(directory, "bench_zips.gaz")
+    build_gazetteer(csv_path, gaz_path)
+    return gaz_path
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def _timed_run(geo_util, locations, concurrency):
+    """Resolves locations and returns (seconds, errors)."""
+    geo_util.latencies = []
+    start = time.perf_counter()
+    errors = 0
+    for result in geo_util.resolve_iter(locations, max_concurrency=concurrency):
+        if result['error'] or not result['data']:
+            errors += 1
+    return time.perf_counter() - start, errors
+
+
+def _peak_memory(geo_util, locations, concurrency):
+    """Resolves locations again under tracemalloc and returns the peak traced bytes."""
+    tracemalloc.start()
+    try:
+        for _ in geo_util.resolve_iter(locations, max_concurrency=concurrency):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_mode(mode, scale, server, concurrency=16, workdir=None, measure_memory=True):
+    """Runs one benchmark and returns its result row."""
+    locations = make_locations(scale)
+    retry_policy = RetryPolicy(backoff_base=0.01)  # Injected faults should cost retries, not seconds of backoff
+    options = {'base_url': server.url, 'retry_policy': retry_policy, 'pool_size': max(concurrency, 10)}
+    workers = concurrency if mode == 'concurrent' else 1
+
+    gazetteer = None
+    if mode == 'offline':
+        gazetteer = Gazetteer(build_offline_gazetteer(locations, workdir))
+        options.update(gazetteer=gazetteer, offline=True)
+    if mode == 'cached':
+        options['cache'] = GeoCache(max_entries=2 * scale + 1)
+    if mode == 'in-process':
+        options['router'] = BackendRouter([MockBackend()])
+
+    try:
+        with TimedGeoLocationUtility("bench-key", **options) as geo_util:
+            if mode == 'cached':
+                for _ in geo_util.resolve_iter(locations, max_concurrency=concurrency):
+                    pass
+            requests_before = sum(server.requests.values())
+            seconds, errors = _timed_run(geo_util, locations, workers)
+            latencies = geo_util.latencies
+            http_requests = sum(server.requests.values()) - requests_before
+            peak = _peak_memory(geo_util, locations, workers) if measure_memory else None
+    finally:
+        if gazetteer is not None:
+            gazetteer.close()
+
+    return {
+        'mode': mode,
+        'scale': scale,
+        'seconds': round(seconds, 4),
+        'throughput': round(scale / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'peak_mb': round(peak / 2 ** 20, 3) if peak is not None else None,
+        'http_requests': http_requests,
+        'errors': errors,
+    }
+
+
+def run_benchmarks(modes=MODES, scales=DEFAULT_SCALES, concurrency=16, server_options=None, measure_memory=True):
+    """Runs every mode at every scale against a fresh mock server and returns the result rows."""
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, MockServerProcess(**(server_options or {})) as server:
+        for scale in scales:
+            for mode in modes:
+                results.append(run_mode(mode, scale, server, concurrency=concurrency, workdir=workdir,
+                                        measure_memory=measure_memory))
+    return results
+
+
+def compare(results, baseline, tolerance=0.5):
+    """Returns a message for every result that is worse than its baseline by more than tolerance.
+
+    Throughput may drop to (1 - tolerance) of the baseline; p99 latency and peak memory may
+    grow to (1 + tolerance) of it. Results missing from the baseline are not compared.
+    """
+    expected = {(row['mode'], row['scale']): row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        base = expected.get((row['mode'], row['scale']))
+        if base is None:
+            continue
+        name = f"{row['mode']}@{row['scale']}"
+        if row['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {row['throughput']}/s < baseline {base['throughput']}/s")
+        # Sub-millisecond timings are mostly scheduler noise, so they never fail the check
+        if row['p99_ms'] > max(base['p99_ms'] * (1 + tolerance), 1.0):
+            regressions.append(f"{name}: p99 {row['p99_ms']} ms > baseline {base['p99_ms']} ms")
+        if row['peak_mb'] is not None and base['peak_mb'] is not None and \
+                row['peak_mb'] > max(base['peak_mb'] * (1 + tolerance), 1.0):
+            regressions.append(f"{name}: peak memory {row['peak_mb']} MB > baseline {base['peak_mb']} MB")
+    return regressions
+
+
+def format_table(results):
+    header = f"{'mode':<11} {'scale':>7} {'lookups/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9} {'requests':>9} {'errors':>7}"
+    lines = [header, '-' * len(header)]
+    for row in results:
+        peak = row['peak_mb'] if row['peak_mb'] is not None else '-'
+        lines.append(f"{row['mode']:<11} {row['scale']:>7} {row['throughput']:>11} {row['p50_ms']:>9} "
+                     f"{row['p99_ms']:>9} {peak:>9} {row['http_requests']:>9} {row['errors']:>7}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the geolocation utility against a local mock API.")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--scales', nargs='+', type=positive_int, default=list(DEFAULT_SCALES),
+                        help="Numbers of locations to resolve (default: 10 1000)")
+    parser.add_argument('--concurrency', type=positive_int, default=16, help="Worker threads for the concurrent mode")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the mock server adds to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass that measures peak memory")
+    parser.add_argument('--seed', type=int, default=1234, help="Seed for the injected faults")
+    parser.add_argument('--json', metavar="PATH", help="Also write the results as JSON")
+    parser.add_argument('--save-baseline', metavar="PATH", help="Write the results as a new baseline")
+    parser.add_argument('--compare', metavar="PATH", help="Fail if a result regressed against this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed fractional slowdown before --compare fails (default: 0.5)")
+    args = parser.parse_args(argv)
+
+    server_options = {'latency': args.latency, 'error_rate': args.error_rate,
+                      'throttle_rate': args.throttle_rate, 'seed': args.seed}
+    results = run_benchmarks(args.modes, args.scales, args.concurrency, server_options,
+                             measure_memory=not args.no_memory)
+    print(format_table(results))
+
+    report = {'version': BASELINE_VERSION, 'python': platform.python_version(), 'server': server_options,
+              'concurrency': args.concurrency, 'results': results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2)
+                report_file.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
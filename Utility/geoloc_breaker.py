@@ -0,0 +1,113 @@
+# Circuit breaker for the geocoding API. When the upstream is down, or rejects our key, every
+# remaining lookup in a batch would otherwise still go out and wait for its timeout or its error.
+# The breaker notices the failures, stops sending requests ("opens"), and after a pause lets a
+# probe request through to find out whether the API has recovered.
+#
+#   python geoloc_util.py --fail-fast --stale-if-error --cache geocache.sqlite --input addresses.txt
+
+import threading
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+# Statuses that mean every further request will fail the same way: the API key is invalid or blocked
+FATAL_STATUSES = (401, 403)
+
+
+class CircuitOpenError(Exception):
+    """Raised for a lookup that wasn't sent because the circuit is open."""
+
+    def __init__(self, reason=None):
+        super().__init__(f"circuit open: {reason}" if reason else "circuit open")
+
+
+class CircuitBreaker:
+    """Fails requests fast while the upstream is failing, and probes it until it recovers.
+
+    Closed, the outcomes of the last `window` seconds are counted, and the circuit opens once
+    at least min_requests were seen and failure_rate of them failed, or at once on a fatal
+    failure. Open, requests are refused for reset_timeout seconds. Half-open, up to `probes`
+    requests go out: a success closes the circuit and a failure opens it again.
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=20, window=30.0, reset_timeout=30.0, probes=1):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = CLOSED
+        self.reason = None  # The failure that opened the circuit
+        self.opened = 0  # Times the circuit has opened
+        self.rejected = 0  # Requests refused while it was open
+        self._outcomes = deque()  # (time.monotonic(), failed) for the current window
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True when a request may be sent now. Once reset_timeout has passed, lets the probes through."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = 0
+            if self._probing < self.probes:
+                self._probing += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Gives back what allow() handed out for a request that ended with no outcome, e.g. DeadlineExceeded.
+
+        Without it, a probe that never reports leaves the circuit half-open and refusing everything.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing > 0:
+                self._probing -= 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._close()
+            elif self.state == CLOSED:
+                self._record(False)
+
+    def record_failure(self, reason, fatal=False):
+        """Counts a failed request; reason (e.g. "HTTP 503") is reported while the circuit is open."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open(reason)
+            elif self.state == CLOSED:
+                self._record(True)
+                if fatal or (len(self._outcomes) >= self.min_requests
+                             and self._failures >= self.failure_rate * len(self._outcomes)):
+                    self._open(reason)
+            # Requests sent before the circuit opened and failing afterwards change nothing
+
+    def _record(self, failed):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        while self._outcomes[0][0] < now - self.window:
+            self._failures -= self._outcomes.popleft()[1]
+
+    def _open(self, reason):
+        self.state = OPEN
+        self.reason = reason
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+
+    def _close(self):
+        self.state = CLOSED
+        self.reason = None
+        self._outcomes.clear()
+        self._failures = 0
@@ -0,0 +1,203 @@
+# Two-tier cache for geocoding API responses. A bounded in-memory LRU sits in front of an
+# optional SQLite file so that repeated lookups survive between runs of the utility. A read-only
+# snapshot (see geoloc_snapshot.py) can sit underneath both, so a new host starts warm.
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from geoloc_records import encode_default
+
+DEFAULT_TTL = 30 * 24 * 3600       # ZIP and city centroids rarely move, keep them for 30 days
+DEFAULT_NEGATIVE_TTL = 24 * 3600   # "not found" answers are re-checked daily
+
+
+class GeoCache:
+    """Caches decoded API responses by normalized query key, with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, path=None, max_entries=10000, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 snapshot=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.snapshot_hits = 0
+        self.snapshot = snapshot  # Optional geoloc_snapshot.Snapshot consulted after both tiers miss
+        self._memory = OrderedDict()  # key -> (expires_at, encoded value)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            import sqlite3  # Memory-only caches (the CLI default) never load it
+
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Returns (found, value). A cached negative result is (True, None)."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return True, json.loads(entry[1])
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM geocache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return True, json.loads(row[0])
+
+            if self.snapshot is not None:
+                entry = self.snapshot.get_entry(key)
+                if entry is not None and entry[0] > now:
+                    self._remember(key, *entry)
+                    self.hits += 1
+                    self.snapshot_hits += 1
+                    return True, json.loads(entry[1])
+
+            self.misses += 1
+            return False, None
+
+    def get_stale(self, key):
+        """Returns (found, value) like get, but expired entries count as found.
+
+        For answering while the API is unavailable; the hit/miss counters are left alone.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return True, json.loads(entry[1])
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM geocache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    return True, json.loads(row[0])
+            if self.snapshot is not None:
+                entry = self.snapshot.get_entry(key)
+                if entry is not None:
+                    return True, json.loads(entry[1])
+        return False, None
+
+    def items(self, prefix=""):
+        """Yields (key, value) for every unexpired entry whose key starts with prefix, from every tier."""
+        for key, _, encoded in self.entries(prefix):
+            yield key, json.loads(encoded)
+
+    def entries(self, prefix=""):
+        """Yields (key, expires_at, encoded value) for every unexpired entry whose key starts with prefix.
+
+        An entry in more than one tier is reported once, from the upper tier. This is what
+        geoloc_snapshot.export_snapshot writes.
+        """
+        now = time.time()
+        with self._lock:
+            entries = {key: entry for key, entry in self._memory.items()
+                       if key.startswith(prefix) and entry[0] > now}
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key, expires_at, value FROM geocache WHERE key >= ? AND expires_at > ?", (prefix, now)
+                ).fetchall()
+                for key, expires_at, value in rows:
+                    if key.startswith(prefix):
+                        entries.setdefault(key, (expires_at, value))
+            if self.snapshot is not None:
+                for key, expires_at, value in self.snapshot.entries(prefix):
+                    if expires_at > now:
+                        entries.setdefault(key, (expires_at, value))
+        for key, (expires_at, encoded) in entries.items():
+            yield key, expires_at, encoded
+
+    def load(self, entries):
+        """Stores (key, expires_at, encoded value) entries, such as a snapshot's, as they are.
+
+        Expired entries, and entries older than the ones already cached, are skipped. With a
+        SQLite file everything goes there; otherwise into the memory tier, up to max_entries.
+        Returns how many entries were stored.
+        """
+        now = time.time()
+        stored = 0
+        with self._lock:
+            for key, expires_at, encoded in entries:
+                if expires_at <= now:
+                    continue
+                if self._db is not None:
+                    cursor = self._db.execute(
+                        "INSERT INTO geocache (key, value, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                        "WHERE excluded.expires_at > geocache.expires_at",
+                        (key, encoded, expires_at)
+                    )
+                    stored += cursor.rowcount
+                    self._memory.pop(key, None)  # The memory copy may be the older one
+                else:
+                    current = self._memory.get(key)
+                    if current is None or current[0] < expires_at:
+                        self._remember(key, expires_at, encoded)
+                        stored += 1
+            if self._db is not None:
+                self._db.commit()
+        return stored
+
+    def set(self, key, value, ttl=None):
+        """Stores a value. None is stored as a negative ("not found") entry with the negative TTL."""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = time.time() + ttl
+        encoded = json.dumps(value, ensure_ascii=False, default=encode_default)
+
+        with self._lock:
+            self._remember(key, expires_at, encoded)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, encoded, expires_at)
+                )
+                self._db.commit()
+
+    def _remember(self, key, expires_at, encoded):
+        """Puts an entry in the memory tier, evicting the least recently used ones past max_entries."""
+        self._memory[key] = (expires_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self):
+        """Drops expired entries from both tiers."""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if entry[0] <= now]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM geocache WHERE expires_at <= ?", (now,))
+                self._db.commit()
+
+    def stats(self):
+        """Returns the hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'snapshot_hits': self.snapshot_hits,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,48 @@
+# Response decoding shared by the sync and async utilities. The status code is checked before the
+# body is parsed, so an error answer becomes an ApiError however the API phrased it (and even when
+# the body isn't JSON at all), and a good answer becomes Location records in one step. Bodies are
+# parsed with orjson when it is installed, which is several times faster than the json module on
+# these payloads; without it the json module is used and the results are the same.
+#
+#   records = decode_response(response.status_code, response.content)
+
+import json
+from geoloc_records import ApiError, to_records
+
+_loads = None
+
+
+def loads(body):
+    """Parses a JSON body (bytes or str) with orjson when it is installed, else with the json module.
+
+    Raises ValueError for a body that isn't JSON.
+    """
+    global _loads
+    if _loads is None:
+        try:
+            from orjson import loads as orjson_loads  # Optional; imported on the first response
+            _loads = orjson_loads
+        except ImportError:
+            _loads = json.loads
+    return _loads(body)
+
+
+def decode_response(status, body, local_names=False):
+    """Turns an HTTP answer into what the utility caches and returns.
+
+    A 2xx body becomes a list of Location records (an ApiError for an error payload), or None when
+    it is empty or holds no places; local_names are only kept when asked for. Any other status
+    becomes [ApiError], with the API's cod and message when the body has them.
+    """
+    if not 200 <= status < 300:
+        return [ApiError.from_response(status, body)]
+    if not body.strip():
+        return None
+    return to_records(loads(body), local_names) or None
+
+
+def decode_payload(status, payload, local_names=False):
+    """decode_response for an answer that is already decoded, such as one from an in-process backend."""
+    if not 200 <= status < 300:
+        return [ApiError.from_payload(status, payload)]
+    return to_records(payload, local_names) or None
@@ -0,0 +1,237 @@
+# Offline US ZIP/city gazetteer. A CSV of ZIP centroids is compiled once into a compact binary
+# index, which is then memory-mapped so lookups are answered in process without any network call.
+#
+#   python geoloc_gazetteer.py build us_zips.csv us_zips.gaz
+#   python geoloc_util.py --gazetteer us_zips.gaz --locations "12345" "Columbus, OH"
+#
+# Layout (little-endian, every section padded to 8 bytes):
+#   header        magic, version, n_zips, n_cities, n_strings, n_string_bytes
+#   zip_index     int32[100000]   5-digit ZIP -> row, -1 when absent (direct addressing, no search)
+#   zip rows      uint32 code, float64 lat, float64 lon, uint32 name id, uint32 state id  (one array per column)
+#   city rows     uint32 key id, uint32 name id, uint32 state id, float64 lat, float64 lon, sorted by key
+#   strings       uint32 offsets[n_strings + 1] followed by the UTF-8 bytes
+
+import argparse
+import csv
+import mmap
+import struct
+import sys
+from bisect import bisect_left
+from geoloc_mapped import close_mapping, little_endian, padding
+from geoloc_states import state_name
+
+MAGIC = b"GZTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIII")
+ZIP_SLOTS = 100000
+
+# Accepted CSV header names for each column, so common ZIP centroid datasets load as-is
+COLUMN_ALIASES = {
+    'zip': ('zip', 'zipcode', 'zip_code', 'postal_code'),
+    'name': ('name', 'city', 'place', 'place_name'),
+    'state': ('state', 'state_id', 'state_code', 'state_name'),
+    'lat': ('lat', 'latitude'),
+    'lon': ('lon', 'lng', 'long', 'longitude'),
+}
+
+
+def city_key(city, state):
+    """Index key for a city: case-folded, whitespace-collapsed "city|state name"."""
+    return f"{' '.join(city.casefold().split())}|{state.casefold()}"
+
+
+def zip_slot(zip_code):
+    """Returns the 5-digit ZIP as an int for ZIP or ZIP+4 input, or None if it is not a US ZIP."""
+    zip_code = zip_code.strip()
+    if len(zip_code) == 10 and zip_code[5] == '-' and zip_code[6:].isdigit():
+        zip_code = zip_code[:5]
+    if len(zip_code) != 5 or not zip_code.isdigit():
+        return None
+    return int(zip_code)
+
+
+def build_gazetteer(csv_path, out_path):
+    """Compiles a CSV of ZIP centroids (zip, name, state, lat, lon) into a gazetteer file."""
+    strings = {}
+
+    def string_id(value):
+        return strings.setdefault(value, len(strings))
+
+    zips = {}
+    cities = {}
+    with open(csv_path, newline='', encoding='utf-8') as csv_file:
+        reader = csv.DictReader(csv_file)
+        columns = {}
+        for column, aliases in COLUMN_ALIASES.items():
+            found = [name for name in reader.fieldnames if name.strip().lower() in aliases]
+            if not found:
+                raise ValueError(f"Missing '{column}' column in {csv_path}")
+            columns[column] = found[0]
+
+        for row in reader:
+            slot = zip_slot(row[columns['zip']].zfill(5))
+            state = state_name(row[columns['state']])
+            if slot is None or state is None:
+                continue  # Not a US state ZIP (territories, military) or a malformed row
+            name = row[columns['name']].strip()
+            lat, lon = float(row[columns['lat']]), float(row[columns['lon']])
+            zips[slot] = (lat, lon, string_id(name), string_id(state))
+
+            # A city's centroid is the mean of its ZIP centroids
+            city = cities.setdefault(city_key(name, state), [name, state, 0.0, 0.0, 0])
+            city[2] += lat
+            city[3] += lon
+            city[4] += 1
+
+    zip_codes = sorted(zips)
+    zip_index = [-1] * ZIP_SLOTS
+    for row, slot in enumerate(zip_codes):
+        zip_index[slot] = row
+
+    city_keys = sorted(cities, key=lambda key: key.encode('utf-8'))
+    city_rows = [cities[key] for key in city_keys]
+    key_ids = [string_id(key) for key in city_keys]
+
+    ordered = sorted(strings, key=strings.get)
+    encoded = [value.encode('utf-8') for value in ordered]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    string_bytes = b"".join(encoded)
+
+    sections = [
+        little_endian('i', zip_index),
+        little_endian('I', zip_codes),
+        little_endian('d', [zips[slot][0] for slot in zip_codes]),
+        little_endian('d', [zips[slot][1] for slot in zip_codes]),
+        little_endian('I', [zips[slot][2] for slot in zip_codes]),
+        little_endian('I', [zips[slot][3] for slot in zip_codes]),
+        little_endian('I', key_ids),
+        little_endian('I', [string_id(city[0]) for city in city_rows]),
+        little_endian('I', [string_id(city[1]) for city in city_rows]),
+        little_endian('d', [city[2] / city[4] for city in city_rows]),
+        little_endian('d', [city[3] / city[4] for city in city_rows]),
+        little_endian('I', offsets),
+    ]
+
+    with open(out_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, len(zip_codes), len(city_rows), len(ordered), len(string_bytes)))
+        out.write(b"\0" * padding(HEADER.size))
+        for section in sections:
+            data = section.tobytes()
+            out.write(data)
+            out.write(b"\0" * padding(len(data)))
+        out.write(string_bytes)
+
+    return len(zip_codes), len(city_rows)
+
+
+class Gazetteer:
+    """Memory-mapped ZIP and city/state index produced by build_gazetteer."""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise RuntimeError("The gazetteer format is little-endian; big-endian hosts are not supported")
+
+        with open(path, 'rb') as gaz_file:
+            self._mmap = mmap.mmap(gaz_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} gazetteer file")
+        magic, version, _, n_zips, n_cities, n_strings, n_string_bytes = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} gazetteer file")
+        self.zip_count = n_zips
+        self.city_count = n_cities
+
+        position = HEADER.size + padding(HEADER.size)
+
+        def section(typecode, count):
+            nonlocal position
+            size = count * struct.calcsize(typecode)
+            view = self._view[position:position + size].cast(typecode)
+            position += size + padding(size)
+            return view
+
+        self._zip_index = section('i', ZIP_SLOTS)
+        self._zip_codes = section('I', n_zips)
+        self._zip_lat = section('d', n_zips)
+        self._zip_lon = section('d', n_zips)
+        self._zip_name = section('I', n_zips)
+        self._zip_state = section('I', n_zips)
+        self._city_key = section('I', n_cities)
+        self._city_name = section('I', n_cities)
+        self._city_state = section('I', n_cities)
+        self._city_lat = section('d', n_cities)
+        self._city_lon = section('d', n_cities)
+        self._string_offsets = section('I', n_strings + 1)
+        self._strings = self._view[position:position + n_string_bytes]
+        self._decoded = {}
+
+    def _string_bytes(self, string_id):
+        return self._strings[self._string_offsets[string_id]:self._string_offsets[string_id + 1]].tobytes()
+
+    def _string(self, string_id):
+        # Place and state names repeat across rows, so each one is decoded only once
+        value = self._decoded.get(string_id)
+        if value is None:
+            value = self._decoded[string_id] = self._string_bytes(string_id).decode('utf-8')
+        return value
+
+    def lookup_zip(self, zip_code):
+        """Returns the API-shaped record for a ZIP or ZIP+4, or None when it is not in the index."""
+        slot = zip_slot(zip_code)
+        if slot is None:
+            return None
+        row = self._zip_index[slot]
+        if row < 0:
+            return None
+        return {
+            'zip': f"{slot:05d}",
+            'name': self._string(self._zip_name[row]),
+            'lat': self._zip_lat[row],
+            'lon': self._zip_lon[row],
+            'country': 'US',
+            'state': self._string(self._zip_state[row]),
+        }
+
+    def lookup_city(self, city, state):
+        """Returns the API-shaped record for a city and state (code or name), or None when it is not indexed."""
+        name = state_name(state) if isinstance(state, str) else None
+        if name is None:
+            return None
+        target = city_key(city, name).encode('utf-8')
+        row = bisect_left(range(self.city_count), target, key=lambda i: self._string_bytes(self._city_key[i]))
+        if row == self.city_count or self._string_bytes(self._city_key[row]) != target:
+            return None
+        return {
+            'name': self._string(self._city_name[row]),
+            'lat': self._city_lat[row],
+            'lon': self._city_lon[row],
+            'country': 'US',
+            'state': self._string(self._city_state[row]),
+        }
+
+    def iter_cities(self):
+        """Yields (name, state, lat, lon) for every indexed city."""
+        for row in range(self.city_count):
+            yield (self._string(self._city_name[row]), self._string(self._city_state[row]),
+                   self._city_lat[row], self._city_lon[row])
+
+    def close(self):
+        close_mapping(self)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an offline gazetteer from a CSV of US ZIP centroids.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Compile a CSV with zip, name, state, lat and lon columns")
+    build.add_argument('csv_path')
+    build.add_argument('out_path')
+    args = parser.parse_args()
+
+    zip_count, city_count = build_gazetteer(args.csv_path, args.out_path)
+    print(f"Wrote {zip_count} ZIP codes and {city_count} cities to {args.out_path}")
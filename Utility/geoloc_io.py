@@ -0,0 +1,124 @@
+# Streaming input and output for the command-line interface. Locations are read lazily and
+# results are written incrementally, so a batch of any size can be piped through the utility
+# without loading it into memory.
+
+import csv
+import io
+import json
+
+# First-row values that mark a CSV header rather than a location
+CSV_HEADER_NAMES = {'location', 'locations', 'zip', 'zipcode', 'zip_code', 'city', 'query', 'lat', 'latitude'}
+
+
+def read_lines(stream):
+    """Yields one location per non-blank line; lines starting with '#' are comments."""
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def read_csv(stream):
+    """Yields one location per CSV row. Multi-column rows such as "Columbus,OH" become "Columbus, OH"."""
+    for line_number, row in enumerate(csv.reader(stream)):
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if not cells:
+            continue
+        if line_number == 0 and cells[0].lower() in CSV_HEADER_NAMES:
+            continue
+        yield ", ".join(cells)
+
+
+def read_locations(stream, input_format='auto', name=None):
+    """Returns a lazy iterator of locations from a text stream.
+
+    'auto' picks CSV for files named *.csv and one-location-per-line otherwise.
+    """
+    if input_format == 'auto':
+        input_format = 'csv' if name and name.lower().endswith('.csv') else 'lines'
+    return read_csv(stream) if input_format == 'csv' else read_lines(stream)
+
+
+# Columns of the structured (jsonl/csv) output, one row per returned place
+OUTPUT_FIELDS = ('location', 'name', 'state', 'country', 'lat', 'lon', 'zip', 'error')
+
+
+def format_text(data):
+    """Renders one record in the original human-readable layout."""
+    return (f"Location: {data.get('name', 'Unknown')}, {data.get('state', 'Unknown')}\n"
+            f"Latitude: {data.get('lat', 'Unknown')}\n"
+            f"Longitude: {data.get('lon', 'Unknown')}\n"
+            f"Country: {data.get('country', 'Unknown')}\n"
+            f"{'=' * 40}\n")
+
+
+def result_rows(result):
+    """Flattens a resolve result into output rows; failed lookups become a row with an error."""
+    if result['error']:
+        return [{'location': result['location'], 'error': result['error']}]
+    if not result['data']:
+        return [{'location': result['location'], 'error': 'not found'}]
+
+    rows = []
+    for data in result['data']:
+        if 'cod' in data:  # Error payload from the API, e.g. {'cod': '404', 'message': 'not found'}
+            rows.append({'location': result['location'], 'error': data.get('message', str(data['cod']))})
+        else:
+            row = {'location': result['location']}
+            for field in OUTPUT_FIELDS[1:-1]:
+                row[field] = data.get(field)
+            rows.append(row)
+    return rows
+
+
+class ResultWriter:
+    """Writes resolve results as text, JSON Lines or CSV.
+
+    Output is rendered into an in-memory buffer and written to the stream in one call every
+    buffer_size results, rather than a handful of print calls per record. A terminal is
+    written to after every result so interactive runs still show progress. header=False leaves
+    out the CSV header, for output appended to an existing CSV file.
+    """
+
+    def __init__(self, stream, output_format='text', buffer_size=512, header=True):
+        self.stream = stream
+        self.output_format = output_format
+        self.buffer_size = buffer_size
+        self._buffer = io.StringIO()
+        self._pending = 0
+        self._interactive = hasattr(stream, 'isatty') and stream.isatty()
+        self._json = json.JSONEncoder(ensure_ascii=False, check_circular=False, separators=(',', ':'))
+        self._csv = csv.DictWriter(self._buffer, fieldnames=OUTPUT_FIELDS, lineterminator='\n')
+        if output_format == 'csv' and header:
+            self._csv.writeheader()
+
+    def write(self, result):
+        if self.output_format == 'text':
+            self._write_text(result)
+        elif self.output_format == 'jsonl':
+            for row in result_rows(result):
+                self._buffer.write(self._json.encode(row))
+                self._buffer.write('\n')
+        else:
+            self._csv.writerows(result_rows(result))
+
+        self._pending += 1
+        if self._pending >= self.buffer_size or self._interactive:
+            self.flush()
+
+    def _write_text(self, result):
+        if result['error']:
+            self._buffer.write(f"Error: Unable to resolve {result['location']}: {result['error']}\n")
+            return
+        for data in result['data'] or ():
+            self._buffer.write(format_text(data))
+
+    def flush(self):
+        """Writes everything buffered so far to the stream."""
+        text = self._buffer.getvalue()
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pending = 0
@@ -0,0 +1,147 @@
+# Durable, append-only journal of completed lookups, so a batch that dies halfway (network
+# outage, quota cutoff, Ctrl-C) can be restarted without spending API quota on finished work.
+#
+# Each line is a JSON record {"key", "location", "data", "error"} keyed by the normalized
+# location (see location_key), appended as results come in and fsynced in batches. Opening an
+# existing journal indexes its completed keys; the utility answers those from the journal and
+# only looks up new locations and the ones that failed last time.
+#
+#   python geoloc_util.py --journal run.journal --input addresses.txt --format jsonl > results.jsonl
+
+import json
+import os
+import threading
+import time
+from geoloc_records import encode_default
+
+# Error codes that are a definitive answer about the query, not a failure worth retrying
+FINAL_ERROR_CODES = ('400', '404')
+
+
+def completed(result):
+    """True when a result is final: found, or definitively not found. Errors and empty answers are retried."""
+    if result['error'] is not None or not result['data']:
+        return False
+    return all('cod' not in data or str(data['cod']) in FINAL_ERROR_CODES for data in result['data'])
+
+
+class ResultJournal:
+    """Append-only journal of lookup results with batched fsync.
+
+    Records are buffered and written with one flush and fsync every sync_every records or
+    sync_interval seconds, whichever comes first, and on close. A crash loses at most that
+    window, which the next run simply looks up again. Only the file offset of each completed
+    key is kept in memory; replayed results are read back from the file.
+    """
+
+    def __init__(self, path, sync_every=256, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.replayed = 0  # Results answered from the journal
+        self._index = {}  # key -> (offset, length) of its latest completed record
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        size = self._load() if os.path.exists(path) else 0
+        self._file = open(path, 'ab', buffering=1024 * 1024)
+        self._file.truncate(size)  # Drops a record cut short by a crash
+        self._size = size  # Bytes written, including any still in the buffer
+        self._flushed = size  # Bytes already handed to the OS, and so readable through _reader
+        self._reader = open(path, 'rb')
+
+    def _load(self):
+        """Indexes the completed records of an existing journal; returns the size of its intact part."""
+        offset = 0
+        with open(self.path, 'rb') as journal_file:
+            for line in journal_file:
+                if not line.endswith(b'\n'):
+                    break  # Half-written last record
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is not None and completed(record):
+                    self._index[record['key']] = (offset, len(line))
+                offset += len(line)
+        return offset
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, location=None):
+        """Returns the journaled result for key (reported under location, if given), or None."""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        with self._lock:
+            if offset + length > self._flushed:
+                self._flush()  # Recorded earlier in this run and still in the write buffer
+            self._reader.seek(offset)
+            line = self._reader.read(length)
+            self.replayed += 1
+        record = json.loads(line)
+        return {'location': record['location'] if location is None else location,
+                'data': record['data'], 'error': None}
+
+    def split(self, locations, keys):
+        """Answers what it can of a batch from the journal.
+
+        Returns (results, pending): results holds the journaled result for each location, or None,
+        and pending the indexes of the locations that still have to be looked up.
+        """
+        results = [None] * len(locations)
+        pending = []
+        for index, (location, key) in enumerate(zip(locations, keys)):
+            result = self.get(key, location) if key is not None else None
+            if result is None:
+                pending.append(index)
+            else:
+                results[index] = result
+        return results, pending
+
+    def record(self, key, result):
+        """Appends a result. Only completed results are indexed; failures are written but retried next run."""
+        line = json.dumps({'key': key, 'location': result['location'], 'data': result['data'],
+                           'error': result['error']}, ensure_ascii=False, separators=(',', ':'), default=encode_default)
+        line = (line + '\n').encode('utf-8')
+        with self._lock:
+            self._file.write(line)
+            if completed(result):
+                self._index[key] = (self._size, len(line))
+            self._size += len(line)
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def _flush(self):
+        self._file.flush()
+        self._flushed = self._size
+
+    def _sync(self):
+        self._flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Makes every record written so far durable."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+            self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
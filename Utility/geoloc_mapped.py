@@ -0,0 +1,27 @@
+# Helpers shared by the memory-mapped file formats of geoloc_gazetteer.py and geoloc_snapshot.py.
+# Both write little-endian sections padded to 8 bytes, and read them back through memoryviews
+# into one mmap.
+
+import sys
+from array import array
+
+
+def padding(size):
+    """The number of zero bytes that pad a section of size bytes to the next multiple of 8."""
+    return (-size) % 8
+
+
+def little_endian(typecode, values):
+    """Builds an array in little-endian byte order."""
+    data = array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data
+
+
+def close_mapping(owner):
+    """Closes owner._mmap, releasing the memoryviews into it that owner holds first, as mmap requires."""
+    for value in list(vars(owner).values()):
+        if isinstance(value, memoryview):
+            value.release()
+    owner._mmap.close()
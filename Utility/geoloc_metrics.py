@@ -0,0 +1,171 @@
+# Instrumentation for the lookup hot path: counters, per-phase timers and latency histograms.
+# A utility built with metrics=Metrics() records into it; the default NULL_METRICS records nothing.
+#
+# Phases: lookup (one whole location fetch), parse, offline, cache, network, decode, enrich.
+# Counters: lookups, invalid, offline_hits, cache_hits, cache_misses, journal_hits, requests, retries,
+# hedges, hedge_wins, errors, error_responses, circuit_rejected, stale_hits, corrected.
+#
+#   python geoloc_util.py --stats prometheus --locations "12345" "Columbus, OH"
+
+import json
+import threading
+import time
+from collections import Counter
+
+# Upper bounds in seconds of the latency histogram buckets, from 100 microseconds to 10 seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; the last bucket counts everything above the largest bound."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.bounds) and seconds > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, fraction):
+        """Estimates a quantile by linear interpolation inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class _Timer:
+    __slots__ = ('metrics', 'phase', 'start')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Thread-safe counters and per-phase latency histograms.
+
+    Hooks registered with add_hook are called as hook(kind, name, value) for every counter
+    increment ('counter', name, amount) and timing ('timer', phase, seconds), e.g. to forward
+    them to statsd. Hooks run on the thread doing the lookup, so they should be quick.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = Counter()
+        self.phases = {}  # phase -> Histogram
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+        for hook in self._hooks:
+            hook('counter', name, amount)
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        for hook in self._hooks:
+            hook('timer', phase, seconds)
+
+    def timer(self, phase):
+        """Context manager that records the time spent in its block under phase."""
+        return _Timer(self, phase)
+
+    def snapshot(self):
+        """Returns the counters and a per-phase summary (count, total, mean, p50, p99, max) as a dict."""
+        with self._lock:
+            phases = {}
+            for phase, histogram in sorted(self.phases.items()):
+                phases[phase] = {
+                    'count': histogram.count,
+                    'total_seconds': round(histogram.sum, 6),
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 4) if histogram.count else 0.0,
+                    'p50_ms': round(histogram.quantile(0.50) * 1000, 4),
+                    'p99_ms': round(histogram.quantile(0.99) * 1000, 4),
+                    'max_ms': round(histogram.max * 1000, 4),
+                }
+            return {'counters': dict(sorted(self.counters.items())), 'phases': phases}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='geoloc'):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+
+            if self.phases:
+                lines.append(f"# HELP {prefix}_phase_seconds Time spent in each phase of a lookup")
+                lines.append(f"# TYPE {prefix}_phase_seconds histogram")
+            for phase, histogram in sorted(self.phases.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class NullMetrics:
+    """Metrics that records nothing, so uninstrumented utilities pay almost nothing for the hooks."""
+
+    _timer = _NullTimer()
+
+    def increment(self, name, amount=1):
+        pass
+
+    def observe(self, phase, seconds):
+        pass
+
+    def timer(self, phase):
+        return self._timer
+
+
+NULL_METRICS = NullMetrics()
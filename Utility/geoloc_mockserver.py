@@ -0,0 +1,259 @@
+# Local stand-in for the OpenWeatherMap geocoding API, used by the benchmarks and tests so they
+# run without network access or an API key. /direct, /zip and /reverse answer with deterministic
+# synthetic places, and latency, server errors and 429 throttling can be injected.
+#
+#   python geoloc_mockserver.py --port 8080 --latency 0.02 --error-rate 0.01
+#   python geoloc_util.py --base-url http://127.0.0.1:8080/geo/1.0 --locations "12345" "Columbus, OH"
+
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+from geoloc_states import US_STATES
+
+API_PREFIX = "/geo/1.0"
+STATE_NAMES = sorted(US_STATES.values())
+NOT_FOUND = {'cod': '404', 'message': 'not found'}
+
+
+def synthetic_zip(zip_code):
+    """The place the mock server returns for a ZIP. Every ZIP but 00000 exists, each at its own point."""
+    number = int(zip_code)
+    return {
+        'zip': zip_code,
+        'name': f"Town {zip_code}",
+        'lat': round(25.0 + (number % 1000) * 0.025, 4),
+        'lon': round(-125.0 + (number // 1000) * 0.6, 4),
+        'country': 'US',
+    }
+
+
+def synthetic_state(lat, lon):
+    """The state the mock server reports for a coordinate (stable for the same point)."""
+    return STATE_NAMES[zlib.crc32(f"{float(lat):.4f},{float(lon):.4f}".encode()) % len(STATE_NAMES)]
+
+
+def synthetic_city(city, state):
+    """The place the mock server returns for a "city, state" query."""
+    point = zlib.crc32(f"{city.casefold()}|{state.casefold()}".encode())
+    return {
+        'name': city,
+        'lat': round(25.0 + (point % 10000) * 0.0025, 4),
+        'lon': round(-125.0 + (point // 10000 % 10000) * 0.006, 4),
+        'country': 'US',
+        'state': state,
+    }
+
+
+def answer_direct(params):
+    """(status, body) of /direct for the query parameters; only "City, Full State Name" queries are found."""
+    parts = [part.strip() for part in params.get('q', '').split(',')]
+    if not parts[0]:
+        return 400, {'cod': '400', 'message': 'Nothing to geocode'}
+    if len(parts) < 2 or parts[1] not in STATE_NAMES:
+        return 200, []
+    return 200, [synthetic_city(parts[0], parts[1])]
+
+
+def answer_zip(params):
+    """(status, body) of /zip for the query parameters."""
+    zip_code = params.get('zip', '').split(',')[0].strip()
+    if len(zip_code) != 5 or not zip_code.isdigit() or zip_code == '00000':
+        return 404, NOT_FOUND
+    return 200, synthetic_zip(zip_code)
+
+
+def answer_reverse(params):
+    """(status, body) of /reverse for the query parameters."""
+    try:
+        lat, lon = float(params['lat']), float(params['lon'])
+    except (KeyError, ValueError):
+        return 400, {'cod': '400', 'message': 'wrong latitude'}
+    return 200, [{'name': f"Place {lat:.4f},{lon:.4f}", 'lat': lat, 'lon': lon, 'country': 'US',
+                  'state': synthetic_state(lat, lon)}]
+
+
+# The endpoints, shared with geoloc_backends.MockBackend, which answers the same way without HTTP
+ANSWERS = {'/direct': answer_direct, '/zip': answer_zip, '/reverse': answer_reverse}
+
+
+class MockGeocodingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so the client's connection pool behaves as it does against the API
+    # Headers and body go out in one write. Written separately, Nagle's algorithm and delayed ACKs
+    # add ~40 ms to every keep-alive response.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        endpoint = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if endpoint == '/_stats':  # Request counts, for callers in another process
+            return self._send(200, server.snapshot())
+        server.count(endpoint)
+
+        delay = server.latency + (server.rng.uniform(0, server.jitter) if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if server.throttle_rate and server.rng.random() < server.throttle_rate:
+            return self._send(429, {'cod': 429, 'message': 'Too many requests'},
+                              {'Retry-After': str(server.retry_after)})
+        if server.error_rate and server.rng.random() < server.error_rate:
+            return self._send(503, {'cod': 503, 'message': 'Service unavailable'})
+        if not params.get('appid'):
+            return self._send(401, {'cod': 401, 'message': 'Invalid API key.'})
+
+        handler = ANSWERS.get(endpoint)
+        if handler is None:
+            return self._send(404, {'cod': '404', 'message': 'Internal error'})
+        status, body = handler(params)
+        self._send(status, body)
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # One log line per request would dominate a benchmark
+
+
+class MockGeocodingServer(ThreadingHTTPServer):
+    """Serves the mock API on a background thread; port 0 picks a free port.
+
+    latency (+ up to jitter) seconds are added to every response, and error_rate and
+    throttle_rate are the fractions of requests answered with a 503 or a 429 carrying
+    Retry-After: retry_after. seed makes the injected faults reproducible.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=0, seed=None):
+        super().__init__((host, port), MockGeocodingHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = Counter()  # endpoint -> number of requests received
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to pass to GeoLocationUtility(base_url=...)."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def _serve(connection, options):
+    server = MockGeocodingServer(**options)
+    connection.send(server.url)
+    connection.close()
+    server.serve_forever()
+
+
+class MockServerProcess:
+    """Runs a MockGeocodingServer in a child process.
+
+    Benchmarks use this so the server's threads don't compete with the client's for the GIL;
+    in process, the server roughly quadruples the measured request latency.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.url = None
+        self._process = None
+
+    @property
+    def requests(self):
+        """endpoint -> number of requests the server has received."""
+        with urlopen(f"{self.url}/_stats", timeout=10) as response:
+            return Counter(json.load(response))
+
+    def start(self):
+        parent, child = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=_serve, args=(child, self.options), daemon=True)
+        self._process.start()
+        child.close()
+        self.url = parent.recv()
+        parent.close()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local mock of the OpenWeatherMap geocoding API.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra random seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+
+    server = MockGeocodingServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                                 error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                                 retry_after=args.retry_after)
+    print(f"Mock geocoding API at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,121 @@
+# Parsing and validation of user-supplied locations. Every pattern and lookup table is built
+# once at import, so input that can't be a US ZIP code or "City, State" is rejected in
+# microseconds, before it can reach the cache or the network.
+#
+# Accepted forms:
+#   12345, 12345-6789, 123456789         ZIP and ZIP+4 (the +4 is dropped)
+#   "9 0 2 1 0", "<<90210>>"             digits in punctuation, when there are no letters and 5 or 9 digits
+#   Columbus, OH / Columbus, Ohio        city with a state code or name, in any case
+#   Columbus, OH, US                     optionally followed by the country (US, USA, United States)
+#   39.96,-83.0                          a coordinate, for reverse lookups (parse_point)
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from geoloc_states import state_name
+
+_ZIP = re.compile(r"(\d{5})(?:[-\s]?\d{4})?")
+_LETTER = re.compile(r"[^\W\d_]")
+_NON_DIGITS = re.compile(r"\D+")
+_WHITESPACE = re.compile(r"\s+")
+# Letters, digits, spaces and the punctuation found in US place names ("St. Louis", "Coeur d'Alene",
+# "Winston-Salem"), with at least one letter
+_CITY = re.compile(r"(?=.*[^\W\d_])[^\W_][\w .'’()-]*")
+US_COUNTRY_NAMES = frozenset({'us', 'usa', 'u.s.', 'u.s.a.', 'united states', 'united states of america'})
+MAX_CITY_LENGTH = 100
+
+# kind is 'zip' (query is the 5-digit ZIP, state None) or 'direct' (query is the city, state its full name)
+ParsedLocation = namedtuple('ParsedLocation', ['kind', 'query', 'state'])
+
+
+class InvalidLocationError(ValueError):
+    """Raised for input that is neither a US ZIP code nor a "City, State" pair."""
+
+
+def parse_state(value):
+    """Returns the full state name for a code or name, raising InvalidLocationError otherwise."""
+    name = state_name(value)
+    if name is None:
+        raise InvalidLocationError(f"Invalid State Code: {value}")
+    return name
+
+
+def _parse_zip(text):
+    match = _ZIP.fullmatch(text)
+    if match:
+        return ParsedLocation('zip', match.group(1), None)
+
+    # Lenient form: ZIP digits wrapped in spaces or punctuation, such as "9 0 2 1 0"
+    if not _LETTER.search(text):
+        digits = _NON_DIGITS.sub('', text)
+        if len(digits) in (5, 9):
+            return ParsedLocation('zip', digits[:5], None)
+    raise InvalidLocationError(f"Invalid ZIP code: {text}")
+
+
+def _parse_city_state(text):
+    parts = [part.strip() for part in text.split(',')]
+    if len(parts) == 3 and parts[2].casefold() in US_COUNTRY_NAMES:
+        parts.pop()
+    if len(parts) != 2:
+        raise InvalidLocationError(f'Expected "City, State" or "City, State, US": {text}')
+
+    city = _WHITESPACE.sub(' ', parts[0])
+    if len(city) > MAX_CITY_LENGTH or not _CITY.fullmatch(city):
+        raise InvalidLocationError(f"Invalid city name: {parts[0]}")
+    return ParsedLocation('direct', city, parse_state(parts[1]))
+
+
+@lru_cache(maxsize=4096)
+def _parse_text(text):
+    if not text:
+        raise InvalidLocationError("Empty location")
+    if ',' in text:
+        return _parse_city_state(text)
+    return _parse_zip(text)
+
+
+def parse_location(location):
+    """Parses a location into a ParsedLocation, raising InvalidLocationError for anything else.
+
+    Results are memoized, so locations that repeat across a batch are parsed once.
+    """
+    if not isinstance(location, str):
+        raise InvalidLocationError(f"Location must be a string, got {type(location).__name__}")
+    return _parse_text(location.strip())
+
+
+def parse_many(locations):
+    """Parses a batch of locations, returning a ParsedLocation or None (invalid input) for each one."""
+    parsed = []
+    append = parsed.append
+    for location in locations:
+        try:
+            append(parse_location(location))
+        except InvalidLocationError:
+            append(None)
+    return parsed
+
+
+def parse_point(point):
+    """Parses a coordinate, a "lat,lon" string or a (lat, lon) pair, into a (lat, lon) tuple of floats.
+
+    Raises InvalidLocationError for anything else, including latitudes outside +-90 and
+    longitudes outside +-180.
+    """
+    if isinstance(point, str):
+        parts = point.split(',')
+    else:
+        try:
+            parts = list(point)
+        except TypeError:
+            parts = ()
+    if len(parts) != 2:
+        raise InvalidLocationError(f'Expected "lat,lon": {point}')
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except (TypeError, ValueError):
+        raise InvalidLocationError(f"Invalid coordinates: {point}")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise InvalidLocationError(f"Coordinates out of range: {point}")
+    return lat, lon
@@ -0,0 +1,134 @@
+# Offline point-in-polygon lookup from a GeoJSON file of boundaries: US states (for example the
+# Census Bureau cartographic boundary files converted to GeoJSON), or places such as cities and towns.
+#
+# The index is a grid. A cell that no boundary crosses lies wholly inside one feature (or none), and
+# answers with a single dict lookup; most points land in such cells. A cell that boundaries do cross
+# keeps only the edges inside it, and whether its center is inside each feature: a point is then
+# inside when the segment from the center to the point crosses that feature's edges an even number
+# of times. No lookup walks a whole state outline, so telemetry-sized batches stay in process.
+
+import json
+import math
+
+# Size of the grid cells, in degrees. A power of two, so snapping a coordinate to its cell is exact.
+GRID_DEGREES = 0.25
+
+
+def _crossings(x0, y0, x1, y1, edges):
+    """Number of edges the segment (x0, y0) -> (x1, y1) crosses.
+
+    An edge endpoint on the segment's line counts as lying above it, as in the ray casting test,
+    so a segment through a vertex crosses exactly one of the two edges that meet there.
+    """
+    dx, dy = x1 - x0, y1 - y0
+    count = 0
+    for ax, ay, bx, by in edges:
+        if (dx * (ay - y0) - dy * (ax - x0) >= 0) == (dx * (by - y0) - dy * (bx - x0) >= 0):
+            continue
+        ex, ey = bx - ax, by - ay
+        if (ex * (y0 - ay) - ey * (x0 - ax) >= 0) != (ex * (y1 - ay) - ey * (x1 - ax) >= 0):
+            count += 1
+    return count
+
+
+class PolygonIndex:
+    """Answers "which feature contains this point" from GeoJSON polygons, without a network call."""
+
+    def __init__(self, features, name_property='name'):
+        self._features = []  # (name, properties)
+        self._interior = {}  # (cell_x, cell_y) -> feature index, for cells no boundary crosses
+        self._boundary = {}  # (cell_x, cell_y) -> [(feature index, center inside, edges in the cell)]
+
+        edges = []  # [(feature index, ax, ay, bx, by)]
+        for feature in features:
+            properties = feature.get('properties') or {}
+            name = properties.get(name_property) or properties.get(name_property.upper())
+            geometry = feature.get('geometry') or {}
+            if not name or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+                continue
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            index = len(self._features)
+            self._features.append((name, properties))
+            for ring in (ring for polygon in polygons for ring in polygon):
+                for i in range(len(ring)):
+                    (ax, ay), (bx, by) = ring[i - 1][:2], ring[i][:2]
+                    edges.append((index, ax, ay, bx, by))
+        self._build(edges)
+
+    @classmethod
+    def from_geojson(cls, path, name_property='name'):
+        with open(path, encoding='utf-8') as geojson_file:
+            collection = json.load(geojson_file)
+        return cls(collection.get('features', []), name_property=name_property)
+
+    def _cell(self, degrees):
+        return math.floor(degrees / GRID_DEGREES)
+
+    def _center(self, cell):
+        return (cell + 0.5) * GRID_DEGREES
+
+    def _build(self, edges):
+        cell_edges = {}  # cell -> {feature index: [edge, ...]}
+        row_crossings = {}  # (feature index, cell_y) -> longitudes where its edges cross the row's center line
+        for index, ax, ay, bx, by in edges:
+            # Every cell the edge's bounding box touches gets the edge; a few extra cells only cost time
+            for cell_x in range(self._cell(min(ax, bx)), self._cell(max(ax, bx)) + 1):
+                for cell_y in range(self._cell(min(ay, by)), self._cell(max(ay, by)) + 1):
+                    cell_edges.setdefault((cell_x, cell_y), {}).setdefault(index, []).append((ax, ay, bx, by))
+            for cell_y in range(self._cell(min(ay, by)), self._cell(max(ay, by)) + 1):
+                center = self._center(cell_y)
+                if (ay > center) != (by > center):
+                    row_crossings.setdefault((index, cell_y), []).append(ax + (center - ay) * (bx - ax) / (by - ay))
+
+        # Along each row, the cell centers between the 1st and 2nd, 3rd and 4th... crossings are inside
+        inside_centers = set()
+        for (index, cell_y), crossings in row_crossings.items():
+            crossings.sort()
+            for start, end in zip(crossings[::2], crossings[1::2]):
+                cell_x = self._cell(start)
+                while self._center(cell_x) < end:
+                    if self._center(cell_x) >= start:
+                        cell = (cell_x, cell_y)
+                        if cell in cell_edges:
+                            inside_centers.add((cell, index))
+                        else:
+                            self._interior.setdefault(cell, index)
+                    cell_x += 1
+
+        for cell, by_feature in cell_edges.items():
+            self._boundary[cell] = [(index, (cell, index) in inside_centers, feature_edges)
+                                    for index, feature_edges in by_feature.items()]
+        for cell, index in inside_centers:
+            if index not in cell_edges[cell]:  # Inside a feature, but crossed only by another's boundary
+                self._boundary[cell].append((index, True, ()))
+
+    def _find(self, lat, lon):
+        """Index of the feature containing the point, or None."""
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return None
+
+        cell = (self._cell(lon), self._cell(lat))
+        index = self._interior.get(cell)
+        if index is not None:
+            return index
+        center_x, center_y = self._center(cell[0]), self._center(cell[1])
+        for index, center_inside, edges in self._boundary.get(cell, ()):
+            if center_inside != (_crossings(center_x, center_y, lon, lat, edges) % 2 == 1):
+                return index
+        return None
+
+    def lookup(self, lat, lon):
+        """Returns the name of the feature containing the point, or None."""
+        index = self._find(lat, lon)
+        return None if index is None else self._features[index][0]
+
+    def lookup_feature(self, lat, lon):
+        """Returns (name, GeoJSON properties) of the feature containing the point, or None."""
+        index = self._find(lat, lon)
+        return None if index is None else self._features[index]
+
+
+class StatePolygonIndex(PolygonIndex):
+    """Answers "which state contains this point" from GeoJSON state boundaries."""
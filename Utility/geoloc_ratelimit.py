@@ -0,0 +1,94 @@
+# Client-side throttling for the geocoding API: a token bucket that keeps us under the
+# configured request budget, and the retry/backoff policy used for 429 and 5xx responses.
+
+import random
+import threading
+import time
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def parse_rate(value):
+    """Parses "10", "10/s", "600/min" or "36000/h" into requests per second."""
+    units = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600}
+    count, _, unit = str(value).partition('/')
+    unit = unit.strip().lower() or 's'
+    if unit not in units:
+        raise ValueError(f"Invalid rate unit: {unit}")
+    rate = float(count) / units[unit]
+    if rate <= 0:
+        raise ValueError(f"Rate must be positive: {value}")
+    return rate
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `capacity`.
+
+    The same bucket can be shared by worker threads and by coroutines (acquire_async).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token and returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance means the token is borrowed from the future; wait until it is earned
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        """Blocks until the caller may send one request."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Waits, without blocking the event loop, until the caller may send one request."""
+        import asyncio  # Only async callers pay for importing asyncio
+
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for 429 and 5xx responses, honoring Retry-After."""
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=30.0, retry_statuses=RETRYABLE_STATUSES):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+
+    def retryable(self, status_code):
+        return status_code in self.retry_statuses
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based)."""
+        server_delay = self._parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _parse_retry_after(self, value):
+        """Retry-After is either a number of seconds or an HTTP date."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        from email.utils import parsedate_to_datetime  # Rare, and slow to import
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
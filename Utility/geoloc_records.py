@@ -0,0 +1,302 @@
+# Compact result records. A decoded API answer is a dict per place, and a /direct or /reverse
+# place carries a `local_names` map of up to a few dozen translations; held for a million-row
+# batch, those dicts are most of the process's memory. Location keeps only the fields the
+# utility uses, in __slots__, and keeps local_names as UTF-8 JSON until someone reads it.
+# LocationBatch holds a whole batch as columns, ready to hand to NumPy or Arrow.
+#
+#   batch = LocationBatch.from_results(geo_util.resolve_many(locations))
+#   frame = pandas.DataFrame(batch.to_numpy())
+
+import json
+import math
+import sys
+from array import array
+
+# Fields a Location keeps, in the order the API sends them; anything else in a response is dropped
+FIELDS = ('name', 'local_names', 'lat', 'lon', 'country', 'state', 'zip')
+
+
+def is_place(data):
+    """True for a place record, False for an error such as {'cod': '404', 'message': 'not found'}."""
+    if isinstance(data, Location):
+        return True
+    return isinstance(data, dict) and 'cod' not in data and 'message' not in data
+
+
+def to_records(payload, local_names=True):
+    """Typed form of a decoded response or cache entry: a list of Locations and ApiErrors.
+
+    A lone dict (a /zip answer, or an error) becomes a one-item list; None and other values are
+    returned as they are. Without local_names, places drop their translated names.
+    """
+    if isinstance(payload, dict):
+        payload = [payload]
+    elif not isinstance(payload, list):
+        return payload
+    return [_record(data, local_names) for data in payload]
+
+
+def _record(data, local_names):
+    if not isinstance(data, dict):
+        return data  # Already typed, or something no record can stand for
+    if is_place(data):
+        return Location.from_dict(data, local_names=local_names)
+    return ApiError.from_dict(data)
+
+
+def encode_default(value):
+    """json.dumps default= hook that writes Locations and ApiErrors as the API's dicts."""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _Record:
+    """Dict-style access to the fields of a __slots__ record; a field set to None is absent."""
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def to_dict(self):
+        """The record as the API's dict, with the fields it has."""
+        return {field: value for field, value in self.items()}
+
+    def keys(self):
+        return [field for field in self.FIELDS if field in self]
+
+    def items(self):
+        return [(field, self[field]) for field in self.keys()]
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in self.FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __setitem__(self, field, value):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in self.FIELDS and getattr(self, field) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # Mutable, like the dict it stands in for
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Location(_Record):
+    """One place from a lookup, with only the fields the utility uses.
+
+    It reads like the API's dict (record['name'], record.get('state', 'Unknown'), 'cod' in record)
+    and compares equal to it, so code written against the raw responses keeps working. A field
+    the API didn't send is absent, not None.
+    """
+
+    __slots__ = ('name', 'lat', 'lon', 'country', 'state', 'zip', '_local_names')
+    FIELDS = FIELDS
+
+    def __init__(self, name=None, lat=None, lon=None, country=None, state=None, zip_code=None, local_names=None):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.country = country
+        self.state = state
+        self.zip = zip_code
+        self.local_names = local_names
+
+    @classmethod
+    def from_dict(cls, data, local_names=True):
+        record = cls.__new__(cls)
+        record.name = data.get('name')
+        record.lat = data.get('lat')
+        record.lon = data.get('lon')
+        # A few dozen distinct values across any batch: share one string object for each
+        record.country = _intern(data.get('country'))
+        record.state = _intern(data.get('state'))
+        record.zip = data.get('zip')
+        record.local_names = data.get('local_names') if local_names else None
+        return record
+
+    @property
+    def local_names(self):
+        """The {language: name} map, decoded on every access; None when the API sent none."""
+        if self._local_names is None:
+            return None
+        return json.loads(self._local_names)
+
+    @local_names.setter
+    def local_names(self, value):
+        # One bytes object instead of a dict of a few dozen small strings
+        self._local_names = None if value is None else json.dumps(
+            value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def __contains__(self, field):
+        if field == 'local_names':
+            return self._local_names is not None  # Without decoding them
+        return super().__contains__(field)
+
+
+class ApiError(_Record):
+    """An error answer from the API, such as {'cod': '404', 'message': 'not found'}.
+
+    Reads and compares like that dict. cod is kept as the API sent it, a string or a number.
+    """
+
+    __slots__ = ('cod', 'message')
+    FIELDS = ('cod', 'message')
+
+    def __init__(self, cod, message=None):
+        self.cod = cod
+        self.message = message
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('cod'), data.get('message'))
+
+    @classmethod
+    def from_response(cls, status, body):
+        """The error for a non-2xx answer: the API's own cod and message when the body has them."""
+        from geoloc_decode import loads
+
+        try:
+            data = loads(body) if body.strip() else None
+        except ValueError:
+            data = None  # An HTML error page from a proxy, say
+        return cls.from_payload(status, data)
+
+    @classmethod
+    def from_payload(cls, status, data):
+        """from_response for a body that is already decoded."""
+        if isinstance(data, dict) and ('cod' in data or 'message' in data):
+            return cls(data.get('cod', status), data.get('message'))
+        return cls(status, f"HTTP {status}")
+
+    @property
+    def status(self):
+        """cod as an int, or None when it isn't a number."""
+        try:
+            return int(self.cod)
+        except (TypeError, ValueError):
+            return None
+
+
+class LocationBatch:
+    """The results of a batch as columns: one row per place found, or per failed lookup.
+
+    Rows are flattened like the jsonl/csv output (see geoloc_io.result_rows). lat and lon are
+    array('d') columns with NaN where there is no coordinate, which NumPy can use without a copy;
+    the text columns are lists with None for a missing value.
+    """
+
+    COLUMNS = ('location', 'name', 'state', 'country', 'lat', 'lon', 'zip', 'error')
+
+    def __init__(self):
+        self.location = []
+        self.name = []
+        self.state = []
+        self.country = []
+        self.lat = array('d')
+        self.lon = array('d')
+        self.zip = []
+        self.error = []
+
+    @classmethod
+    def from_results(cls, results):
+        """Builds a batch from resolve_many, resolve_iter or reverse_many results."""
+        batch = cls()
+        for result in results:
+            batch.append(result)
+        return batch
+
+    def append(self, result):
+        """Adds the rows of one {'location', 'data', 'error'} result."""
+        error = result['error']
+        if error is None and not result['data']:
+            error = 'not found'
+        if error is not None:
+            self._append_row(result['location'], None, error)
+            return
+        for data in result['data']:
+            if is_place(data):
+                self._append_row(result['location'], data, None)
+            else:  # Error payload from the API, e.g. {'cod': '404', 'message': 'not found'}
+                self._append_row(result['location'], None, data.get('message', str(data.get('cod'))))
+
+    def _append_row(self, location, data, error):
+        data = data if data is not None else {}
+        self.location.append(location)
+        self.name.append(data.get('name'))
+        self.state.append(data.get('state'))
+        self.country.append(data.get('country'))
+        self.lat.append(_coordinate(data.get('lat')))
+        self.lon.append(_coordinate(data.get('lon')))
+        self.zip.append(data.get('zip'))
+        self.error.append(error)
+
+    def __len__(self):
+        return len(self.location)
+
+    def columns(self):
+        """{column name: sequence}, in COLUMNS order."""
+        return {column: getattr(self, column) for column in self.COLUMNS}
+
+    def rows(self):
+        """Yields each row as a dict, like geoloc_io.result_rows does (missing coordinates are None)."""
+        for index in range(len(self)):
+            row = {column: getattr(self, column)[index] for column in self.COLUMNS}
+            for column in ('lat', 'lon'):
+                if math.isnan(row[column]):
+                    row[column] = None
+            yield row
+
+    def to_numpy(self):
+        """{column name: numpy array}. lat and lon are float64 views of the columns, the rest object arrays."""
+        import numpy  # Optional; only this method needs it
+
+        arrays = {}
+        for column, values in self.columns().items():
+            if isinstance(values, array):
+                arrays[column] = numpy.frombuffer(values, dtype=numpy.float64)
+            else:
+                arrays[column] = numpy.array(values, dtype=object)
+        return arrays
+
+    def to_arrow(self):
+        """A pyarrow.Table of the batch, with nulls for missing coordinates."""
+        import pyarrow  # Optional; only this method needs it
+
+        columns = self.columns()
+        for column in ('lat', 'lon'):
+            columns[column] = pyarrow.array(columns[column], type=pyarrow.float64(), from_pandas=True)  # NaN as null
+        return pyarrow.table(columns)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,287 @@
+# Service mode: one warm GeoLocationUtility behind a local HTTP endpoint. Its keep-alive
+# connections, cache, gazetteer and in-flight lookups are shared by every caller, so a lookup
+# costs a local round trip instead of a process start, a cold cache and a new TLS handshake.
+#
+#   GET  /lookup?location=12345          one location (repeat location= for a small batch)
+#   POST /lookup  {"locations": [...]}   a batch, resolved concurrently, results in input order
+#   GET  /suggest?q=colu&state=OH&k=10   city autocomplete, with --fuzzy
+#   GET  /healthz                        liveness, and the circuit breaker state with --fail-fast
+#   GET  /stats                          counters and phase timings as JSON (?format=prometheus)
+#
+# Results are the {'location', 'data', 'error'} dicts returned by resolve_many.
+#
+#   python geoloc_util.py --serve 8080 --concurrency 8
+#   python geoloc_util.py --serve unix:/tmp/geoloc.sock --cache geocache.sqlite
+#   curl --unix-socket /tmp/geoloc.sock "http://localhost/lookup?location=Columbus,%20OH"
+
+import errno
+import json
+import os
+import signal
+import socket
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlsplit
+from geoloc_records import encode_default
+
+MAX_BATCH = 1000  # Locations in one request; larger batches are rejected with 413
+MAX_BODY = 1024 * 1024
+MAX_SUGGESTIONS = 100  # Largest k a /suggest request gets
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle keep-alive connection is held open
+
+
+class GeoLocationRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    wbufsize = -1  # Headers and body in one write; see MockGeocodingHandler
+
+    def setup(self):
+        self.disable_nagle_algorithm = self.server.address_family != socket.AF_UNIX
+        super().setup()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/lookup':
+            locations = params.get('location')
+            if not locations:
+                return self._send(400, {'error': 'missing location parameter'})
+            if len(locations) == 1:
+                return self._send(200, self.server.utility.resolve_location(locations[0]))
+            return self._resolve_batch(locations)
+        if url.path == '/suggest' and self.server.utility.city_index is not None:
+            prefix = params.get('q', [''])[0]
+            if not prefix:
+                return self._send(400, {'error': 'missing q parameter'})
+            try:
+                k = int(params.get('k', ['10'])[0])
+            except ValueError:
+                return self._send(400, {'error': 'k must be an integer'})
+            state = params.get('state', [None])[0]
+            suggestions = self.server.utility.city_index.suggest(prefix, state=state, k=min(k, MAX_SUGGESTIONS))
+            return self._send(200, suggestions)
+        if url.path == '/healthz':
+            health = {'status': 'ok'}
+            breaker = self.server.utility.breaker
+            if breaker is not None:
+                # Still 200: the service is alive and answers from its cache, only the API is not
+                health['circuit'] = breaker.state
+            router = self.server.utility.router
+            if router is not None:
+                health['backends'] = router.snapshot()
+            return self._send(200, health)
+        if url.path == '/stats' and hasattr(self.server.utility.metrics, 'snapshot'):
+            metrics = self.server.utility.metrics
+            if params.get('format') == ['prometheus']:
+                return self._send_text(200, metrics.to_prometheus())
+            return self._send(200, metrics.snapshot())
+        self._send(404, {'error': f"no route for {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/lookup':
+            return self._send(404, {'error': f"no route for {self.path}"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True  # Where the body ends is unknown, so the connection can't be reused
+            return self._send(400, {'error': 'Content-Length must be a non-negative integer'})
+        if length > MAX_BODY:
+            self.close_connection = True  # The body is not read, so the connection can't be reused
+            return self._send(413, {'error': f"request body is larger than {MAX_BODY} bytes"})
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._send(400, {'error': 'request body is not valid JSON'})
+        locations = payload.get('locations') if isinstance(payload, dict) else payload
+        if not isinstance(locations, list) or not all(isinstance(location, str) for location in locations):
+            return self._send(400, {'error': 'expected {"locations": [...]} with a list of strings'})
+        self._resolve_batch(locations)
+
+    def _resolve_batch(self, locations):
+        server = self.server
+        if len(locations) > server.max_batch:
+            return self._send(413, {'error': f"at most {server.max_batch} locations per request"})
+        results = server.utility.resolve_many(locations, max_concurrency=server.max_concurrency)
+        self._send(200, {'results': results})
+
+    def _send(self, status, body):
+        self._send_bytes(status, json.dumps(body, default=encode_default).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _send_text(self, status, text):
+        self._send_bytes(status, text.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+
+    def _send_bytes(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            client = self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+            print(f"{client} - {format % args}", flush=True)
+
+
+class _GeoLocationService:
+    """Request routing state and graceful shutdown shared by the TCP and Unix socket servers.
+
+    Handler threads are not daemons: stop() stops accepting, lets requests in progress write
+    their responses, closes idle keep-alive connections and waits for every handler to return.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+    request_queue_size = 128
+
+    def _setup_service(self, utility, max_concurrency, max_batch, access_log):
+        self.utility = utility
+        self.max_concurrency = max_concurrency
+        self.max_batch = max_batch
+        self.access_log = access_log
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self._thread = None
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def _drain(self):
+        # Shutting down the read side wakes handlers waiting for a next keep-alive request with
+        # EOF; a handler still resolving a lookup writes its response and then sees the same EOF.
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def start(self):
+        """Serves on a background thread; stop() shuts it down."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._drain()
+        self.server_close()
+
+    def serve_until_signalled(self, signals=(signal.SIGINT, signal.SIGTERM)):
+        """Serves on the calling (main) thread until one of signals arrives, then shuts down gracefully."""
+        def request_shutdown(signum, frame):
+            # shutdown() waits for serve_forever to return, so it can't run on this thread
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+        previous = {signum: signal.signal(signum, request_shutdown) for signum in signals}
+        try:
+            self.serve_forever()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self._drain()
+            self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class GeoLocationServer(_GeoLocationService, ThreadingHTTPServer):
+    """Serves a GeoLocationUtility over HTTP on (host, port); port 0 picks a free port.
+
+    Each connection is handled on its own thread, and a batch is resolved with up to
+    max_concurrency lookups in parallel.
+    """
+
+    def __init__(self, utility, address=("127.0.0.1", 0), max_concurrency=8, max_batch=MAX_BATCH, access_log=False):
+        self._setup_service(utility, max_concurrency, max_batch, access_log)
+        if ':' in address[0]:
+            self.address_family = socket.AF_INET6
+        super().__init__(address, GeoLocationRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://[{host}]:{port}" if ':' in host else f"http://{host}:{port}"
+
+
+class UnixGeoLocationServer(_GeoLocationService, ThreadingMixIn, UnixStreamServer):
+    """GeoLocationServer on a Unix domain socket, for callers on the same host.
+
+    A stale socket left by a previous run is replaced, but anything else at path (a regular
+    file, or the socket of a server still listening) raises OSError. The socket is removed on close.
+    """
+
+    def __init__(self, utility, path, max_concurrency=8, max_batch=MAX_BATCH, access_log=False):
+        self._setup_service(utility, max_concurrency, max_batch, access_log)
+        self._socket_id = None
+        remove_stale_socket(path)
+        super().__init__(path, GeoLocationRequestHandler)
+
+    def server_bind(self):
+        super().server_bind()
+        info = os.lstat(self.server_address)
+        self._socket_id = (info.st_dev, info.st_ino)  # So close removes this socket and nothing put there since
+
+    @property
+    def url(self):
+        return f"unix:{self.server_address}"
+
+    def server_close(self):
+        super().server_close()
+        try:
+            info = os.lstat(self.server_address)
+        except FileNotFoundError:
+            return
+        if (info.st_dev, info.st_ino) == self._socket_id:
+            os.unlink(self.server_address)
+
+
+def remove_stale_socket(path):
+    """Removes a Unix socket at path that no server is listening on.
+
+    Raises OSError when path is something else, or a socket a server still answers on.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "Not a socket; refusing to replace it", path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)  # Left by a server that is gone
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "Another server is listening on this socket", path)
+
+
+def make_server(utility, address, max_concurrency=8, max_batch=MAX_BATCH, access_log=False):
+    """Returns a server for address: (host, port) for TCP, or the path of a Unix socket."""
+    if isinstance(address, str):
+        return UnixGeoLocationServer(utility, address, max_concurrency, max_batch, access_log)
+    return GeoLocationServer(utility, address, max_concurrency, max_batch, access_log)
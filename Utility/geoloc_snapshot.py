@@ -0,0 +1,177 @@
+# Precomputed lookup snapshots. A host that starts with an empty cache pays the full API latency
+# until it has seen the hot keys; a snapshot of a warm cache lets a fleet ship those lookups
+# instead. The file is memory-mapped and searched in place, so opening it costs nothing however
+# many entries it holds, and every process on a host shares one copy in the page cache.
+#
+#   python geoloc_util.py --input hot.txt --concurrency 16 --warm --export-snapshot hot.snap
+#   python geoloc_util.py --snapshot hot.snap --input addresses.txt
+#   python geoloc_snapshot.py import hot.snap geocache.sqlite
+#
+# Layout (little-endian, every section padded to 8 bytes):
+#   header         magic, version, n_entries, n_key_bytes, n_value_bytes, created (unix time)
+#   expires        float64[n_entries]       unix time each entry stops being valid
+#   key offsets    uint64[n_entries + 1]    into the key bytes; keys are sorted by their UTF-8 bytes
+#   value offsets  uint64[n_entries + 1]    into the value bytes
+#   key bytes, value bytes                  UTF-8; a value is the cached JSON, "null" for "not found"
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_left
+from geoloc_mapped import close_mapping, little_endian, padding
+
+MAGIC = b"GSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQd")
+
+
+def write_snapshot(entries, path):
+    """Writes (key, expires_at, encoded value) entries, e.g. from GeoCache.entries(), to a snapshot file.
+
+    The file is written next to path and renamed into place, so readers never see half of it.
+    Returns the number of entries written.
+    """
+    rows = sorted((key.encode('utf-8'), expires_at, encoded.encode('utf-8')) for key, expires_at, encoded in entries)
+    key_offsets, value_offsets = [0], [0]
+    for key, _, value in rows:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(value))
+
+    sections = [
+        little_endian('d', [row[1] for row in rows]).tobytes(),
+        little_endian('Q', key_offsets).tobytes(),
+        little_endian('Q', value_offsets).tobytes(),
+        b"".join(row[0] for row in rows),
+        b"".join(row[2] for row in rows),
+    ]
+    temporary = path + ".tmp"
+    with open(temporary, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, len(rows), key_offsets[-1], value_offsets[-1], time.time()))
+        out.write(b"\0" * padding(HEADER.size))
+        for data in sections:
+            out.write(data)
+            out.write(b"\0" * padding(len(data)))
+    os.replace(temporary, path)
+    return len(rows)
+
+
+def export_snapshot(cache, path):
+    """Writes every unexpired entry of a GeoCache to a snapshot file; returns how many."""
+    return write_snapshot(cache.entries(), path)
+
+
+def import_snapshot(cache, path):
+    """Copies the unexpired entries of a snapshot file into a GeoCache; returns how many were stored."""
+    with Snapshot(path) as snapshot:
+        return cache.load(snapshot.entries())
+
+
+class Snapshot:
+    """Memory-mapped, read-only snapshot written by write_snapshot; pass it to GeoCache(snapshot=...)."""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise RuntimeError("The snapshot format is little-endian; big-endian hosts are not supported")
+
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} snapshot file")
+        magic, version, _, count, n_key_bytes, n_value_bytes, created = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} snapshot file")
+        self.count = count
+        self.created = created
+
+        position = HEADER.size + padding(HEADER.size)
+
+        def section(size, typecode=None):
+            nonlocal position
+            view = self._view[position:position + size]
+            position += size + padding(size)
+            return view.cast(typecode) if typecode else view
+
+        self._expires = section(count * 8, 'd')
+        self._key_offsets = section((count + 1) * 8, 'Q')
+        self._value_offsets = section((count + 1) * 8, 'Q')
+        self._keys = section(n_key_bytes)
+        self._values = section(n_value_bytes)
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, row):
+        return self._keys[self._key_offsets[row]:self._key_offsets[row + 1]].tobytes()
+
+    def _entry(self, row):
+        value = self._values[self._value_offsets[row]:self._value_offsets[row + 1]].tobytes().decode('utf-8')
+        return self._expires[row], value
+
+    def get_entry(self, key):
+        """Returns (expires_at, encoded value) for a key, or None when the snapshot doesn't have it."""
+        target = key.encode('utf-8')
+        row = bisect_left(range(self.count), target, key=self._key)
+        if row == self.count or self._key(row) != target:
+            return None
+        return self._entry(row)
+
+    def entries(self, prefix=""):
+        """Yields (key, expires_at, encoded value) for the entries whose key starts with prefix, in key order."""
+        target = prefix.encode('utf-8')
+        row = bisect_left(range(self.count), target, key=self._key)
+        while row < self.count:
+            key = self._key(row)
+            if not key.startswith(target):
+                break
+            yield (key.decode('utf-8'), *self._entry(row))
+            row += 1
+
+    def close(self):
+        close_mapping(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    from geoloc_cache import GeoCache
+
+    parser = argparse.ArgumentParser(description="Move lookup snapshots in and out of a SQLite cache.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="Write the unexpired entries of a --cache file to a snapshot")
+    export.add_argument('cache_path')
+    export.add_argument('snapshot_path')
+    load = subparsers.add_parser('import', help="Copy a snapshot into a --cache file, keeping newer entries")
+    load.add_argument('snapshot_path')
+    load.add_argument('cache_path')
+    info = subparsers.add_parser('info', help="Describe a snapshot")
+    info.add_argument('snapshot_path')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        with Snapshot(args.snapshot_path) as snapshot:
+            now = time.time()
+            expired = sum(1 for expires_at in snapshot._expires if expires_at <= now)
+            print(f"{len(snapshot)} entries ({expired} expired), written "
+                  f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.created))}")
+    else:
+        cache = GeoCache(path=args.cache_path)
+        try:
+            if args.command == 'export':
+                count = export_snapshot(cache, args.snapshot_path)
+                print(f"Wrote {count} entries to {args.snapshot_path}")
+            else:
+                count = import_snapshot(cache, args.snapshot_path)
+                print(f"Imported {count} entries into {args.cache_path}")
+        finally:
+            cache.close()
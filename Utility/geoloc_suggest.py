@@ -0,0 +1,217 @@
+# In-process city index for autocomplete and spelling correction. Names from the gazetteer and
+# from cached /direct answers are kept in sorted arrays for prefix search and in a trigram index
+# for near misses, so a typeahead can be answered on every keystroke, and "Colombus, OH" can be
+# corrected to Columbus, without a request to the API.
+#
+#   python geoloc_util.py --gazetteer us_zips.gaz --fuzzy --locations "Colombus, OH"
+#   curl "http://127.0.0.1:8080/suggest?q=colu&state=OH"     (with --serve)
+
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import nlargest
+from geoloc_gazetteer import city_key
+from geoloc_states import state_name
+
+MAX_CANDIDATES = 32  # Trigram candidates checked by edit distance, the ones sharing the most trigrams first
+
+
+def normalize(name):
+    """Search form of a city name: case-folded, without periods and apostrophes, hyphens as spaces."""
+    return ' '.join(name.casefold().replace('.', '').replace("'", '').replace('-', ' ').split())
+
+
+def _trigrams(text):
+    """(trigram, position) pairs of text. Padded at the front only, so a prefix shares all of its own."""
+    padded = "  " + text
+    return [(padded[i:i + 3], i) for i in range(len(padded) - 2)]
+
+
+def allowed_edits(text):
+    """Typos tolerated in a name: none up to 4 characters, one up to 8, two beyond."""
+    return 0 if len(text) <= 4 else 1 if len(text) <= 8 else 2
+
+
+def edit_distance(a, b, limit, prefix=False):
+    """Edit distance between a and b (an adjacent transposition counts as one edit), or limit + 1 if larger.
+
+    With prefix, the distance between a and the closest prefix of b. Only the band of cells within
+    limit of the diagonal is computed, since anything outside it is over the limit anyway.
+    """
+    if prefix:
+        b = b[:len(a) + limit]
+    elif abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    before = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        char_a = a[i - 1]
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            char_b = b[j - 1]
+            value = previous[j - 1] + (char_a != char_b)
+            if previous[j] < value:
+                value = previous[j] + 1
+            if current[j - 1] < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b and before[j - 2] < value:
+                value = before[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return over
+        before, previous = previous, current
+    distance = min(previous) if prefix else previous[-1]
+    return distance if distance < over else over
+
+
+class CityIndex:
+    """Prefix and fuzzy search over known US cities.
+
+    suggest() completes a prefix, filling up with near misses when few names start with it, and
+    correct() finds the city a misspelled name most likely meant. Both answer with records shaped
+    like the API's. Adding cities is safe while other threads search.
+    """
+
+    def __init__(self):
+        self._cities = []  # (name, state, lat, lon)
+        self._texts = []  # normalize(name) of each city
+        self._ids = {}  # city_key -> index into _cities
+        self._sorted = []  # (normalized name, id), sorted, for prefix search
+        self._by_state = {}  # state name -> the same, for one state
+        # (trigram, position) -> ids of the names with that trigram there, and the same per state under
+        # (state, trigram, position). An edit moves the trigrams after it by one position at most, so a
+        # name within n edits has its surviving trigrams within n positions of the query's.
+        self._trigrams = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_sources(cls, gazetteer=None, cache=None):
+        """Builds an index from the cities of a Gazetteer and the /direct answers in a GeoCache."""
+        index = cls()
+        if gazetteer is not None:
+            index.add_many(gazetteer.iter_cities())
+        if cache is not None:
+            index.add_many((record.get('name'), record.get('state'), record.get('lat'), record.get('lon'))
+                           for _, value in cache.items("direct:") if isinstance(value, list)
+                           for record in value if isinstance(record, dict))
+        return index
+
+    def __len__(self):
+        return len(self._cities)
+
+    def add(self, name, state, lat, lon):
+        """Adds one city; returns False for a city already indexed or a record without a name and state."""
+        return self.add_many([(name, state, lat, lon)]) == 1
+
+    def add_many(self, cities):
+        """Adds (name, state, lat, lon) tuples, sorting once for the whole lot; returns how many were new."""
+        added = []
+        with self._lock:
+            for name, state, lat, lon in cities:
+                state = state_name(state) if isinstance(state, str) else None
+                if not name or state is None:
+                    continue
+                key = city_key(name, state)
+                if key in self._ids:
+                    continue
+                city_id = self._ids[key] = len(self._cities)
+                self._cities.append((name, state, lat, lon))
+                self._texts.append(normalize(name))
+                added.append((self._texts[city_id], city_id))
+            if not added:
+                return 0
+
+            if len(added) < 32:
+                for entry in added:
+                    insort(self._sorted, entry)
+                    insort(self._by_state.setdefault(self._cities[entry[1]][1], []), entry)
+            else:
+                self._sorted = sorted(self._sorted + added)
+                by_state = {state: list(entries) for state, entries in self._by_state.items()}
+                for entry in added:
+                    by_state.setdefault(self._cities[entry[1]][1], []).append(entry)
+                self._by_state = {state: sorted(entries) for state, entries in by_state.items()}
+            for text, city_id in added:
+                state = self._cities[city_id][1]
+                for trigram, position in _trigrams(text):
+                    self._trigrams.setdefault((trigram, position), []).append(city_id)
+                    self._trigrams.setdefault((state, trigram, position), []).append(city_id)
+        return len(added)
+
+    def _record(self, city_id):
+        name, state, lat, lon = self._cities[city_id]
+        return {'name': name, 'lat': lat, 'lon': lon, 'country': 'US', 'state': state}
+
+    def _state(self, state):
+        """The full state name to filter on, None for no filter, or False for a state that doesn't exist."""
+        if state is None:
+            return None
+        return state_name(state) or False
+
+    def suggest(self, prefix, state=None, k=10):
+        """Up to k cities whose name starts with prefix, in alphabetical order, then the nearest misses."""
+        text = normalize(prefix)
+        state = self._state(state)
+        if not text or state is False or k < 1:
+            return []
+
+        entries = self._sorted if state is None else self._by_state.get(state, [])
+        ids = []
+        position = bisect_left(entries, (text,))
+        while position < len(entries) and len(ids) < k and entries[position][0].startswith(text):
+            ids.append(entries[position][1])
+            position += 1
+        if len(ids) < k:
+            seen = set(ids)
+            ids.extend(city_id for _, city_id in self._near(text, state, prefix=True) if city_id not in seen)
+        return [self._record(city_id) for city_id in ids[:k]]
+
+    def correct(self, city, state=None):
+        """The city a misspelled name most likely meant, or None.
+
+        Only names within allowed_edits of the input qualify, and only when one of them is closer
+        than the rest; an ambiguous correction is no correction.
+        """
+        text = normalize(city)
+        state = self._state(state)
+        if not text or state is False:
+            return None
+        if state is not None and city_key(city, state) in self._ids:
+            return self._record(self._ids[city_key(city, state)])
+        matches = self._near(text, state)
+        if not matches or (len(matches) > 1 and matches[1][0] == matches[0][0]):
+            return None
+        return self._record(matches[0][1])
+
+    def _near(self, text, state, prefix=False):
+        """[(distance, id)] of the names within allowed_edits of text, closest first."""
+        limit = allowed_edits(text)
+        if limit == 0:
+            return []
+        trigrams = _trigrams(text)
+        counts = Counter()
+        for trigram, position in trigrams:
+            for shifted in range(max(0, position - limit), position + limit + 1):
+                counts.update(self._trigrams.get((trigram, shifted) if state is None else (state, trigram, shifted), ()))
+        # Each edit changes at most three trigrams
+        needed = max(1, len(trigrams) - 3 * limit)
+        if prefix:
+            candidates = [city_id for city_id, count in counts.items() if count >= needed]
+        else:  # A whole name can't be more than limit characters longer or shorter
+            texts, length = self._texts, len(text)
+            candidates = [city_id for city_id, count in counts.items()
+                          if count >= needed and abs(len(texts[city_id]) - length) <= limit]
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = nlargest(MAX_CANDIDATES, candidates, key=counts.__getitem__)
+
+        matches = []
+        for city_id in candidates:
+            distance = edit_distance(text, self._texts[city_id], limit, prefix=prefix)
+            if distance <= limit:
+                matches.append((distance, city_id))
+        matches.sort(key=lambda match: (match[0], self._cities[match[1]][0]))
+        return matches
@@ -0,0 +1,126 @@
+# Time limits for lookups, so a stalled upstream can't dominate a batch: connect and read
+# timeouts for each request, a deadline for a whole batch, and hedged requests that send a
+# second copy of a request once it has taken longer than most requests do.
+#
+# The batch deadline lives in a context variable. resolve_many sets it, request code reads it
+# through remaining(), and propagate() carries it into the worker threads of a thread pool
+# (asyncio tasks inherit it on their own).
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 10.0
+
+_deadline = contextvars.ContextVar('geoloc_deadline', default=None)  # time.monotonic() at which it expires
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised for a lookup that would start, or retry, after its batch deadline."""
+
+    def __init__(self):
+        super().__init__("deadline exceeded")
+
+
+@contextmanager
+def deadline(seconds):
+    """Sets a deadline `seconds` from now for the lookups run inside the block (None for no deadline)."""
+    if seconds is None:
+        yield
+        return
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is no deadline."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def check_deadline():
+    """Raises DeadlineExceeded when the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def request_timeout(connect_timeout, read_timeout):
+    """The (connect, read) timeouts for a request sent now: the configured ones, cut short by the deadline."""
+    left = remaining()
+    if left is None:
+        return connect_timeout, read_timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(connect_timeout, left), min(read_timeout, left)
+
+
+def propagate(fn):
+    """Wraps fn so that, run on another thread, it sees the deadline of the thread that wrapped it."""
+    expires = _deadline.get()
+    if expires is None:
+        return fn
+
+    def run(*args):
+        token = _deadline.set(expires)
+        try:
+            return fn(*args)
+        finally:
+            _deadline.reset(token)
+    return run
+
+
+class HedgePolicy:
+    """Hedges a request (sends a duplicate) once it has been out longer than `percentile` of recent requests.
+
+    Until min_samples latencies have been seen, initial_delay is used. Each hedge is a second request
+    against the API quota, so at most max_ratio of requests are hedged.
+    """
+
+    def __init__(self, percentile=0.95, initial_delay=1.0, min_delay=0.01, window=512, min_samples=20,
+                 max_ratio=0.1):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.requests = 0  # Requests observed
+        self.hedges = 0  # Hedged requests sent
+        self._samples = []  # Ring buffer of the latest `window` latencies
+        self._delay = initial_delay
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Records how long a (first, unhedged) request took."""
+        with self._lock:
+            if len(self._samples) < self.window:
+                self._samples.append(seconds)
+            else:
+                self._samples[self.requests % self.window] = seconds
+            self.requests += 1
+            # Sorting the window on every request would cost more than it saves; every 16th is plenty
+            if self.requests % 16 == 0 and len(self._samples) >= self.min_samples:
+                ordered = sorted(self._samples)
+                index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+                self._delay = max(self.min_delay, ordered[index])
+
+    def delay(self):
+        """Seconds to wait for the first request before hedging it."""
+        with self._lock:
+            return self._delay if len(self._samples) >= self.min_samples else self.initial_delay
+
+    def should_hedge(self):
+        """Takes one hedge from the budget, returning False once max_ratio of requests have been hedged."""
+        with self._lock:
+            if self.hedges < self.max_ratio * max(self.requests, self.min_samples):
+                self.hedges += 1
+                return True
+            return False
@@ -1,131 +1,1254 @@
 # This utility allows you to fetch latitude, longitude, and place details for given city/state
 # combinations or zip codes using the OpenWeatherMap Geocoding API.
+#
+# The CLI is started thousands of times a day from scripts, so importing this module stays cheap:
+# requests is imported when the first request needs a session, and .env is read by the CLI only.
+# test_geoloc_startup.py holds the import-time budget.
 
-import requests
 import argparse
+import copy
 import os
-from dotenv import load_dotenv
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from functools import partial
+from itertools import islice
+from geoloc_backends import DEFAULT_BASE_URL, STRATEGIES, BackendRouter, api_url, build_backends, parse_backend
+from geoloc_breaker import FATAL_STATUSES, CircuitBreaker, CircuitOpenError
+from geoloc_cache import GeoCache, DEFAULT_TTL
+from geoloc_singleflight import SingleFlight
+from geoloc_gazetteer import Gazetteer
+from geoloc_polygons import PolygonIndex, StatePolygonIndex
+from geoloc_suggest import CityIndex
+from geoloc_io import ResultWriter, format_text, read_locations
+from geoloc_journal import ResultJournal
+from geoloc_metrics import NULL_METRICS, Metrics
+from geoloc_parser import InvalidLocationError, parse_location, parse_many, parse_point, parse_state
+from geoloc_decode import decode_payload, decode_response
+from geoloc_records import ApiError, Location, is_place, to_records
+from geoloc_ratelimit import RetryPolicy, TokenBucket, parse_rate
+from geoloc_timeouts import (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DeadlineExceeded, HedgePolicy,
+                             check_deadline, deadline, propagate, remaining, request_timeout)
 
-# Load environment variables from .env file
-load_dotenv()
+DEFAULT_SERVE_HOST = "127.0.0.1"  # --serve PORT only accepts local callers
+DEFAULT_REVERSE_PRECISION = 3  # Decimal places reverse_many snaps points to: a grid of about 110 m
 
-class GeoLocationUtility:
-    """Utility class to fetch latitude, longitude, and place details based on city/state or zip code."""
+class BaseGeoLocationUtility:
+    """Query building, response shaping and caching shared by the sync and async utilities.
+
+    Subclasses supply the transport: _make_api_request and the fetch_* methods that call it.
+    """
 
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache=None, rate_limiter=None, retry_policy=None, gazetteer=None, offline=False,
+                 state_index=None, base_url=DEFAULT_BASE_URL, metrics=None, journal=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, batch_deadline=None,
+                 hedge=None, place_index=None, reverse_precision=DEFAULT_REVERSE_PRECISION, breaker=None,
+                 serve_stale=False, city_index=None, local_names=False, router=None):
         self.api_key = api_key
-        self.base_url = "http://api.openweathermap.org/geo/1.0"
+        self.base_url = base_url.rstrip('/')  # Another server speaking the same API, e.g. geoloc_mockserver.py
+        self.cache = cache  # Optional GeoCache, keyed by normalized query so the appid never ends up in a key
+        # Optional TokenBucket; share one instance between utilities to share one request budget
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.gazetteer = gazetteer  # Optional Gazetteer that answers known ZIPs and cities in process
+        self.offline = offline  # Never call the API; anything the gazetteer or cache can't answer is "not found"
+        self.state_index = state_index  # Optional StatePolygonIndex answering reverse state lookups offline
+        self.place_index = place_index  # Optional PolygonIndex of city/town boundaries naming reverse_many places
+        self.reverse_precision = reverse_precision
+        # Optional geoloc_metrics.Metrics receiving phase timings and counters; the default records nothing
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        # Optional ResultJournal: batches skip locations it has completed and record the rest
+        self.journal = journal
+        # Seconds to wait for a connection, and between bytes of a response
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Seconds a resolve_many call may take; lookups that would start or retry later fail with "deadline exceeded"
+        self.batch_deadline = batch_deadline
+        self.hedge = hedge  # Optional HedgePolicy: re-send requests that take longer than most
+        # Optional CircuitBreaker: once the API keeps failing, lookups fail fast with CircuitOpenError
+        self.breaker = breaker
+        # Answer from expired cache entries when a request fails or the circuit is open
+        self.serve_stale = serve_stale
+        # Optional geoloc_suggest.CityIndex: corrects misspelled cities offline, and backs /suggest
+        self.city_index = city_index
+        # Keep the translated names of each place; most callers never read them, so they're dropped by default
+        self.local_names = local_names
+        # Optional geoloc_backends.BackendRouter: requests go to its backends instead of base_url
+        self.router = router
 
-    def fetch_state_from_lat_lon(self, lat, lon):
-        url = f"{self.base_url}/reverse?lat={list(lat)[0]}&lon={list(lon)[0]}&limit=1&appid={self.api_key}"
+    def _backoff(self, attempt, retry_after):
+        """Seconds to wait before retrying, or DeadlineExceeded when the retry would come too late."""
+        delay = self.retry_policy.delay(attempt, retry_after)
+        left = remaining()
+        if left is not None and delay >= left:
+            raise DeadlineExceeded()
+        return delay
 
-        # Make the API request
-        response = self._make_api_request(url)
+    def build_reverse_query(self, lat, lon):
+        """Returns the (url, cache_key) pair for a reverse lookup."""
+        url = self._target('reverse', (lat, lon))
+        cache_key = self._cache_key("reverse", f"{lat},{lon}")
+        return url, cache_key
+
+    def _target(self, endpoint, query):
+        """What _make_api_request is given for a request: the API URL, or with a router (endpoint, query)."""
+        if self.router is not None:
+            return endpoint, query
+        return api_url(self.base_url, self.api_key, endpoint, query)
+
+    def split_location(self, location):
+        """Splits user input into ('direct', city, state) or ('zip', zip_code, None).
+
+        Raises InvalidLocationError for input that is neither (see geoloc_parser.py).
+        """
+        return parse_location(location)
+
+    def build_location_query(self, location):
+        """Returns the (url, cache_key, query) triple for a city/state or zip code lookup.
+
+        With a router, url is the (endpoint, query) pair the router sends to one of its backends.
+        """
+        return self._location_query(self.split_location(location))
+
+    def _location_query(self, parsed):
+        kind, query, state = parsed
+        if kind == 'direct':
+            location = f"{query}, {state}"
+            url = self._target('direct', location)
+            cache_key = self._cache_key("direct", location)
+
+        else:  # Assume zip code format
+            location = query
+            url = self._target('zip', location)
+            cache_key = self._cache_key("zip", f"{location},US")
+
+        return url, cache_key, location
+
+    def location_key(self, location):
+        """Normalized key for a location, so "columbus, oh", "Columbus,OH" and "Columbus, Ohio" match.
+
+        Returns None for input that can't be parsed; such locations are never merged.
+        """
+        try:
+            return self.build_location_query(location)[1]
+        except InvalidLocationError:
+            return None
+
+    def location_keys(self, locations):
+        """location_key for a whole batch, parsing it in one pass."""
+        return [None if parsed is None else self._location_query(parsed)[1] for parsed in parse_many(locations)]
+
+    def _invalid_location(self, error):
+        """Rejects input that can't be a location without spending a request on it."""
+        self.metrics.increment('invalid')
+        print(f"Invalid location: {error}", file=sys.stderr)
+        return None
+
+    def _located(self, location, data):
+        """The result for fetched data; when input that can't be a location is why it is None, error says so.
+
+        fetch_location_data returns None for a miss as well, and parse_location is cached, so
+        telling the two apart costs nothing.
+        """
+        error = None
+        if data is None:
+            try:
+                self.split_location(location)
+            except InvalidLocationError as e:
+                error = str(e)
+        return {'location': location, 'data': data, 'error': error}
+
+    def lookup_offline(self, location):
+        """Answers a location from the gazetteer, returning the usual result list or None on a miss.
+
+        With a city_index, a city the gazetteer doesn't know is spelling-corrected against the
+        known ones, so "Colombus, OH" is answered as Columbus without a request.
+        """
+        if self.gazetteer is None:
+            return None
+
+        with self.metrics.timer('offline'):
+            kind, query, state = self.split_location(location)
+            if kind == 'direct':
+                record = self.gazetteer.lookup_city(query, state)
+            else:
+                record = self.gazetteer.lookup_zip(query)
+        if record is None:
+            return self.correct_city(location)
+        self.metrics.increment('offline_hits')
+        return to_records([record])
+
+    def correct_city(self, location):
+        """Answers a misspelled city with the closest one the city_index knows, or None.
+
+        Only a gazetteer makes the index authoritative enough to correct before asking the API: the
+        cities learned from the cache and the API would turn a real "Justin, TX" into Austin. Without
+        one, the utility only corrects once the API has found nothing.
+        """
+        if self.city_index is None:
+            return None
+        kind, query, state = self.split_location(location)
+        if kind != 'direct':
+            return None
+        with self.metrics.timer('offline'):
+            record = self.city_index.correct(query, state)
+        if record is None:
+            return None
+        self.metrics.increment('corrected')
+        return to_records([record])
+
+    def _api_miss(self, location, response):
+        """response, or with no gazetteer and nothing found by the API, the city_index's correction."""
+        if response is not None or self.gazetteer is not None or self.offline:
+            return response
+        return self.correct_city(location)
+
+    def _reverse_result(self, lat, lon, response):
+        """Shapes a /reverse response into the list returned by fetch_state_from_lat_lon."""
         if not response:
-            print(f"Error: Unable to fetch data for {lat} , {lon}.")
+            print(f"Error: Unable to fetch data for {lat} , {lon}.", file=sys.stderr)
             return None
 
-        if any('message' in item for item in response):
-            return [response]
+        return response
+
+    def _location_result(self, location, response):
+        """Shapes a /direct or /zip response into the list returned by fetch_location_data."""
+        if not response or len(response) == 0:
+            print(f"No location data found for {location}", file=sys.stderr)
+            return None
+
+        if self.city_index is not None:  # Learn the cities the API found; ZIP answers carry no state and are skipped
+            self.city_index.add_many((record.name, record.state, record.lat, record.lon)
+                                     for record in response if isinstance(record, Location))
+        return response
+
+    def _retries_exhausted(self, status_code, cache_key):
+        self.metrics.increment('errors')
+        print(f"Request failed: HTTP {status_code} after {self.retry_policy.max_retries + 1} attempts", file=sys.stderr)
+        return self._stale_response(cache_key)[1]
+
+    def _request_failed(self, error, cache_key):
+        """Handles a request that raised; returns a stale cache entry when serve_stale allows, else None."""
+        if self.breaker is not None:
+            self.breaker.record_failure(type(error).__name__)
+        self.metrics.increment('errors')
+        print(f"Request failed: {error}", file=sys.stderr)
+        return self._stale_response(cache_key)[1]
+
+    def _breaker_allows(self):
+        """Asks the circuit breaker, if any, whether a request may be sent now."""
+        if self.breaker is None or self.breaker.allow():
+            return True
+        self.metrics.increment('circuit_rejected')
+        return False
+
+    def _release_probe(self):
+        """Tells the circuit breaker, if any, that an allowed attempt ended without an outcome."""
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def _record_response(self, status_code):
+        """Tells the circuit breaker how a request went: 429s and 5xx count as failures, 401/403 open it at once."""
+        if self.breaker is None:
+            return
+        if status_code in FATAL_STATUSES:
+            self.breaker.record_failure(f"HTTP {status_code}", fatal=True)
+        elif self.retry_policy.retryable(status_code):
+            self.breaker.record_failure(f"HTTP {status_code}")
         else:
-            if len(response) > 0:
-                return response
+            self.breaker.record_success()
+
+    def _fail_fast(self, cache_key, reason=None):
+        """Answers a request the open circuit won't send: from a stale cache entry, or with CircuitOpenError."""
+        found, data = self._stale_response(cache_key)
+        if found:
+            return data
+        raise CircuitOpenError(reason or self.breaker.reason)
+
+    def _answer_in_process(self, backend, endpoint, query):
+        """(status, None, records) from an in-process backend, or None when it has no answer."""
+        check_deadline()  # No request_timeout() is computed for it, which is where HTTP requests check
+        answer = backend.answer(endpoint, query)
+        if answer is None:
+            return None
+        status, payload = answer
+        with self.metrics.timer('decode'):
+            return status, None, decode_payload(status, payload, self.local_names)
+
+    def _routed_attempt(self, backend, status, seconds):
+        """Tells the router and the circuit breaker how an attempt at backend went; True when it failed.
+
+        429s, 5xx and rejected keys (401/403) count against the backend, and the request moves on.
+        """
+        self._record_response(status)
+        fatal = status in FATAL_STATUSES
+        if fatal or self.retry_policy.retryable(status):
+            self.router.record_failure(backend, f"HTTP {status}", fatal=fatal)
+            return True
+        self.router.record_success(backend, seconds)
+        return False
+
+    def _routed_error(self, backend, error):
+        """Counts an attempt at backend that raised; the request moves on to the next backend."""
+        self.metrics.increment('errors')
+        self.router.record_failure(backend, type(error).__name__)
+        if self.breaker is not None:
+            self.breaker.record_failure(type(error).__name__)
+
+    def _routed_result(self, request, cache_key, data):
+        """Caches and returns the answer a backend gave."""
+        if not data:
+            print(f"No data found for {request[0]} {request[1]}.", file=sys.stderr)
+            self._store_in_cache(cache_key, None)
+            return None
+        self._store_in_cache(cache_key, data)
+        return data
+
+    def _routing_failed(self, request, cache_key, status, error, rejected, refused):
+        """Result of a routed request that no backend answered; None when the backends simply don't know it.
+
+        status or error is the last retryable failure, rejected the answer of a backend that refused
+        the API key, and refused whether a backend was skipped because its circuit is open.
+        """
+        if error is not None:  # Already counted in 'errors' by _routed_error
+            print(f"Request failed: {error}", file=sys.stderr)
+            return self._stale_response(cache_key)[1]
+        if status is not None:
+            return self._retries_exhausted(status, cache_key)
+        if rejected is not None:
+            return rejected  # Like a 401 from the only API: reported, never cached
+        if refused:
+            return self._fail_fast(cache_key, "every backend is failing")
+        # Every backend only said it doesn't know, so nothing ruled it out; a cached miss would hide
+        # an answer from a backend added or restored later
+        print(f"No data found for {request[0]} {request[1]}.", file=sys.stderr)
+        return None
+
+    def _stale_response(self, cache_key):
+        """Returns (found, data) from expired cache entries when serve_stale is set, else (False, None)."""
+        if not self.serve_stale or self.cache is None or cache_key is None:
+            return False, None
+        found, data = self.cache.get_stale(cache_key)
+        if found:
+            self.metrics.increment('stale_hits')
+        return found, to_records(data, self.local_names)
+
+    def _cache_key(self, endpoint, query):
+        """Builds the cache key for a query: endpoint plus the lower-cased, whitespace-collapsed query."""
+        return f"{endpoint}:{' '.join(str(query).lower().split())}"
+
+    def _store_in_cache(self, cache_key, data):
+        """Caches a response. "Bad query" and "not found" errors are cached as negative entries."""
+        if self.cache is None or cache_key is None:
+            return
+
+        if data and isinstance(data[0], ApiError):
+            # Other error codes (bad key, quota, server errors) say nothing about the query itself
+            if data[0].status in (400, 404):
+                self.cache.set(cache_key, data, ttl=self.cache.negative_ttl)
+            return
+
+        self.cache.set(cache_key, data)
+
+    def _cached_response(self, cache_key):
+        """Returns (found, data) from the cache, or (False, None) when there is no cache."""
+        if self.cache is None or cache_key is None:
+            return False, None
+        with self.metrics.timer('cache'):
+            found, data = self.cache.get(cache_key)
+        self.metrics.increment('cache_hits' if found else 'cache_misses')
+        # Entries written before responses were decoded into records hold the API's dicts
+        return found, to_records(data, self.local_names)
+
+    def _dedupe_batch(self, locations):
+        """Groups a batch by normalized query, so each distinct location is fetched once.
+
+        Returns (unique, keys, positions): the distinct locations, their keys (None for input that
+        can't be a location, which is never grouped), and for each location its index into unique.
+        """
+        first_index = {}
+        unique, keys, positions = [], [], []
+        for location, key in zip(locations, self.location_keys(locations)):
+            if key is None or key not in first_index:
+                if key is not None:
+                    first_index[key] = len(unique)
+                positions.append(len(unique))
+                unique.append(location)
+                keys.append(key)
             else:
-                # Ensure the return format is always a list
-                return response[0]['state'] or "Unknown"
+                positions.append(first_index[key])
+        return unique, keys, positions
 
-    def fetch_location_data(self, location):
-        """Fetches location data based on city/state or zip code."""
+    def _spread_batch(self, locations, positions, results):
+        """One result per location of the batch; a repeat gets a deep copy, as SingleFlight's waiters do."""
+        spread = []
+        seen = set()
+        for location, position in zip(locations, positions):
+            result = results[position]
+            if position in seen:
+                result = copy.deepcopy(result)  # So enriching or editing one result leaves the others alone
+            seen.add(position)
+            spread.append(dict(result, location=location))
+        return spread
 
-        if ',' in location:  # City, State format
-            city, state_code = map(str.strip, location.split(','))
-            state = self.get_statecode_from_state(state_code)
-            location = f"{city}, {state}"
-            url = f"{self.base_url}/direct?q={location}&limit=1&appid={self.api_key}"
+    def _replay_journal(self, locations, keys):
+        """Answers what it can of a batch from the journal.
 
-        else:  # Assume zip code format
-            url = f"{self.base_url}/zip?zip={location},US&appid={self.api_key}"
+        Returns (results, pending): the journaled result of each location or None, and the indexes
+        of the locations still to look up. Without a journal every location is pending.
+        """
+        if self.journal is None:
+            return [None] * len(locations), list(range(len(locations)))
+        results, pending = self.journal.split(locations, keys)
+        for result in results:
+            if result is not None:
+                result['data'] = to_records(result['data'], self.local_names)
+        if len(pending) < len(locations):
+            self.metrics.increment('journal_hits', len(locations) - len(pending))
+        return results, pending
 
-        # Make the API request
-        response = self._make_api_request(url)
+    def _record_journal(self, results, keys, pending, fresh):
+        """Fills the looked-up results into the batch and appends them to the journal."""
+        for index, result in zip(pending, fresh):
+            results[index] = result
+            if self.journal is not None and keys[index] is not None:
+                self.journal.record(keys[index], result)
+        return results
 
-        if not response or len(response) == 0:
-            print(f"No location data found for {location}")
+    def _pending_states(self, results):
+        """Groups the records of a batch that still need a state by coordinate: {(lat, lon): [data, ...]}.
+
+        Zip code lookups come back without a state. Error payloads and records without
+        coordinates are skipped, since a reverse lookup could not help them.
+        """
+        pending = {}
+        for location_data in results:
+            for data in location_data or ():
+                if 'cod' in data or data.get('state', 'Unknown') != 'Unknown':
+                    continue
+                lat, lon = data.get('lat'), data.get('lon')
+                if lat is not None and lon is not None:
+                    pending.setdefault((lat, lon), []).append(data)
+        return pending
+
+    def _apply_states(self, pending, states):
+        for point, state in zip(pending, states):
+            for data in pending[point]:
+                data['state'] = state
+
+    def _state_from_reverse(self, response):
+        """Extracts the state name from a fetch_state_from_lat_lon result."""
+        if response and is_place(response[0]):
+            return response[0].get('state') or 'Unknown'
+        return 'Unknown'
+
+    def lookup_state_offline(self, lat, lon):
+        """Answers a reverse state lookup from the polygon index, or None when it can't."""
+        if self.state_index is None:
+            return None
+        return self.state_index.lookup(lat, lon)
+
+    def lookup_reverse_offline(self, lat, lon):
+        """Answers a reverse lookup from the polygon indexes, returning the usual result list or None on a miss.
+
+        The state comes from state_index (or a 'state' property of the place) and the name from
+        place_index. Each configured index has to answer, so with a place_index, points outside
+        every known place are still sent to /reverse for the nearest one.
+        """
+        if self.state_index is None and self.place_index is None:
             return None
 
-        # Ensure the return format is always a list
-        return [response] if isinstance(response, dict) else response
+        with self.metrics.timer('offline'):
+            record = {}
+            place = None
+            if self.place_index is not None:
+                place = self.place_index.lookup_feature(lat, lon)
+                if place is None:
+                    return None
+                record['name'] = place[0]
+            state = self.lookup_state_offline(lat, lon)
+            if state is None and place is not None:
+                state = place[1].get('state')
+            if state is None and self.state_index is not None:
+                return None
+        record.update(lat=lat, lon=lon, country='US')
+        if state is not None:
+            record['state'] = state
+        self.metrics.increment('offline_hits')
+        return to_records([record])
+
+    def snap_point(self, point):
+        """Parses a point ("lat,lon" or a pair) and snaps it to the reverse_precision grid.
+
+        Raises InvalidLocationError for anything that isn't a coordinate.
+        """
+        lat, lon = parse_point(point)
+        return round(lat, self.reverse_precision), round(lon, self.reverse_precision)
+
+    def _point_location(self, point):
+        """How a point is reported in its result: as given, for "lat,lon" strings."""
+        if isinstance(point, str):
+            return point
+        try:
+            return ",".join(str(part) for part in point)
+        except TypeError:
+            return str(point)
+
+    def _snap_batch(self, points):
+        """Snaps and dedupes a batch of points for reverse_many.
+
+        Returns (locations, unique, positions): how each point is reported, the distinct grid
+        points, and for each point its index into unique, or the InvalidLocationError it raised.
+        """
+        locations, unique, positions = [], [], []
+        first_index = {}
+        for point in points:
+            locations.append(self._point_location(point))
+            try:
+                snapped = self.snap_point(point)
+            except InvalidLocationError as e:
+                self.metrics.increment('invalid')
+                positions.append(e)
+                continue
+            if snapped not in first_index:
+                first_index[snapped] = len(unique)
+                unique.append(snapped)
+            positions.append(first_index[snapped])
+        return locations, unique, positions
+
+    def _reverse_offline_batch(self, unique):
+        """Answers what it can of the distinct points of a batch from the polygon indexes.
+
+        Returns (answers, pending): a {'data', 'error'} answer for each point or None, and the
+        indexes of the points still to look up.
+        """
+        answers = [None] * len(unique)
+        pending = []
+        for index, (lat, lon) in enumerate(unique):
+            data = self.lookup_reverse_offline(lat, lon)
+            if data is None:
+                pending.append(index)
+            else:
+                answers[index] = {'data': data, 'error': None}
+        return answers, pending
+
+    def _reverse_results(self, locations, positions, answers):
+        results = []
+        for location, position in zip(locations, positions):
+            if isinstance(position, InvalidLocationError):
+                results.append({'location': location, 'data': None, 'error': str(position)})
+            else:
+                results.append({'location': location, 'data': answers[position]['data'],
+                                'error': answers[position]['error']})
+        return results
+
+    def print_location_data(self, location_data):
+        """Prints already-enriched location data."""
+        if location_data:
+            sys.stdout.write("".join(format_text(data) for data in location_data))
+
+    def get_statecode_from_state(self, code):
+        # Accepts codes and full names in any case, so "OH", "oh" and "Ohio" all normalize to "Ohio".
+        # Raises InvalidLocationError (a ValueError) for anything else.
+        return parse_state(code)
+
+class GeoLocationUtility(BaseGeoLocationUtility):
+    """Utility class to fetch latitude, longitude, and place details based on city/state or zip code."""
+
+    def __init__(self, api_key, cache=None, pool_size=10, **options):
+        """pool_size is the number of keep-alive connections; options are BaseGeoLocationUtility's."""
+        super().__init__(api_key, cache=cache, **options)
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hedge_pool = None  # Threads that send hedged requests, created with the first one
+        self._inflight = SingleFlight()
+
+    @property
+    def session(self):
+        """The pooled keep-alive session, created on first use.
+
+        Lookups answered from the cache or the gazetteer never import requests or open a socket.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # One keep-alive session for every lookup so connections (and TLS handshakes) are reused.
+        # pool_maxsize should be at least the batch concurrency or worker threads will queue for a socket.
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the pooled connections held by the session."""
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+            self._hedge_pool = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
-    def _make_api_request(self, url):
+    def fetch_state_from_lat_lon(self, lat, lon):
+        with self.metrics.timer('parse'):
+            url, cache_key = self.build_reverse_query(lat, lon)
+
+        # Make the API request
+        response = self._make_api_request(url, cache_key=cache_key)
+        return self._reverse_result(lat, lon, response)
+
+    def fetch_location_data(self, location):
+        """Fetches location data based on city/state or zip code. Returns None for input that is neither."""
+        self.metrics.increment('lookups')
+        with self.metrics.timer('lookup'):
+            try:
+                with self.metrics.timer('parse'):
+                    url, cache_key, query = self.build_location_query(location)
+            except InvalidLocationError as e:
+                return self._invalid_location(e)
+
+            local = self.lookup_offline(location)
+            if local is not None:
+                return local
+
+            # Make the API request
+            response = self._api_miss(location, self._make_api_request(url, cache_key=cache_key))
+            return self._location_result(query, response)
+
+    def _make_api_request(self, url, cache_key=None):
         """Helper function to make API request and handle errors."""
+        found, data = self._cached_response(cache_key)
+        if found or self.offline:
+            return data
+
+        if cache_key is None:
+            return self._request_uncached(url, cache_key)
+        # Concurrent lookups of the same query share a single upstream request
+        return self._inflight.do(cache_key, self._request_uncached, url, cache_key)
+
+    def _request_uncached(self, url, cache_key):
+        """Sends the request (with rate limiting and retries) and caches the decoded response."""
+        import requests  # Already loaded with the session; only the name is needed here
+
+        if isinstance(url, tuple):
+            return self._request_routed(url, cache_key)
         try:
-            response = requests.get(url, timeout=30) # 10 seconds timeout in case the url is down.s
-            data = response.json()
+            for attempt in range(self.retry_policy.max_retries + 1):
+                # Checked before every attempt, so retries stop as soon as the circuit opens
+                if not self._breaker_allows():
+                    return self._fail_fast(cache_key)
+                recorded = False
+                try:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.acquire()
+
+                    self.metrics.increment('requests')
+                    with self.metrics.timer('network'):
+                        response = self._send(url)
+                    self._record_response(response.status_code)
+                    recorded = True
+                finally:
+                    if not recorded:  # Raised before an outcome: e.g. DeadlineExceeded, or a network error
+                        self._release_probe()
+                if not self.retry_policy.retryable(response.status_code):
+                    break
+                if attempt == self.retry_policy.max_retries:
+                    return self._retries_exhausted(response.status_code, cache_key)
+                self.metrics.increment('retries')
+                time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+
+            if not response.ok:
+                self.metrics.increment('error_responses')
+            with self.metrics.timer('decode'):
+                data = decode_response(response.status_code, response.content, self.local_names)
 
             if not data:
-                print(f"No data found for {url}.")
+                print(f"No data found for {url}.", file=sys.stderr)
+                self._store_in_cache(cache_key, None)
                 return None
 
+            self._store_in_cache(cache_key, data)
             return data
 
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed: {e}")
-            return None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return self._request_failed(e, cache_key)
+
+    def _request_routed(self, request, cache_key):
+        """Sends an (endpoint, query) request to the router's backends, moving on from one that fails.
+
+        Each round tries the backends in the router's order, skipping those whose circuit is open,
+        until one answers; rounds are separated by the retry backoff, and there are max_retries + 1.
+        """
+        import requests
+
+        endpoint, query = request
+        for attempt in range(self.retry_policy.max_retries + 1):
+            status = error = rejected = retry_after = None
+            refused = False
+            for backend in self.router.order():
+                if not self.router.allow(backend):
+                    refused = True
+                    continue
+                if not self._breaker_allows():
+                    self.router.release(backend)
+                    return self._fail_fast(cache_key)
+                start = time.perf_counter()
+                recorded = False
+                try:
+                    try:
+                        answer = self._ask(backend, endpoint, query)
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        self._routed_error(backend, e)
+                        recorded = True
+                        status, error = None, e
+                        continue
+                    if answer is None:
+                        self.router.record_miss(backend)
+                        continue  # Not something this backend knows; ask the next one
+                    answer_status, answer_retry_after, data = answer
+                    failed = self._routed_attempt(backend, answer_status, time.perf_counter() - start)
+                    recorded = True
+                finally:
+                    if not recorded:  # No answer, or raised before one (e.g. DeadlineExceeded)
+                        self._release_probe()
+                        self.router.release(backend)
+                if not failed:
+                    return self._routed_result(request, cache_key, data)
+                if answer_status in FATAL_STATUSES:
+                    rejected = data
+                else:
+                    status, retry_after, error = answer_status, answer_retry_after, None
+
+            if (status is None and error is None) or attempt == self.retry_policy.max_retries:
+                return self._routing_failed(request, cache_key, status, error, rejected, refused)
+            self.metrics.increment('retries')
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def _ask(self, backend, endpoint, query):
+        """One attempt at a backend: (status, Retry-After, records), or None when an in-process backend has no answer."""
+        if backend.in_process:
+            return self._answer_in_process(backend, endpoint, query)
+        rate_limiter = backend.rate_limiter or self.rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        self.metrics.increment('requests')
+        with self.metrics.timer('network'):
+            response = self._send(backend.url(endpoint, query))
+        if self.retry_policy.retryable(response.status_code):
+            return response.status_code, response.headers.get('Retry-After'), None
+        if not response.ok:
+            self.metrics.increment('error_responses')
+        with self.metrics.timer('decode'):
+            return response.status_code, None, decode_response(response.status_code, response.content,
+                                                               self.local_names)
+
+    def _send(self, url):
+        """GETs url within the connect/read timeouts and the batch deadline, hedging it if configured."""
+        timeout = request_timeout(self.connect_timeout, self.read_timeout)
+        if self.hedge is None:
+            return self.session.get(url, timeout=timeout)
+        return self._send_hedged(url, timeout)
+
+    def _send_hedged(self, url, timeout):
+        """Sends url and, if no response arrives within the hedge delay, a second copy; the first response wins.
+
+        The slower copy is left to finish in the background (bounded by the read timeout).
+        """
+        if self._hedge_pool is None:
+            with self._session_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.pool_size,
+                                                          thread_name_prefix="geoloc-hedge")
+        start = time.perf_counter()
+        primary = self._hedge_pool.submit(self.session.get, url, timeout=timeout)
+        primary.add_done_callback(
+            lambda future: future.exception() is None and self.hedge.observe(time.perf_counter() - start))
+
+        done, _ = wait([primary], timeout=self.hedge.delay())
+        if done or not self.hedge.should_hedge():
+            return primary.result()
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()  # A hedge costs quota like any other request
+        self.metrics.increment('hedges')
+        backup = self._hedge_pool.submit(self.session.get, url, timeout=timeout)
+        pending = {primary, backup}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # A copy that failed only counts if the other one fails as well
+            for future in done:
+                if future.exception() is None or not pending:
+                    if future is backup:
+                        self.metrics.increment('hedge_wins')
+                    return future.result()
+
+    def resolve_state(self, lat, lon):
+        """Returns the state name for a coordinate, answering offline when possible."""
+        state = self.lookup_state_offline(lat, lon)
+        if state:
+            return state
+        try:
+            return self._state_from_reverse(self.fetch_state_from_lat_lon(lat, lon))
+        except (DeadlineExceeded, CircuitOpenError):
+            return 'Unknown'
+
+
+    def enrich_states(self, results, max_concurrency=8):
+        """Fills in missing states for a whole batch of results.
+
+        Each distinct coordinate is resolved once, concurrently, and through the cache,
+        so N zip codes no longer cost N extra serial reverse lookups.
+        """
+        with self.metrics.timer('enrich'):
+            pending = self._pending_states(results)
+            if max_concurrency <= 1 or len(pending) <= 1:
+                states = [self.resolve_state(lat, lon) for lat, lon in pending]
+            else:
+                with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                    states = list(executor.map(propagate(lambda point: self.resolve_state(*point)), pending))
+            self._apply_states(pending, states)
+        return results
+
+    def enrich_location_data(self, location_data):
+        """Fills in the state for results that came back without one (e.g. zip code lookups)."""
+        self.enrich_states([location_data], max_concurrency=1)
+        return location_data
 
     def display_location_data(self, location_data):
         """Displays the fetched location data."""
-        if location_data:
-            for data in location_data:
-                if data.get('state', 'Unknown') == 'Unknown':
-                    state = self.fetch_state_from_lat_lon({data.get('lat', 'Unknown')}, {data.get('lon', 'Unknown')})
-                    data['state'] = state
-                print(f"Location: {data.get('name', 'Unknown')}, {data.get('state', 'Unknown')}")
-                print(f"Latitude: {data.get('lat', 'Unknown')}")
-                print(f"Longitude: {data.get('lon', 'Unknown')}")
-                print(f"Country: {data.get('country', 'Unknown')}")
-                print("="*40)
-
-    def process_locations(self, locations):
-        """Process and display location data for multiple locations."""
-        for location in locations:
-            location_data = self.fetch_location_data(location)
-            self.display_location_data(location_data)
+        self.enrich_location_data(location_data)
+        self.print_location_data(location_data)
 
-    def get_statecode_from_state(self, code):
-        us_states = {
-            "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas",
-            "CA": "California", "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware",
-            "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho",
-            "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas",
-            "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland",
-            "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi",
-            "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
-            "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
-            "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma",
-            "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina",
-            "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas", "UT": "Utah",
-            "VT": "Vermont", "VA": "Virginia", "WA": "Washington", "WV": "West Virginia",
-            "WI": "Wisconsin", "WY": "Wyoming"
-        }
-
-        if code not in us_states:
-            return ValueError(f"Invalid State Code: {code}")
+    def _fetch_result(self, location):
+        """Fetches a single location, capturing any error instead of raising it."""
+        try:
+            data = self.fetch_location_data(location)
+        except Exception as e:
+            return {'location': location, 'data': None, 'error': str(e)}
+        return self._located(location, data)
+
+    def resolve_location(self, location):
+        """Fetches and enriches a single location, capturing any error instead of raising it."""
+        with deadline(self.batch_deadline):
+            result = self._fetch_result(location)
+            self.enrich_states([result['data']], max_concurrency=1)
+        return result
+
+    def resolve_many(self, locations, max_concurrency=8):
+        """Resolves many locations on a bounded thread pool, returning results in input order.
+
+        Locations are fetched first; the missing states of the whole batch are then filled in
+        by one enrich_states pass. With a batch_deadline, lookups that would start or retry after
+        it come back with the error "deadline exceeded".
+        """
+        with deadline(self.batch_deadline):
+            return self._resolve_batch(locations, max_concurrency)
+
+    def _resolve_batch(self, locations, max_concurrency):
+        locations = list(locations)  # Walked twice below, so a generator must be materialized first
+        unique, unique_keys, positions = self._dedupe_batch(locations)
+        results, pending = self._replay_journal(unique, unique_keys)
+        to_fetch = [unique[index] for index in pending]
+        if max_concurrency <= 1:
+            fetched = [self._fetch_result(location) for location in to_fetch]
         else:
-            return us_states.get(code, "Invalid State Code")
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                # executor.map yields results in submission order, not completion order
+                fetched = list(executor.map(propagate(self._fetch_result), to_fetch))
+
+        self.enrich_states([result['data'] for result in fetched], max_concurrency=max_concurrency)
+        results = self._record_journal(results, unique_keys, pending, fetched)
+        return self._spread_batch(locations, positions, results)
+
+    def reverse_many(self, points, max_concurrency=8):
+        """Reverse geocodes many points ("lat,lon" strings or (lat, lon) pairs), returning results in input order.
+
+        Points are snapped to reverse_precision decimal places, so nearby points share one lookup
+        and one cache entry, and each distinct grid point is looked up once: from the polygon
+        indexes when they can answer, otherwise with /reverse on a bounded thread pool.
+        """
+        with deadline(self.batch_deadline):
+            locations, unique, positions = self._snap_batch(points)
+            answers, pending = self._reverse_offline_batch(unique)
+            to_fetch = [unique[index] for index in pending]
+            if max_concurrency <= 1 or len(to_fetch) <= 1:
+                fetched = [self._fetch_reverse(point) for point in to_fetch]
+            else:
+                with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                    fetched = list(executor.map(propagate(self._fetch_reverse), to_fetch))
+            for index, answer in zip(pending, fetched):
+                answers[index] = answer
+        return self._reverse_results(locations, positions, answers)
+
+    def _fetch_reverse(self, point):
+        """Looks up one point with /reverse, capturing any error instead of raising it."""
+        try:
+            return {'data': self.fetch_state_from_lat_lon(*point), 'error': None}
+        except Exception as e:
+            return {'data': None, 'error': str(e)}
+
+    def resolve_iter(self, locations, max_concurrency=8, chunk_size=256):
+        """Lazily resolves any iterable of locations, yielding results in input order.
+
+        The input is consumed chunk_size locations at a time. The next chunk is resolved in the
+        background while the caller consumes the current one, so lookups overlap with reading
+        and writing and memory stays at about two chunks however long the input is.
+        """
+        return self._iter_batches(self.resolve_many, locations, max_concurrency, chunk_size)
+
+    def reverse_iter(self, points, max_concurrency=8, chunk_size=256):
+        """Lazily reverse geocodes any iterable of points, like resolve_iter does for locations."""
+        return self._iter_batches(self.reverse_many, points, max_concurrency, chunk_size)
+
+    def _iter_batches(self, resolve_batch, items, max_concurrency, chunk_size):
+        items = iter(items)
+        chunks = iter(lambda: list(islice(items, chunk_size)), [])
+
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            pending = None
+            for chunk in chunks:
+                future = prefetch.submit(propagate(resolve_batch), chunk, max_concurrency)
+                if pending is not None:
+                    yield from pending.result()
+                pending = future
+            if pending is not None:
+                yield from pending.result()
+
+    def process_locations(self, locations, max_concurrency=1, output_format='text', stream=None):
+        """Process and display location data for multiple locations.
+
+        Results are written to stream (stdout by default) as 'text', 'jsonl' or 'csv', and the
+        structured results are returned as a list of {'location', 'data', 'error'} dicts.
+        """
+        writer = ResultWriter(stream if stream is not None else sys.stdout, output_format)
+        results = []
+        for result in self.resolve_iter(locations, max_concurrency=max_concurrency):
+            writer.write(result)
+            results.append(result)
+        writer.flush()
+        return results
+
+def load_env():
+    """Loads environment variables from a .env file, when python-dotenv is installed."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+def positive_int(value):
+    """argparse type for options that must be a whole number of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def non_negative_int(value):
+    """argparse type for options that must be a whole number of at least 0."""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be at least 0, got {value}")
+    return number
+
+def positive_float(value):
+    """argparse type for durations in seconds, which must be greater than 0."""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+def percentile(value):
+    """argparse type for a percentile between 1 and 99.9, returned as a fraction."""
+    number = float(value)
+    if not 1 <= number < 100:
+        raise argparse.ArgumentTypeError(f"must be between 1 and 99.9, got {value}")
+    return number / 100
+
+def parse_address(value):
+    """argparse type for --serve: "PORT", "HOST:PORT" or "unix:PATH" (returned as the path)."""
+    if value.startswith('unix:'):
+        if not value[5:]:
+            raise argparse.ArgumentTypeError("unix: needs a socket path, e.g. unix:/tmp/geoloc.sock")
+        return value[5:]
+    host, _, port = value.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected PORT, HOST:PORT or unix:PATH, got "{value}"')
+    if not 0 <= port <= 65535:
+        raise argparse.ArgumentTypeError(f"port must be between 0 and 65535, got {port}")
+    return (host.strip('[]') or DEFAULT_SERVE_HOST, port)
+
+def build_utility(args, api_key, resources, rate_limiter=None, metrics=None):
+    """Builds the GeoLocationUtility described by the CLI options; anything it opens is closed with resources.
+
+    rate_limiter replaces the TokenBucket otherwise built from --rate-limit.
+    """
+    snapshot = None
+    if args.snapshot:
+        from geoloc_snapshot import Snapshot
+
+        snapshot = Snapshot(args.snapshot)
+        resources.callback(snapshot.close)
+    cache = GeoCache(path=args.cache, ttl=args.cache_ttl, snapshot=snapshot)
+    resources.callback(cache.close)
+    gazetteer = None
+    if args.gazetteer:
+        gazetteer = Gazetteer(args.gazetteer)
+        resources.callback(gazetteer.close)
+    state_index = StatePolygonIndex.from_geojson(args.state_polygons) if args.state_polygons else None
+    place_index = PolygonIndex.from_geojson(args.place_polygons) if args.place_polygons else None
+    # Built after the cache and gazetteer, so it knows every city either of them does
+    city_index = CityIndex.from_sources(gazetteer, cache) if args.fuzzy else None
+    journal = None
+    if args.journal:
+        journal = ResultJournal(args.journal)
+        resources.callback(journal.close)
+    if rate_limiter is None and args.rate_limit:
+        rate_limiter = TokenBucket(args.rate_limit)
+    router = None
+    if args.backend:
+        environ = dict(os.environ)
+        if api_key is not None:
+            environ['API_KEY'] = api_key
+        router = BackendRouter(build_backends(args.backend, environ, gazetteer, state_index, place_index),
+                               strategy=args.route)
+
+    return GeoLocationUtility(
+        api_key=api_key,
+        cache=cache,
+        # Never open fewer connections than there are worker threads
+        pool_size=max(args.pool_size, args.concurrency),
+        rate_limiter=rate_limiter,
+        retry_policy=RetryPolicy(max_retries=args.max_retries),
+        gazetteer=gazetteer,
+        offline=args.offline,
+        state_index=state_index,
+        base_url=args.base_url,
+        metrics=metrics,
+        journal=journal,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        batch_deadline=args.deadline,
+        hedge=HedgePolicy(percentile=args.hedge) if args.hedge else None,
+        place_index=place_index,
+        reverse_precision=args.reverse_precision,
+        breaker=CircuitBreaker() if args.fail_fast else None,
+        serve_stale=args.stale_if_error,
+        city_index=city_index,
+        router=router,
+    )
 
 class CommandLineInterface:
     """Handles command-line input and invokes the GeoLocationUtility."""
 
     def __init__(self):
         self.parser = argparse.ArgumentParser(description="Geolocation utility to fetch latitude, longitude, and place details.")
-        self.parser.add_argument('--locations', nargs='+', help="City/State or Zip Code", required=True)
-        self.api_key = os.getenv("API_KEY")  # API Key provided
-        self.geo_util = GeoLocationUtility(api_key=self.api_key)
+        source = self.parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--locations', nargs='+', help="City/State or Zip Code")
+        source.add_argument('--input', metavar="FILE",
+                            help='Read locations from a file, or "-" for stdin, instead of the command line')
+        source.add_argument('--serve', type=parse_address, metavar="ADDRESS",
+                            help='Keep running and answer lookups over HTTP on "PORT", "HOST:PORT" or "unix:PATH"')
+        self.parser.add_argument('--reverse', action='store_true',
+                                 help='Treat each location as a "LAT,LON" point and look up the place and state there')
+        self.parser.add_argument('--input-format', choices=('auto', 'lines', 'csv'), default='auto',
+                                 help="One location per line, or CSV rows such as Columbus,OH (default: by file extension)")
+        self.parser.add_argument('--format', choices=('text', 'jsonl', 'csv'), default='text',
+                                 help="Output format: human-readable text, JSON Lines or CSV (default: text)")
+        self.parser.add_argument('--output', metavar="FILE",
+                                 help="Write results to FILE instead of stdout")
+        self.parser.add_argument('--workers', type=positive_int, metavar="N",
+                                 help="Resolve --input into --output with N processes, resuming an interrupted run")
+        self.parser.add_argument('--chunk-size', type=positive_int, default=10000,
+                                 help="Locations per chunk handed to a --workers process (default: 10000)")
+        self.parser.add_argument('--concurrency', type=positive_int, default=1,
+                                 help="Number of locations to resolve in parallel (default: 1)")
+        self.parser.add_argument('--pool-size', type=positive_int, default=10,
+                                 help="Maximum number of keep-alive connections to the API (default: 10)")
+        self.parser.add_argument('--rate-limit', type=parse_rate, metavar="RATE",
+                                 help='Maximum request rate, e.g. "10/s" or "600/min" (default: unlimited)')
+        self.parser.add_argument('--max-retries', type=non_negative_int, default=3,
+                                 help="Retries for 429 and 5xx responses, with exponential backoff (default: 3)")
+        self.parser.add_argument('--connect-timeout', type=positive_float, default=DEFAULT_CONNECT_TIMEOUT,
+                                 metavar="SECONDS",
+                                 help=f"Time allowed to connect to the API (default: {DEFAULT_CONNECT_TIMEOUT:g})")
+        self.parser.add_argument('--read-timeout', type=positive_float, default=DEFAULT_READ_TIMEOUT, metavar="SECONDS",
+                                 help=f"Time allowed between bytes of an API response (default: {DEFAULT_READ_TIMEOUT:g})")
+        self.parser.add_argument('--deadline', type=positive_float, metavar="SECONDS",
+                                 help='Give up on lookups not done SECONDS after the run (or --serve request, or '
+                                      '--workers chunk) started; they are reported as "deadline exceeded"')
+        self.parser.add_argument('--hedge', type=percentile, metavar="PERCENTILE",
+                                 help="Send a second copy of a request that is slower than this percentile of "
+                                      "recent requests, e.g. 95; at most 10%% of requests are hedged")
+        self.parser.add_argument('--fail-fast', action='store_true',
+                                 help="Stop calling the API while it is failing (half of recent requests, or a "
+                                      "rejected API key) and report lookups as \"circuit open\"; it is probed "
+                                      "again every 30 seconds")
+        self.parser.add_argument('--stale-if-error', action='store_true',
+                                 help="Answer from expired cache entries when the API fails or --fail-fast has "
+                                      "stopped calling it")
+        self.parser.add_argument('--gazetteer', metavar="PATH",
+                                 help="Offline ZIP/city index built with geoloc_gazetteer.py; the API is only used on a miss")
+        self.parser.add_argument('--fuzzy', action='store_true',
+                                 help="Correct misspelled cities (\"Colombus, OH\") against those in the gazetteer "
+                                      "and cache (before calling the API with --gazetteer, else once it finds "
+                                      "nothing), and serve /suggest with --serve")
+        self.parser.add_argument('--state-polygons', metavar="GEOJSON",
+                                 help="GeoJSON of state boundaries used to fill in states without a reverse lookup")
+        self.parser.add_argument('--place-polygons', metavar="GEOJSON",
+                                 help="GeoJSON of city/town boundaries used to answer --reverse without the API")
+        self.parser.add_argument('--reverse-precision', type=non_negative_int, default=DEFAULT_REVERSE_PRECISION,
+                                 metavar="DECIMALS",
+                                 help="--reverse points that agree to DECIMALS decimal places share one lookup "
+                                      f"(default: {DEFAULT_REVERSE_PRECISION}, about 110 m)")
+        self.parser.add_argument('--offline', action='store_true',
+                                 help="Never call the API; answer only from the gazetteer and cache")
+        self.parser.add_argument('--base-url', default=DEFAULT_BASE_URL, metavar="URL",
+                                 help="Geocoding API root, e.g. a local geoloc_mockserver.py (default: OpenWeatherMap)")
+        self.parser.add_argument('--backend', type=parse_backend, action='append', metavar="BACKEND",
+                                 help='Send lookups to this backend instead of --base-url; repeat for several. An '
+                                      'API root URL, KEY_VAR=URL to read its API key from $KEY_VAR, "mock" for '
+                                      'in-process mock answers, or "offline" for --gazetteer and --state-polygons')
+        self.parser.add_argument('--route', choices=STRATEGIES, default='failover',
+                                 help="Order in which --backend backends are tried: as given, rotating per lookup, "
+                                      "or fastest first (default: failover)")
+        self.parser.add_argument('--stats', choices=('prometheus', 'json'),
+                                 help="Print lookup counters and per-phase timings to stderr when the run ends")
+        self.parser.add_argument('--cache', metavar="PATH",
+                                 help="SQLite file used to persist lookups between runs (default: in-memory only)")
+        self.parser.add_argument('--journal', metavar="PATH",
+                                 help="Append results to a journal; a rerun skips the locations it already completed")
+        self.parser.add_argument('--snapshot', metavar="PATH",
+                                 help="Lookup snapshot written by --export-snapshot, memory-mapped under the cache "
+                                      "so a new host starts warm")
+        self.parser.add_argument('--warm', action='store_true',
+                                 help="Resolve the input only to fill the cache (see --cache, --export-snapshot); "
+                                      "print no results")
+        self.parser.add_argument('--export-snapshot', metavar="PATH",
+                                 help="When the run ends, write every cached lookup to a snapshot file for --snapshot")
+        self.parser.add_argument('--cache-ttl', type=positive_int, default=DEFAULT_TTL,
+                                 help=f"Seconds a cached lookup stays valid (default: {DEFAULT_TTL})")
+        self.api_key = None  # Read from the environment (or .env) once the arguments are parsed
 
     def run(self):
         """Parses the command-line arguments and calls the appropriate methods."""
         args = self.parser.parse_args()
-        self.geo_util.process_locations(args.locations)
+        if args.workers and (not args.input or args.input == '-' or not args.output):
+            self.parser.error("--workers needs --input FILE and --output FILE")
+        if args.workers and args.stats:
+            self.parser.error("--stats is not available with --workers")
+        if args.workers and args.journal:
+            self.parser.error("--journal is not needed with --workers, which keep their own checkpoint")
+        if args.reverse and args.serve:
+            self.parser.error("--reverse is not available with --serve")
+        if args.reverse and args.journal:
+            self.parser.error("--journal is not available with --reverse")
+        if (args.warm or args.export_snapshot) and (args.serve or args.workers):
+            self.parser.error("--warm and --export-snapshot are not available with --serve or --workers; "
+                              "export a shared --cache with geoloc_snapshot.py instead")
+        if any(kind == 'offline' for kind, _, _ in args.backend or ()) and not (
+                args.gazetteer or args.state_polygons or args.place_polygons):
+            self.parser.error("--backend offline needs --gazetteer, --state-polygons or --place-polygons")
+        load_env()
+        self.api_key = os.getenv("API_KEY")  # API Key provided
+        if args.workers:
+            self._run_batch(args)
+            return
+        # Service mode always keeps metrics, for its /stats route
+        metrics = Metrics() if args.stats or args.serve else None
+        with ExitStack() as resources:
+            if args.serve:
+                self._serve(args, resources, metrics)
+            else:
+                locations = self._open_locations(args, resources)
+                geo_util = resources.enter_context(build_utility(args, self.api_key, resources, metrics=metrics))
+
+                resolve_iter = geo_util.reverse_iter if args.reverse else geo_util.resolve_iter
+                if args.warm:
+                    self._warm(args, geo_util, resolve_iter, locations)
+                else:
+                    output = sys.stdout
+                    if args.output:
+                        output = resources.enter_context(open(args.output, 'w', encoding='utf-8', newline=''))
+                    # Results are written as they arrive rather than collected, so memory stays flat
+                    writer = ResultWriter(output, args.format)
+                    with deadline(args.deadline):  # For the whole run, not each chunk of it
+                        for result in resolve_iter(locations, max_concurrency=args.concurrency):
+                            writer.write(result)
+                    writer.flush()
+                if args.export_snapshot:
+                    from geoloc_snapshot import export_snapshot
+
+                    count = export_snapshot(geo_util.cache, args.export_snapshot)
+                    print(f"Wrote {count} cached lookups to {args.export_snapshot}", file=sys.stderr)
+
+        if args.stats:
+            # stderr, so the statistics never end up mixed into piped results
+            sys.stderr.write(metrics.to_json() + "\n" if args.stats == 'json' else metrics.to_prometheus())
+
+    def _warm(self, args, geo_util, resolve_iter, locations):
+        """Resolves the input for its side effect on the cache, and reports how it went on stderr."""
+        resolved = failed = 0
+        with deadline(args.deadline):
+            for result in resolve_iter(locations, max_concurrency=args.concurrency):
+                if result['error'] is None and result['data']:
+                    resolved += 1
+                else:
+                    failed += 1
+        print(f"Warmed the cache with {resolved} locations ({failed} not found or failed)", file=sys.stderr)
+
+    def _serve(self, args, resources, metrics):
+        """Serves lookups until SIGINT or SIGTERM, then lets the requests in progress finish."""
+        from geoloc_server import make_server  # http.server is only worth importing in service mode
+
+        geo_util = resources.enter_context(build_utility(args, self.api_key, resources, metrics=metrics))
+        try:
+            server = make_server(geo_util, args.serve, max_concurrency=args.concurrency)
+        except OSError as e:
+            sys.exit(f"Error: cannot serve on {args.serve}: {e.strerror}")
+        print(f"Serving geolocation lookups on {server.url}", file=sys.stderr, flush=True)
+        server.serve_until_signalled()
+
+    def _run_batch(self, args):
+        """Resolves --input into --output with a pool of --workers processes."""
+        from geoloc_batch import BatchJob
+
+        job = BatchJob(partial(build_utility, args, self.api_key), args.input, args.output,
+                       workers=args.workers, chunk_size=args.chunk_size, concurrency=args.concurrency,
+                       rate=args.rate_limit, input_format=args.input_format, output_format=args.format,
+                       reverse=args.reverse)
+        try:
+            summary = job.run()
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        print(f"Resolved {summary['locations']} locations in {summary['chunks']} chunks "
+              f"({summary['resumed']} from an earlier run) in {summary['seconds']}s", file=sys.stderr)
+
+    def _open_locations(self, args, resources):
+        """Returns the locations to process: the --locations list, or a lazy reader over --input."""
+        if args.input == '-':
+            return read_locations(sys.stdin, args.input_format)
+        if args.input:
+            input_file = resources.enter_context(open(args.input, newline='', encoding='utf-8'))
+            return read_locations(input_file, args.input_format, name=args.input)
+        return args.locations
 
 if __name__ == "__main__":
     cli = CommandLineInterface()
@@ -0,0 +1,191 @@
+import asyncio
+import unittest
+from io import StringIO
+from unittest.mock import MagicMock, patch
+from aiohttp import web
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_cache import GeoCache
+from geoloc_ratelimit import RetryPolicy, TokenBucket
+
+
+class TestAsyncGeoLocationUtility(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+        app = web.Application()
+        app.router.add_get("/zip", self.handle_zip)
+        app.router.add_get("/direct", self.handle_direct)
+        app.router.add_get("/reverse", self.handle_reverse)
+        app.router.add_get("/throttled", self.handle_throttled)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def track(self, request):
+        self.requests.append(request.path_qs)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+    async def handle_zip(self, request):
+        await self.track(request)
+        zip_code = request.query['zip'].split(',')[0]
+        if zip_code == "12341":
+            return web.json_response({'cod': '404', 'message': 'not found'}, status=404)
+        return web.json_response({'zip': zip_code, 'name': f"Town {zip_code}", 'lat': 42.8142, 'lon': -73.9396, 'country': 'US'})
+
+    async def handle_direct(self, request):
+        await self.track(request)
+        city = request.query['q'].split(',')[0]
+        return web.json_response([{'name': city, 'lat': 39.9622601, 'lon': -83.0007065, 'country': 'US', 'state': 'Ohio'}])
+
+    async def handle_reverse(self, request):
+        await self.track(request)
+        return web.json_response([{'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396, 'country': 'US', 'state': 'New York'}])
+
+    async def handle_throttled(self, request):
+        await self.track(request)
+        if len(self.requests) < 3:
+            return web.json_response({'cod': 429, 'message': 'Too many requests'}, status=429, headers={'Retry-After': '0'})
+        return web.json_response([{'name': 'Columbus', 'state': 'Ohio'}])
+
+    def make_util(self, **kwargs):
+        geo_util = AsyncGeoLocationUtility(api_key="mocked_api_key", **kwargs)
+        geo_util.base_url = self.base_url
+        return geo_util
+
+    async def test_fetch_location_data(self):
+        async with self.make_util() as geo_util:
+            zip_result = await geo_util.fetch_location_data("12345")
+            city_result = await geo_util.fetch_location_data("Columbus, OH")
+            missing = await geo_util.fetch_location_data("12341")
+
+        self.assertEqual(zip_result[0]['name'], "Town 12345")
+        self.assertEqual(city_result[0]['state'], "Ohio")
+        self.assertEqual(missing, [{'cod': '404', 'message': 'not found'}])
+        # The state code is normalized the same way as in the sync utility
+        self.assertIn("q=Columbus,+Ohio", self.requests[1])
+
+    async def test_fetch_state_from_lat_lon(self):
+        async with self.make_util() as geo_util:
+            state = await geo_util.fetch_state_from_lat_lon(42.8142, -73.9396)
+        self.assertEqual(state[0]['state'], "New York")
+
+    async def test_resolve_many_keeps_order_and_bounds_concurrency(self):
+        locations = [str(10000 + i) for i in range(20)]
+        async with self.make_util(max_concurrency=4) as geo_util:
+            results = await geo_util.resolve_many(locations)
+
+        self.assertEqual([result['location'] for result in results], locations)
+        self.assertEqual(results[7]['data'][0]['name'], "Town 10007")
+        self.assertEqual(results[7]['data'][0]['state'], "New York")
+        # Every zip shares one centroid here, so the batch needs a single reverse lookup
+        self.assertEqual(sum(path.startswith("/reverse") for path in self.requests), 1)
+        self.assertGreater(self.peak, 1)
+        self.assertLessEqual(self.peak, 4)
+
+    async def test_resolve_many_accepts_a_generator(self):
+        async with self.make_util() as geo_util:
+            results = await geo_util.resolve_many(str(10000 + i) for i in range(3))
+
+        self.assertEqual([result['data'][0]['name'] for result in results], ["Town 10000", "Town 10001", "Town 10002"])
+
+    async def test_resolve_many_fetches_each_key_once(self):
+        locations = ["12345", " 12345", "Columbus, OH", "columbus, ohio"]
+        async with self.make_util() as geo_util:
+            with patch.object(geo_util, 'fetch_location_data', wraps=geo_util.fetch_location_data) as fetch:
+                results = await geo_util.resolve_many(locations)
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual([result['location'] for result in results], locations)
+        self.assertEqual(results[1]['data'][0]['name'], "Town 12345")
+        self.assertIsNot(results[0]['data'], results[1]['data'])
+
+    async def test_resolve_many_reports_per_item_errors(self):
+        def lookup_zip(zip_code):
+            if zip_code == "99999":
+                raise RuntimeError("corrupt gazetteer entry")
+            return None
+        gazetteer = MagicMock()
+        gazetteer.lookup_zip.side_effect = lookup_zip
+
+        async with self.make_util(gazetteer=gazetteer) as geo_util:
+            results = await geo_util.resolve_many(["12345", "99999", "Madison, XX"])
+
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[1]['error'], "corrupt gazetteer entry")
+        self.assertIsNone(results[1]['data'])
+        # Input that can't be a location is rejected without a request, and the result says why
+        self.assertIsNone(results[2]['data'])
+        self.assertEqual(results[2]['error'], "Invalid State Code: XX")
+
+    async def test_cache_shared_with_sync_key_format(self):
+        cache = GeoCache()
+        async with self.make_util(cache=cache) as geo_util:
+            await geo_util.fetch_location_data("Columbus, OH")
+            await geo_util.fetch_location_data("Columbus, OH")
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertIn("direct:columbus, ohio", cache._memory)
+
+    async def test_process_locations_output(self):
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            async with self.make_util() as geo_util:
+                await geo_util.process_locations(["Columbus, OH"])
+
+        self.assertIn("Location: Columbus, Ohio", mock_stdout.getvalue())
+
+    async def test_retries_429_honoring_retry_after(self):
+        async with self.make_util(retry_policy=RetryPolicy(max_retries=3)) as geo_util:
+            result = await geo_util._make_api_request(f"{self.base_url}/throttled")
+
+        self.assertEqual(result, [{'name': 'Columbus', 'state': 'Ohio'}])
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_gives_up_after_max_retries(self):
+        with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            async with self.make_util(retry_policy=RetryPolicy(max_retries=1)) as geo_util:
+                result = await geo_util._make_api_request(f"{self.base_url}/throttled")
+
+        self.assertIsNone(result)
+        self.assertEqual(len(self.requests), 2)
+        self.assertIn("HTTP 429 after 2 attempts", mock_stderr.getvalue())
+
+    async def test_shared_rate_limiter(self):
+        rate_limiter = TokenBucket(rate=100, capacity=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with self.make_util(rate_limiter=rate_limiter) as geo_util:
+            await geo_util.resolve_many([str(10000 + i) for i in range(6)])
+        # Six zip lookups plus one shared reverse lookup; all but the first wait for a token
+        self.assertGreaterEqual(loop.time() - start, 0.05)
+
+    async def test_concurrent_identical_lookups_share_request(self):
+        async with self.make_util() as geo_util:
+            results = await asyncio.gather(*(geo_util.fetch_location_data(location)
+                                             for location in ["Columbus, OH", "columbus, oh", "Columbus, Ohio"]))
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertTrue(all(result[0]['state'] == "Ohio" for result in results))
+        self.assertIsNot(results[0], results[1])
+
+    async def test_connection_error_returns_none(self):
+        geo_util = AsyncGeoLocationUtility(api_key="mocked_api_key")
+        geo_util.base_url = "http://127.0.0.1:9"
+        with patch('sys.stderr', new_callable=StringIO):
+            result = await geo_util.fetch_location_data("12345")
+        await geo_util.close()
+        self.assertIsNone(result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_backends import (BackendRouter, MockBackend, OfflineBackend, OpenWeatherMapBackend, build_backends,
+                             parse_backend)
+from geoloc_breaker import CircuitOpenError
+from geoloc_cache import GeoCache
+from geoloc_gazetteer import Gazetteer, build_gazetteer
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_ratelimit import RetryPolicy
+from geoloc_records import ApiError, Location
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+SAMPLE_CSV = """zip,city,state_id,lat,lng
+12345,Schenectady,NY,42.8142,-73.9396
+43215,Columbus,OH,39.9653,-83.0057
+"""
+
+
+class TestBackendRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.first, self.second, self.third = MockBackend('first'), MockBackend('second'), MockBackend('third')
+        self.backends = [self.first, self.second, self.third]
+
+    def test_failover_keeps_the_given_order(self):
+        router = BackendRouter(self.backends)
+        self.assertEqual(router.order(), self.backends)
+        self.assertEqual(router.order(), self.backends)
+
+    def test_round_robin_rotates(self):
+        router = BackendRouter(self.backends, strategy='round-robin')
+        self.assertEqual([router.order()[0].name for _ in range(4)], ['first', 'second', 'third', 'first'])
+
+    def test_latency_prefers_the_fastest(self):
+        router = BackendRouter(self.backends, strategy='latency')
+        router.record_success(self.first, 0.200)
+        router.record_success(self.second, 0.050)
+        self.assertEqual(router.order()[0], self.third)  # Not measured yet
+
+        router.record_success(self.third, 0.100)
+        self.assertEqual([backend.name for backend in router.order()], ['second', 'third', 'first'])
+        self.assertEqual(router.snapshot()['second']['latency_ms'], 50.0)
+
+    def test_latency_ranks_failures_and_misses_last(self):
+        router = BackendRouter(self.backends, strategy='latency')
+        router.record_failure(self.first, "HTTP 503")
+        router.record_miss(self.second)
+        self.assertEqual(router.order()[0], self.third)  # Not tried yet
+
+        router.record_success(self.third, 0.100)
+        self.assertEqual(router.order(), [self.third, self.first, self.second])
+
+    def test_failing_backend_is_skipped(self):
+        router = BackendRouter(self.backends, min_requests=2)
+        router.record_failure(self.first, "HTTP 503")
+        router.record_failure(self.first, "HTTP 503")
+        router.record_failure(self.second, "HTTP 401", fatal=True)
+
+        self.assertFalse(router.allow(self.first))
+        self.assertFalse(router.allow(self.second))
+        self.assertTrue(router.allow(self.third))
+        self.assertEqual(router.snapshot()['first']['state'], 'open')
+
+    def test_rejects_bad_configurations(self):
+        with self.assertRaises(ValueError):
+            BackendRouter([])
+        with self.assertRaises(ValueError):
+            BackendRouter(self.backends, strategy='random')
+
+
+class TestBackendSpecs(unittest.TestCase):
+
+    def test_parse_backend(self):
+        self.assertEqual(parse_backend("mock"), ('mock', None, None))
+        self.assertEqual(parse_backend("http://127.0.0.1:8080/geo/1.0"), ('api', "http://127.0.0.1:8080/geo/1.0",
+                                                                         'API_KEY'))
+        self.assertEqual(parse_backend("KEY_2=https://api.example.com/geo/1.0"),
+                         ('api', "https://api.example.com/geo/1.0", 'KEY_2'))
+        self.assertEqual(parse_backend("https://geo.example.com/v1?region=us"),
+                         ('api', "https://geo.example.com/v1?region=us", 'API_KEY'))
+        for spec in ("api.example.com", "=https://api.example.com", "MY-KEY=https://api.example.com"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_backend(spec)
+
+    def test_build_backends(self):
+        specs = [parse_backend("https://api.example.com/geo/1.0"), parse_backend("KEY_2=https://api.example.com/geo/1.0"),
+                 parse_backend("https://api.example.com/geo/1.0"), parse_backend("mock")]
+        backends = build_backends(specs, {'API_KEY': "first-key", 'KEY_2': "second-key"})
+
+        self.assertEqual([backend.name for backend in backends],
+                         ["api.example.com", "api.example.com (KEY_2)", "api.example.com #2", "mock"])
+        self.assertIn("appid=second-key", backends[1].url('zip', "12345"))
+        self.assertIsInstance(backends[3], MockBackend)
+
+
+class TestRoutedUtility(unittest.TestCase):
+
+    def utility(self, *backends, **options):
+        geo_util = GeoLocationUtility(api_key=None, router=BackendRouter(backends, min_requests=2), **options)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    def test_mock_backend_answers_like_the_mock_server(self):
+        mock = MockBackend()
+        geo_util = self.utility(mock)
+
+        results = geo_util.resolve_many(["12345", "Columbus, OH", "00000"])
+
+        self.assertEqual(results[0]['data'][0]['name'], "Town 12345")
+        self.assertIsNotNone(results[0]['data'][0]['state'])  # Enriched through the router as well
+        self.assertIsInstance(results[1]['data'][0], Location)
+        self.assertEqual(results[2]['data'], [ApiError('404', 'not found')])
+        self.assertEqual(mock.requests, {'/zip': 2, '/direct': 1, '/reverse': 1})
+
+    def test_fails_over_to_the_next_backend(self):
+        broken, healthy = MockBackend('broken', error_rate=1.0), MockBackend('healthy')
+        geo_util = self.utility(broken, healthy)
+
+        for zip_code in ["12345", "12346", "12347", "12348"]:
+            self.assertEqual(geo_util.fetch_location_data(zip_code)[0]['zip'], zip_code)
+
+        self.assertEqual(broken.requests['/zip'], 2)  # Then its circuit opened
+        self.assertEqual(healthy.requests['/zip'], 4)
+        self.assertEqual(geo_util.router.snapshot()['broken']['state'], 'open')
+
+    def test_backend_errors_are_counted(self):
+        metrics = Metrics()
+        unreachable = OpenWeatherMapBackend("test-key", "http://127.0.0.1:9", name='unreachable')
+        geo_util = self.utility(unreachable, MockBackend(), metrics=metrics)
+
+        self.assertEqual(geo_util.fetch_location_data("12345")[0]['zip'], "12345")
+        self.assertEqual(metrics.counters['errors'], 1)
+
+    def test_rejected_key_fails_over_at_once(self):
+        server = MockGeocodingServer().start()
+        self.addCleanup(server.stop)
+        rejected = OpenWeatherMapBackend("", server.url, name='no key')
+        geo_util = self.utility(rejected, OpenWeatherMapBackend("test-key", server.url))
+
+        self.assertEqual(geo_util.fetch_location_data("Columbus, OH")[0]['name'], "Columbus")
+        self.assertEqual(geo_util.fetch_location_data("Madison, WI")[0]['name'], "Madison")
+        self.assertEqual(server.requests['/direct'], 3)  # The rejected key was only tried once
+
+    @patch('geoloc_util.time.sleep')
+    def test_every_backend_failing(self, mock_sleep):
+        geo_util = self.utility(MockBackend(error_rate=1.0), retry_policy=RetryPolicy(max_retries=1),
+                                cache=GeoCache())
+
+        with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            self.assertIsNone(geo_util.fetch_location_data("12345"))
+            self.assertIn("HTTP 503 after 2 attempts", mock_stderr.getvalue())
+            self.assertEqual(mock_sleep.call_count, 1)
+
+            # Both attempts opened the circuit, so the next lookup isn't sent at all
+            with self.assertRaisesRegex(CircuitOpenError, "every backend is failing"):
+                geo_util.fetch_location_data("12346")
+
+    def test_expired_deadline_does_not_wedge_a_backend_probe(self):
+        server = MockGeocodingServer().start()
+        self.addCleanup(server.stop)
+        backend = OpenWeatherMapBackend("test-key", server.url)
+        router = BackendRouter([backend], reset_timeout=0.05)
+        router.record_failure(backend, "HTTP 503", fatal=True)
+        time.sleep(0.05)
+        geo_util = GeoLocationUtility(api_key=None, router=router)
+        self.addCleanup(geo_util.close)
+
+        geo_util.batch_deadline = 0.000001  # Expires before the probe is sent
+        self.assertEqual(geo_util.resolve_many(["10003"])[0]['error'], "deadline exceeded")
+
+        geo_util.batch_deadline = None
+        self.assertEqual(geo_util.resolve_many(["10004"])[0]['data'][0]['zip'], "10004")
+        self.assertEqual(router.snapshot()[backend.name]['state'], 'closed')
+
+    def test_offline_backend_hands_misses_on(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        csv_path = os.path.join(tmp, "zips.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+        build_gazetteer(csv_path, os.path.join(tmp, "zips.gaz"))
+        gazetteer = Gazetteer(os.path.join(tmp, "zips.gaz"))
+        self.addCleanup(gazetteer.close)
+        mock = MockBackend()
+        geo_util = self.utility(OfflineBackend(gazetteer), mock)
+
+        self.assertEqual(geo_util.fetch_location_data("Columbus, OH")[0]['lat'], 39.9653)
+        self.assertEqual(geo_util.fetch_location_data("54321")[0]['name'], "Town 54321")
+        self.assertEqual(mock.requests, {'/zip': 1})
+
+        cache = GeoCache()
+        with patch('sys.stderr', new_callable=StringIO):
+            self.assertIsNone(self.utility(OfflineBackend(gazetteer), cache=cache).fetch_location_data("54321"))
+        self.assertEqual(list(cache.items("zip:")), [])  # No backend answered, so the miss isn't cached
+
+    def test_async_utility_routes_the_same_way(self):
+        broken, healthy = MockBackend('broken', error_rate=1.0), MockBackend('healthy')
+
+        async def lookup():
+            router = BackendRouter([broken, healthy])
+            async with AsyncGeoLocationUtility(api_key=None, router=router) as geo_util:
+                return await geo_util.resolve_many(["12345", "Columbus, OH"])
+
+        results = asyncio.run(lookup())
+
+        self.assertEqual([result['data'][0]['name'] for result in results], ["Town 12345", "Columbus"])
+        self.assertEqual(healthy.requests['/direct'], 1)
+
+    def test_async_utility_keeps_slow_backends_off_the_event_loop(self):
+        zip_codes = [f"{10000 + number}" for number in range(5)]
+
+        async def lookup():
+            router = BackendRouter([MockBackend(latency=0.2)])
+            async with AsyncGeoLocationUtility(api_key=None, router=router) as geo_util:
+                start = time.perf_counter()
+                await asyncio.gather(*(geo_util.fetch_location_data(zip_code) for zip_code in zip_codes))
+                return time.perf_counter() - start
+
+        self.assertLess(asyncio.run(lookup()), 0.6)  # Five blocking lookups in turn would take at least a second
+
+
+class TestBackendCli(unittest.TestCase):
+
+    def run_cli(self, *args):
+        argv = ["geoloc_util.py", *args]
+        with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch('sys.stderr', new_callable=StringIO):
+            CommandLineInterface().run()
+        return mock_stdout.getvalue()
+
+    def test_mock_backend(self):
+        stdout = self.run_cli("--backend", "mock", "--format", "jsonl", "--locations", "12345", "Columbus, OH")
+
+        rows = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Town 12345", "Columbus"])
+
+    def test_offline_backend_needs_local_data(self):
+        with self.assertRaises(SystemExit):
+            self.run_cli("--backend", "offline", "--locations", "12345")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import time
+import unittest
+from functools import partial
+from io import StringIO
+from geoloc_batch import BatchJob, RateBudgetManager
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_util import GeoLocationUtility
+
+LOCATIONS = [f"{10000 + number}" for number in range(60)]
+
+
+def make_utility(base_url, resources, rate_limiter=None):
+    return GeoLocationUtility(api_key="test-key", base_url=base_url, rate_limiter=rate_limiter)
+
+
+class InterruptedJob(BatchJob):
+    """Stops as a crash would, after the first two chunks are merged."""
+
+    def _merge_ready(self):
+        super()._merge_ready()
+        if self.merged >= 2:
+            raise KeyboardInterrupt
+
+
+class TestBatchJob(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.input_path = os.path.join(directory.name, "locations.txt")
+        self.output_path = os.path.join(directory.name, "results.jsonl")
+        with open(self.input_path, 'w', encoding='utf-8') as input_file:
+            input_file.write("\n".join(LOCATIONS) + "\n")
+
+    def job(self, job_class=BatchJob, **options):
+        options = dict({'workers': 2, 'chunk_size': 10, 'concurrency': 2, 'output_format': 'jsonl'}, **options)
+        return job_class(partial(make_utility, self.server.url), self.input_path, self.output_path, **options)
+
+    def expected_output(self, output_format='jsonl'):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url)
+        self.addCleanup(geo_util.close)
+        stream = StringIO()
+        geo_util.process_locations(LOCATIONS, output_format=output_format, stream=stream)
+        return stream.getvalue()
+
+    def read_output(self):
+        with open(self.output_path, encoding='utf-8', newline='') as output_file:
+            return output_file.read()
+
+    def test_output_is_merged_in_input_order(self):
+        summary = self.job().run()
+
+        self.assertEqual(summary['chunks'], 6)
+        self.assertEqual(summary['locations'], 60)
+        self.assertEqual(self.read_output(), self.expected_output())
+        self.assertFalse(os.path.exists(self.output_path + ".parts"))
+
+    def test_csv_has_one_header(self):
+        self.job(output_format='csv').run()
+        self.assertEqual(self.read_output(), self.expected_output('csv'))
+
+    def test_resume_after_crash_skips_finished_chunks(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self.job(InterruptedJob).run()
+        with open(self.output_path, 'a', encoding='utf-8') as output_file:
+            output_file.write('{"half a record')  # Written after the last checkpoint
+
+        summary = self.job().run()
+
+        self.assertGreaterEqual(summary['resumed'], 2)
+        self.assertEqual(summary['locations'], 60)
+        self.assertEqual(self.server.requests['/zip'], 60)  # No chunk was queried twice
+        self.assertEqual(self.read_output(), self.expected_output())
+
+    def test_resume_with_different_options_is_refused(self):
+        with self.assertRaises(KeyboardInterrupt):
+            self.job(InterruptedJob).run()
+        with self.assertRaises(ValueError):
+            self.job(chunk_size=20).run()
+
+
+class TestRateBudget(unittest.TestCase):
+
+    def test_shared_bucket(self):
+        with RateBudgetManager() as manager:
+            bucket = manager.TokenBucket(100, 1)
+            start = time.perf_counter()
+            for _ in range(11):
+                bucket.acquire()
+            self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
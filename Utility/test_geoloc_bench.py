@@ -0,0 +1,79 @@
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_bench import compare, percentile, run_benchmarks
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_ratelimit import RetryPolicy
+from geoloc_util import GeoLocationUtility
+
+
+class TestMockServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+
+    def utility(self, **kwargs):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, **kwargs)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    def test_endpoints(self):
+        geo_util = self.utility()
+
+        zip_result = geo_util.resolve_location("12345")
+        self.assertEqual(zip_result['data'][0]['name'], "Town 12345")
+        self.assertNotEqual(zip_result['data'][0]['state'], "Unknown")  # Filled in by /reverse
+
+        city_result = geo_util.fetch_location_data("Columbus, OH")
+        self.assertEqual(city_result[0]['state'], "Ohio")
+        self.assertEqual(self.server.requests, {'/zip': 1, '/reverse': 1, '/direct': 1})
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_not_found_and_bad_key(self, mock_stderr):
+        self.assertEqual(self.utility().fetch_location_data("00000"), [{'cod': '404', 'message': 'not found'}])
+
+        no_key = GeoLocationUtility(api_key="", base_url=self.server.url)
+        self.addCleanup(no_key.close)
+        self.assertEqual(no_key.fetch_location_data("12345"), [{'cod': 401, 'message': 'Invalid API key.'}])
+
+    @patch('geoloc_util.time.sleep')
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_injected_throttling_is_retried(self, mock_stderr, mock_sleep):
+        self.server.throttle_rate = 1.0
+        geo_util = self.utility(retry_policy=RetryPolicy(max_retries=2))
+
+        self.assertIsNone(geo_util.fetch_location_data("12345"))
+        self.assertEqual(self.server.requests['/zip'], 3)
+        self.assertIn("HTTP 429 after 3 attempts", mock_stderr.getvalue())
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(scales=(5,), concurrency=2)
+
+        self.assertEqual([row['mode'] for row in results], ['sequential', 'concurrent', 'cached', 'offline', 'in-process'])
+        requests = {row['mode']: row['http_requests'] for row in results}
+        self.assertEqual(requests, {'sequential': 10, 'concurrent': 10, 'cached': 0, 'offline': 0, 'in-process': 0})
+        self.assertTrue(all(row['errors'] == 0 and row['throughput'] > 0 for row in results))
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': [{'mode': 'sequential', 'scale': 10, 'throughput': 100.0, 'p99_ms': 20.0, 'peak_mb': 4.0}]}
+        slower = [{'mode': 'sequential', 'scale': 10, 'throughput': 40.0, 'p99_ms': 20.0, 'peak_mb': 4.0}]
+        noisy = [{'mode': 'sequential', 'scale': 10, 'throughput': 80.0, 'p99_ms': 25.0, 'peak_mb': 5.0}]
+        unknown = [{'mode': 'offline', 'scale': 10, 'throughput': 1.0, 'p99_ms': 99.0, 'peak_mb': 99.0}]
+
+        self.assertEqual(len(compare(slower, baseline)), 1)
+        self.assertEqual(compare(noisy, baseline), [])
+        self.assertEqual(compare(unknown, baseline), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
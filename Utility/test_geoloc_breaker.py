@@ -0,0 +1,196 @@
+import asyncio
+import time
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from geoloc_cache import GeoCache
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_ratelimit import RetryPolicy
+from geoloc_util import GeoLocationUtility
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('geoloc_breaker.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window=10.0, reset_timeout=30.0)
+
+    def test_opens_once_the_failure_rate_is_reached(self):
+        for _ in range(2):
+            self.breaker.record_success()
+        self.breaker.record_failure("HTTP 503")
+        self.assertEqual(self.breaker.state, CLOSED)  # Too few requests to judge
+        self.breaker.record_failure("HTTP 503")
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.reason, "HTTP 503")
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(str(CircuitOpenError(self.breaker.reason)), "circuit open: HTTP 503")
+
+    def test_old_outcomes_leave_the_window(self):
+        for _ in range(3):
+            self.breaker.record_failure("HTTP 503")
+        self.now += 11
+        for _ in range(3):
+            self.breaker.record_success()
+        self.breaker.record_failure("HTTP 503")
+
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_fatal_failure_opens_at_once(self):
+        self.breaker.record_failure("HTTP 401", fatal=True)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_probe(self):
+        self.breaker.record_failure("HTTP 401", fatal=True)
+        self.now += 30
+
+        self.assertTrue(self.breaker.allow())  # The probe
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())  # Everyone else waits for it
+        self.breaker.record_failure("HTTP 401", fatal=True)
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.opened, 2)
+
+    def test_released_probe_can_be_taken_again(self):
+        self.breaker.record_failure("HTTP 401", fatal=True)
+        self.now += 30
+
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()  # The probe never got an answer
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+
+class TestFailFast(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        stderr = patch('sys.stderr', new_callable=StringIO)
+        stderr.start()
+        self.addCleanup(stderr.stop)
+
+    def utility(self, **kwargs):
+        kwargs.setdefault('api_key', "test-key")
+        geo_util = GeoLocationUtility(base_url=self.server.url, retry_policy=RetryPolicy(max_retries=0), **kwargs)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    def test_outage_stops_the_batch_sending_requests(self):
+        self.server.error_rate = 1.0
+        metrics = Metrics()
+        geo_util = self.utility(breaker=CircuitBreaker(min_requests=10), metrics=metrics)
+
+        results = geo_util.resolve_many([f"{10000 + number}" for number in range(200)], max_concurrency=1)
+
+        self.assertEqual(self.server.requests['/zip'], 10)
+        self.assertEqual(results[-1]['error'], "circuit open: HTTP 503")
+        self.assertEqual(metrics.counters['circuit_rejected'], 190)
+
+    def test_rejected_key_opens_the_circuit_at_once(self):
+        geo_util = self.utility(api_key="", breaker=CircuitBreaker())
+
+        results = geo_util.resolve_many(["12345", "54321", "Columbus, OH"], max_concurrency=1)
+
+        self.assertEqual(sum(self.server.requests.values()), 1)
+        self.assertEqual(results[0]['data'][0]['cod'], 401)
+        self.assertEqual(results[2]['error'], "circuit open: HTTP 401")
+
+    def test_recovers_after_a_probe(self):
+        breaker = CircuitBreaker(min_requests=2, reset_timeout=0.05)
+        geo_util = self.utility(breaker=breaker)
+        self.server.error_rate = 1.0
+        geo_util.resolve_many(["10001", "10002", "10003"], max_concurrency=1)
+        self.assertEqual(breaker.state, OPEN)
+
+        self.server.error_rate = 0.0
+        time.sleep(0.05)
+        results = geo_util.resolve_many(["10004", "10005"], max_concurrency=1)
+
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(all(result['data'] for result in results))
+
+    def test_expired_deadline_does_not_wedge_the_probe(self):
+        breaker = CircuitBreaker(min_requests=2, reset_timeout=0.05)
+        geo_util = self.utility(breaker=breaker)
+        self.server.error_rate = 1.0
+        geo_util.resolve_many(["10001", "10002"], max_concurrency=1)
+        self.server.error_rate = 0.0
+        time.sleep(0.05)
+
+        geo_util.batch_deadline = 0.000001  # Expires before the probe is sent
+        results = geo_util.resolve_many(["10003"], max_concurrency=1)
+        self.assertEqual(results[0]['error'], "deadline exceeded")
+
+        geo_util.batch_deadline = None
+        results = geo_util.resolve_many(["10004"], max_concurrency=1)
+        self.assertEqual(results[0]['data'][0]['zip'], "10004")
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_stale_entries_answer_while_the_api_is_down(self):
+        cache = GeoCache(ttl=0.01)
+        self.utility(cache=cache).resolve_many(["12345", "Columbus, OH"])
+        time.sleep(0.02)  # Both entries have expired
+        self.server.error_rate = 1.0
+        metrics = Metrics()
+        geo_util = self.utility(cache=cache, breaker=CircuitBreaker(min_requests=1), serve_stale=True,
+                                metrics=metrics)
+
+        results = geo_util.resolve_many(["12345", "Columbus, OH", "54321"], max_concurrency=1)
+
+        self.assertEqual(results[0]['data'][0]['name'], "Town 12345")
+        self.assertEqual(results[1]['data'][0]['name'], "Columbus")
+        self.assertEqual(results[2]['error'], "circuit open: HTTP 503")
+        self.assertNotEqual(results[0]['data'][0]['state'], 'Unknown')
+        self.assertEqual(metrics.counters['stale_hits'], 3)  # Both lookups, and the ZIP's reverse state lookup
+        self.assertEqual(self.server.requests['/zip'], 2)  # The first run's and the failure that opened it
+
+    def test_async_utility(self):
+        self.server.error_rate = 1.0
+
+        async def resolve():
+            async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url,
+                                               retry_policy=RetryPolicy(max_retries=0),
+                                               breaker=CircuitBreaker(min_requests=5)) as geo_util:
+                return [await geo_util.resolve_location(f"{10000 + number}") for number in range(20)]
+
+        results = asyncio.run(resolve())
+
+        self.assertEqual(self.server.requests['/zip'], 5)
+        self.assertEqual(results[-1]['error'], "circuit open: HTTP 503")
+
+
+    def test_async_expired_deadline_does_not_wedge_the_probe(self):
+        breaker = CircuitBreaker(min_requests=1, reset_timeout=0.05)
+        breaker.record_failure("HTTP 503", fatal=True)
+        time.sleep(0.05)
+
+        async def resolve():
+            async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url,
+                                               breaker=breaker) as geo_util:
+                geo_util.batch_deadline = 0.000001
+                expired = await geo_util.resolve_many(["10003"])
+                geo_util.batch_deadline = None
+                return expired, await geo_util.resolve_many(["10004"])
+
+        expired, results = asyncio.run(resolve())
+
+        self.assertEqual(expired[0]['error'], "deadline exceeded")
+        self.assertEqual(results[0]['data'][0]['zip'], "10004")
+        self.assertEqual(breaker.state, CLOSED)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from geoloc_cache import GeoCache
+from geoloc_util import GeoLocationUtility
+
+
+class TestGeoCache(unittest.TestCase):
+
+    def test_memory_hit_and_miss_counters(self):
+        cache = GeoCache()
+        self.assertEqual(cache.get("zip:12345,us"), (False, None))
+
+        cache.set("zip:12345,us", {'name': 'Schenectady'})
+        self.assertEqual(cache.get("zip:12345,us"), (True, {'name': 'Schenectady'}))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_negative_entry(self):
+        cache = GeoCache()
+        cache.set("zip:00000,us", None)
+        self.assertEqual(cache.get("zip:00000,us"), (True, None))
+
+    def test_lru_eviction(self):
+        cache = GeoCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "a" is now the most recently used
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("c"), (True, 3))
+
+    def test_ttl_expiry(self):
+        cache = GeoCache(ttl=10, negative_ttl=1)
+        with patch('geoloc_cache.time.time', return_value=1000.0):
+            cache.set("positive", {'lat': 1.0})
+            cache.set("negative", None)
+        with patch('geoloc_cache.time.time', return_value=1005.0):
+            self.assertEqual(cache.get("positive"), (True, {'lat': 1.0}))
+            self.assertEqual(cache.get("negative"), (False, None))
+        with patch('geoloc_cache.time.time', return_value=1011.0):
+            self.assertEqual(cache.get("positive"), (False, None))
+
+    def test_returns_copies(self):
+        cache = GeoCache()
+        cache.set("zip:12345,us", [{'name': 'Schenectady'}])
+        found, value = cache.get("zip:12345,us")
+        value[0]['state'] = 'New York'
+        self.assertEqual(cache.get("zip:12345,us"), (True, [{'name': 'Schenectady'}]))
+
+    def test_sqlite_tier_persists(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "geocache.sqlite")
+            cache = GeoCache(path=path)
+            cache.set("direct:columbus, ohio", [{'name': 'Columbus', 'state': 'Ohio'}])
+            cache.close()
+
+            reopened = GeoCache(path=path)
+            self.assertEqual(reopened.get("direct:columbus, ohio"), (True, [{'name': 'Columbus', 'state': 'Ohio'}]))
+            self.assertEqual(reopened.stats()['disk_hits'], 1)
+            reopened.close()
+
+    def test_purge_expired(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = GeoCache(path=os.path.join(tmp, "geocache.sqlite"), ttl=10)
+            with patch('geoloc_cache.time.time', return_value=1000.0):
+                cache.set("old", 1)
+            cache.purge_expired()
+            self.assertEqual(cache.get("old"), (False, None))
+            self.assertEqual(cache.stats()['memory_entries'], 0)
+            cache.close()
+
+
+class TestGeoLocationUtilityCache(unittest.TestCase):
+
+    def mock_response(self, data, status_code=200):
+        response = MagicMock()
+        response.status_code = status_code
+        response.content = json.dumps(data).encode()
+        return response
+
+    @patch('requests.Session.get')
+    def test_repeated_lookup_served_from_cache(self, mock_get):
+        mock_get.return_value = self.mock_response(
+            {'zip': '12345', 'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396, 'country': 'US'})
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", cache=GeoCache())
+
+        first = geo_util.fetch_location_data("12345")
+        second = geo_util.fetch_location_data("12345")
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_cache_key_excludes_api_key(self, mock_get):
+        mock_get.return_value = self.mock_response([{'name': 'Columbus', 'state': 'Ohio', 'lat': 39.96, 'lon': -83.0}])
+        cache = GeoCache()
+
+        GeoLocationUtility(api_key="first_key", cache=cache).fetch_location_data("Columbus, OH")
+        GeoLocationUtility(api_key="second_key", cache=cache).fetch_location_data("columbus,  OH")
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIn("direct:columbus, ohio", cache._memory)
+
+    @patch('requests.Session.get')
+    def test_not_found_is_negatively_cached(self, mock_get):
+        mock_get.return_value = self.mock_response({'cod': '404', 'message': 'not found'}, 404)
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", cache=GeoCache())
+
+        geo_util.fetch_location_data("12341")
+        result = geo_util.fetch_location_data("12341")
+
+        self.assertEqual(result, [{'cod': '404', 'message': 'not found'}])
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_invalid_key_is_not_cached(self, mock_get):
+        mock_get.return_value = self.mock_response({'cod': 401, 'message': 'Invalid API key.'}, 401)
+        geo_util = GeoLocationUtility(api_key="", cache=GeoCache())
+
+        geo_util.fetch_location_data("02135")
+        geo_util.fetch_location_data("02135")
+
+        self.assertEqual(mock_get.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
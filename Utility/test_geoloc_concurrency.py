@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_util import GeoLocationUtility
+
+
+class TestGeoLocationUtilityConcurrency(unittest.TestCase):
+
+    def fake_fetch(self, location):
+        # Later locations finish first so out-of-order completion would show up in the results
+        time.sleep(0.05 / (int(location) + 1))
+        if location == "3":
+            raise ValueError(f"Invalid location: {location}")
+        return [{'name': f"Place {location}", 'state': 'Ohio', 'lat': 1.0, 'lon': 2.0, 'country': 'US'}]
+
+    def test_resolve_many_keeps_input_order(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        locations = [str(i) for i in range(6)]
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            results = geo_util.resolve_many(locations, max_concurrency=4)
+
+        self.assertEqual([result['location'] for result in results], locations)
+        self.assertEqual(results[0]['data'][0]['name'], "Place 0")
+        self.assertEqual(results[5]['data'][0]['name'], "Place 5")
+
+    def test_resolve_many_accepts_a_generator(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            results = geo_util.resolve_many((str(i) for i in range(3)), max_concurrency=2)
+
+        self.assertEqual([result['location'] for result in results], ["0", "1", "2"])
+
+    def test_resolve_many_reports_per_item_errors(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        locations = ["2", "3", "4"]
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            results = geo_util.resolve_many(locations, max_concurrency=3)
+
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[1]['error'], "Invalid location: 3")
+        self.assertIsNone(results[1]['data'])
+        self.assertIsNone(results[2]['error'])
+
+    def test_resolve_many_is_bounded(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+
+        def tracking_fetch(location):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return None
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=tracking_fetch):
+            geo_util.resolve_many([str(i) for i in range(20)], max_concurrency=3)
+
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 3)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_process_locations_concurrent_output(self, mock_stdout):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            geo_util.process_locations(["1", "3", "0"], max_concurrency=3)
+
+        lines = mock_stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], "Location: Place 1, Ohio")
+        self.assertIn("Error: Unable to resolve 3: Invalid location: 3", lines)
+        self.assertEqual(lines[-5], "Location: Place 0, Ohio")
+
+
+if __name__ == "__main__":
+    unittest.main()
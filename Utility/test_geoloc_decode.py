@@ -0,0 +1,92 @@
+import asyncio
+import json
+import unittest
+from io import StringIO
+from unittest.mock import patch
+import geoloc_decode
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_cache import GeoCache
+from geoloc_decode import decode_response
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_records import ApiError, Location
+from geoloc_util import GeoLocationUtility
+
+COLUMBUS = {'name': 'Columbus', 'local_names': {'en': 'Columbus', 'ru': 'Колумбус'}, 'lat': 39.9622601,
+            'lon': -83.0007065, 'country': 'US', 'state': 'Ohio'}
+
+
+class TestDecodeResponse(unittest.TestCase):
+
+    def test_places_become_locations(self):
+        records = decode_response(200, json.dumps([COLUMBUS]).encode())
+
+        self.assertIsInstance(records[0], Location)
+        self.assertNotIn('local_names', records[0])  # Skipped unless asked for
+        self.assertEqual(records[0]['state'], 'Ohio')
+        self.assertEqual(decode_response(200, json.dumps([COLUMBUS]), local_names=True), [COLUMBUS])
+
+    def test_a_zip_answer_becomes_a_list(self):
+        records = decode_response(200, b'{"zip": "12345", "name": "Schenectady", "lat": 42.8142, "lon": -73.9396}')
+        self.assertEqual([record['name'] for record in records], ["Schenectady"])
+
+    def test_empty_answers_are_none(self):
+        self.assertIsNone(decode_response(200, b"[]"))
+        self.assertIsNone(decode_response(200, b""))
+
+    def test_error_statuses_are_api_errors(self):
+        self.assertEqual(decode_response(404, b'{"cod": "404", "message": "not found"}'),
+                         [ApiError('404', 'not found')])
+        self.assertEqual(decode_response(401, b'{"cod": 401, "message": "Invalid API key."}')[0].status, 401)
+        # Not every error comes from the API itself
+        self.assertEqual(decode_response(502, b"<html>Bad Gateway</html>"), [ApiError(502, "HTTP 502")])
+        self.assertEqual(decode_response(500, b""), [ApiError(500, "HTTP 500")])
+
+    def test_a_good_status_with_a_bad_body_raises(self):
+        with self.assertRaises(ValueError):
+            decode_response(200, b"<html>")
+
+    def test_json_module_without_orjson(self):
+        with patch.object(geoloc_decode, '_loads', None), patch.dict('sys.modules', {'orjson': None}):
+            self.assertEqual(decode_response(200, json.dumps([COLUMBUS]).encode(), local_names=True), [COLUMBUS])
+            self.assertIs(geoloc_decode._loads, json.loads)
+
+
+class TestUtilityDecoding(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_not_found_is_a_cached_api_error(self):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, cache=GeoCache())
+        self.addCleanup(geo_util.close)
+
+        first = geo_util.fetch_location_data("00000")
+        second = geo_util.fetch_location_data("00000")
+
+        self.assertIsInstance(first[0], ApiError)
+        self.assertEqual(second, [{'cod': '404', 'message': 'not found'}])
+        self.assertEqual(self.server.requests['/zip'], 1)
+
+    def test_rejected_key_is_an_api_error(self):
+        geo_util = GeoLocationUtility(api_key="", base_url=self.server.url)
+        self.addCleanup(geo_util.close)
+
+        with patch('sys.stderr', new_callable=StringIO):
+            self.assertEqual(geo_util.fetch_location_data("Columbus, OH"), [ApiError(401, 'Invalid API key.')])
+            self.assertEqual(geo_util.fetch_state_from_lat_lon(39.96, -83.0), [ApiError(401, 'Invalid API key.')])
+            self.assertEqual(geo_util.resolve_state(39.96, -83.0), 'Unknown')
+
+    def test_async_utility_decodes_the_same_way(self):
+        async def lookup():
+            async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url) as geo_util:
+                return await geo_util.fetch_location_data("Columbus, OH"), await geo_util.fetch_location_data("00000")
+
+        found, missing = asyncio.run(lookup())
+
+        self.assertIsInstance(found[0], Location)
+        self.assertEqual(missing, [ApiError('404', 'not found')])
+
+
+if __name__ == "__main__":
+    unittest.main()
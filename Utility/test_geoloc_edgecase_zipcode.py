@@ -21,17 +21,14 @@ class TestGeoLocationUtilityZip(unittest.TestCase):
             "country": "US"
         }]),
 
-        # Test 2: Invalid zip code (234), should return 404 error with message "not found"
-        ("234", [{"cod": "404", "message": "not found"}]),
+        # Test 2: Invalid zip code (234), too short, rejected before any request is sent
+        ("234", None),
 
-        # Test 3: Empty zip code, should return a 400 error with message "Nothing to geocode"
-        ("", [{"cod": "400", "message": "invalid zip code"}]),
+        # Test 3: Empty zip code, rejected locally
+        ("", None),
 
-        # Test 4: Invalid zip with special characters (<<%12345%>>), should return 500 internal error
-        ("<<%12345%>>", [{'cod': '404', 'message': 'not found'}]),
-
-        # Test 5: Invalid zip with some encoded characters (12<<>>345), should return location data for Schenectady
-        ("12%3C%3C%3E%3E345", [{
+        # Test 4: Zip wrapped in special characters (<<%12345%>>), the digits are used: Schenectady
+        ("<<%12345%>>", [{
             "zip": "12345",
             "name": "Schenectady",
             "lat": 42.8142,
@@ -39,11 +36,14 @@ class TestGeoLocationUtilityZip(unittest.TestCase):
             "country": "US"
         }]),
 
-        # Test 6: Non-existent zip code (100010), should return 404 error with message "not found"
-        ("100010", [{"cod": "404", "message": "not found"}]),
+        # Test 5: Zip with URL-encoded characters (12%3C%3C%3E%3E345) contains letters, rejected locally
+        ("12%3C%3C%3E%3E345", None),
+
+        # Test 6: Six digits (100010) can't be a zip code, rejected locally
+        ("100010", None),
 
-        # Test 7: Invalid zip code "PPPPP", should return 404 error with message "not found"
-        ("PPPPP", [{"cod": "404", "message": "not found"}]),
+        # Test 7: Invalid zip code "PPPPP", rejected locally
+        ("PPPPP", None),
 
         # Test 8: Non-existent zip code (12341), should return 404 error with message "not found"
         ("12341", [{"cod": "404", "message": "not found"}]),
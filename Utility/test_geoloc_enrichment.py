@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_polygons import PolygonIndex, StatePolygonIndex
+from geoloc_util import GeoLocationUtility
+
+SQUARE_STATE = {
+    'type': 'Feature',
+    'properties': {'name': 'Squareland'},
+    'geometry': {'type': 'Polygon', 'coordinates': [[[-84, 38], [-80, 38], [-80, 42], [-84, 42], [-84, 38]]]},
+}
+
+# Two islands, the first with a lake (hole) in the middle
+ISLAND_STATE = {
+    'type': 'Feature',
+    'properties': {'NAME': 'Islandia'},
+    'geometry': {'type': 'MultiPolygon', 'coordinates': [
+        [[[-70, 40], [-66, 40], [-66, 44], [-70, 44], [-70, 40]],
+         [[-69, 41], [-67, 41], [-67, 43], [-69, 43], [-69, 41]]],
+        [[[-60, 40], [-59, 40], [-59, 41], [-60, 41], [-60, 40]]],
+    ]},
+}
+
+
+# Two triangles that share a diagonal border crossing many grid cells
+LOWER_TRIANGLE = {
+    'type': 'Feature',
+    'properties': {'name': 'Lower', 'state': 'Ohio'},
+    'geometry': {'type': 'Polygon', 'coordinates': [[[-90, 30], [-80, 30], [-80, 37.3], [-90, 30]]]},
+}
+UPPER_TRIANGLE = {
+    'type': 'Feature',
+    'properties': {'name': 'Upper'},
+    'geometry': {'type': 'Polygon', 'coordinates': [[[-90, 30], [-80, 37.3], [-90, 37.3], [-90, 30]]]},
+}
+
+
+def zip_record(name, lat, lon):
+    return {'zip': '00000', 'name': name, 'lat': lat, 'lon': lon, 'country': 'US'}
+
+
+class TestStatePolygonIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = StatePolygonIndex([SQUARE_STATE, ISLAND_STATE])
+
+    def test_point_in_polygon(self):
+        self.assertEqual(self.index.lookup(40.0, -82.0), "Squareland")
+        self.assertEqual(self.index.lookup(40.5, -59.5), "Islandia")
+        self.assertEqual(self.index.lookup(40.5, -69.5), "Islandia")
+
+    def test_outside_and_holes(self):
+        self.assertIsNone(self.index.lookup(42.0, -68.0))  # In the lake
+        self.assertIsNone(self.index.lookup(30.0, -82.0))
+        self.assertIsNone(self.index.lookup("", -82.0))
+
+    def test_from_geojson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "states.geojson")
+            with open(path, "w") as geojson_file:
+                json.dump({'type': 'FeatureCollection', 'features': [SQUARE_STATE]}, geojson_file)
+            index = StatePolygonIndex.from_geojson(path)
+        self.assertEqual(index.lookup(39.0, -81.0), "Squareland")
+
+    def test_points_near_a_diagonal_border(self):
+        index = PolygonIndex([LOWER_TRIANGLE, UPPER_TRIANGLE])
+        for step in range(1, 1000):
+            lon = -90 + step * 0.01
+            border = 30 + (lon + 90) * 0.73
+            self.assertEqual(index.lookup(border - 0.001, lon), "Lower")
+            self.assertEqual(index.lookup(border + 0.001, lon), "Upper")
+        self.assertIsNone(index.lookup(29.999, -85.0))
+        self.assertIsNone(index.lookup(35.0, -79.999))
+
+    def test_lookup_feature(self):
+        index = PolygonIndex([LOWER_TRIANGLE, UPPER_TRIANGLE])
+        self.assertEqual(index.lookup_feature(31.0, -81.0), ("Lower", {'name': 'Lower', 'state': 'Ohio'}))
+        self.assertIsNone(index.lookup_feature(50.0, -81.0))
+
+
+class TestStateEnrichment(unittest.TestCase):
+
+    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon', return_value=[{'name': 'Boston', 'state': 'Massachusetts'}])
+    def test_batch_dedupes_coordinates(self, mock_fetch_state):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        results = [
+            [zip_record("Boston", 42.3478, -71.1566)],
+            [zip_record("Boston", 42.3478, -71.1566)],
+            [zip_record("Brookline", 42.33, -71.12)],
+            None,
+            [{'cod': '404', 'message': 'not found'}],
+            [{'name': 'Columbus', 'state': 'Ohio', 'lat': 39.96, 'lon': -83.0}],
+        ]
+
+        geo_util.enrich_states(results, max_concurrency=4)
+
+        self.assertEqual(mock_fetch_state.call_count, 2)
+        self.assertEqual(results[0][0]['state'], "Massachusetts")
+        self.assertEqual(results[1][0]['state'], "Massachusetts")
+        self.assertNotIn('state', results[4][0])
+        self.assertEqual(results[5][0]['state'], "Ohio")
+
+    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon', return_value=[{'cod': '400', 'message': 'Nothing to geocode'}])
+    def test_failed_reverse_lookup_is_unknown(self, mock_fetch_state):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        results = [[zip_record("Nowhere", 1.0, 2.0)]]
+
+        geo_util.enrich_states(results)
+
+        self.assertEqual(results[0][0]['state'], "Unknown")
+
+    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon')
+    def test_offline_state_index(self, mock_fetch_state):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", state_index=StatePolygonIndex([SQUARE_STATE]))
+        results = [[zip_record("Middle", 40.0, -82.0)]]
+
+        geo_util.enrich_states(results)
+
+        self.assertEqual(results[0][0]['state'], "Squareland")
+        mock_fetch_state.assert_not_called()
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon', return_value=[{'name': 'Boston', 'state': 'Massachusetts'}])
+    def test_process_locations_enriches_once_per_coordinate(self, mock_fetch_state, mock_stdout):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        records = {"02135": zip_record("Boston", 42.3478, -71.1566), "02134": zip_record("Boston", 42.3478, -71.1566)}
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=lambda location: [dict(records[location])]):
+            geo_util.process_locations(["02135", "02134", "02135"], max_concurrency=3)
+
+        mock_fetch_state.assert_called_once_with(42.3478, -71.1566)
+        self.assertEqual(mock_stdout.getvalue().count("Location: Boston, Massachusetts"), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
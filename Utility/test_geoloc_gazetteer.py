@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_gazetteer import Gazetteer, build_gazetteer
+from geoloc_util import GeoLocationUtility
+
+SAMPLE_CSV = """zip,city,state_id,lat,lng
+12345,Schenectady,NY,42.8142,-73.9396
+02135,Boston,MA,42.3478,-71.1566
+02108,Boston,MA,42.3576,-71.0643
+43215,Columbus,OH,39.9653,-83.0057
+10001,New York,NY,40.7484,-73.9967
+00601,Adjuntas,PR,18.1801,-66.7522
+"""
+
+
+class TestGazetteer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        csv_path = os.path.join(cls.tmp, "zips.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+        cls.path = os.path.join(cls.tmp, "zips.gaz")
+        cls.counts = build_gazetteer(csv_path, cls.path)
+        cls.gazetteer = Gazetteer(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gazetteer.close()
+        shutil.rmtree(cls.tmp)
+
+    def test_build_skips_non_states(self):
+        # Puerto Rico is not in the state table, and the two Boston ZIPs make one city
+        self.assertEqual(self.counts, (5, 4))
+
+    def test_lookup_zip(self):
+        self.assertEqual(self.gazetteer.lookup_zip("12345"), {
+            'zip': '12345', 'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396,
+            'country': 'US', 'state': 'New York'
+        })
+        self.assertEqual(self.gazetteer.lookup_zip("02135")['name'], "Boston")
+        self.assertEqual(self.gazetteer.lookup_zip("12345-6789")['zip'], "12345")
+
+    def test_lookup_zip_miss(self):
+        self.assertIsNone(self.gazetteer.lookup_zip("12341"))
+        self.assertIsNone(self.gazetteer.lookup_zip("1234"))
+        self.assertIsNone(self.gazetteer.lookup_zip("PPPPP"))
+        self.assertIsNone(self.gazetteer.lookup_zip("00601"))
+
+    def test_lookup_city(self):
+        columbus = self.gazetteer.lookup_city("Columbus", "OH")
+        self.assertEqual(columbus['state'], "Ohio")
+        self.assertEqual(columbus['lat'], 39.9653)
+        self.assertEqual(self.gazetteer.lookup_city("columbus ", "ohio"), columbus)
+
+        # City centroids are the mean of their ZIP centroids
+        boston = self.gazetteer.lookup_city("Boston", "Massachusetts")
+        self.assertAlmostEqual(boston['lat'], (42.3478 + 42.3576) / 2)
+
+    def test_lookup_city_miss(self):
+        self.assertIsNone(self.gazetteer.lookup_city("Columbus", "GA"))
+        self.assertIsNone(self.gazetteer.lookup_city("Springfield", "IL"))
+        self.assertIsNone(self.gazetteer.lookup_city("Columbus", "XX"))
+
+    def test_iter_cities(self):
+        names = sorted(city[0] for city in self.gazetteer.iter_cities())
+        self.assertEqual(names, ["Boston", "Columbus", "New York", "Schenectady"])
+
+    def test_rejects_other_files(self):
+        bogus = os.path.join(self.tmp, "bogus.gaz")
+        with open(bogus, "wb") as bogus_file:
+            bogus_file.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            Gazetteer(bogus)
+
+        with open(bogus, "wb") as bogus_file:
+            bogus_file.write(b"GZTR")  # Shorter than the header
+        with self.assertRaises(ValueError):
+            Gazetteer(bogus)
+
+    @patch('requests.Session.get')
+    def test_utility_answers_from_gazetteer(self, mock_get):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", gazetteer=self.gazetteer)
+
+        self.assertEqual(geo_util.fetch_location_data("10001")[0]['name'], "New York")
+        self.assertEqual(geo_util.fetch_location_data("Columbus, OH")[0]['state'], "Ohio")
+        mock_get.assert_not_called()
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('requests.Session.get')
+    def test_offline_mode_never_calls_api(self, mock_get, mock_stdout):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", gazetteer=self.gazetteer, offline=True)
+
+        self.assertIsNone(geo_util.fetch_location_data("90210"))
+        geo_util.process_locations(["12345"])
+
+        mock_get.assert_not_called()
+        self.assertIn("Location: Schenectady, New York", mock_stdout.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
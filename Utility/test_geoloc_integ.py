@@ -72,8 +72,7 @@ class TestGeoLocationUtility(unittest.TestCase):
         locations = [";;;;;"]
         for location in range(len(locations)):
             result = geo_util.fetch_location_data(locations[location])
-            self.assertIsNotNone(result, f"Result should be None for {locations[location]}")
-            self.assertEqual(result, [{'cod': '404', 'message': 'not found'}])
+            self.assertIsNone(result, f"Result should be None for {locations[location]}")
 
     def test_integration_single_invalidlocation(self):
         # Instantiate the GeoLocationUtility with a mock API key
@@ -83,12 +82,8 @@ class TestGeoLocationUtility(unittest.TestCase):
         locations = ["123, 123"]
         for location in range(len(locations)):
             result = geo_util.fetch_location_data(locations[location])
-            self.assertIsNotNone(result, f"Result should be None for {locations[location]}")
-            self.assertEqual(result, [{'country': 'SI',
-                                               'lat': 45.985384,
-                                               'local_names': {'ru': 'Шкофлица', 'sl': 'Škofljica', 'sr': 'Шкофљица'},
-                                               'lon': 14.5728547,
-                                               'name': 'Škofljica'}])
+            # Not a US city and state, so it is rejected instead of matching a place abroad
+            self.assertIsNone(result, f"Result should be None for {locations[location]}")
 
     def test_integration_single_location(self):
         test_data = [{'country': 'US', 'lat': 39.9622601, 'local_names': {'ar': 'كولومبوس', 'en': 'Columbus', 'pl': 'Columbus', 'ru': 'Колумбус', 'ta': 'கொலம்பஸ்', 'uk': 'Колумбус'}, 'lon': -83.0007065, 'name': 'Columbus', 'state': 'Ohio'}]
@@ -106,7 +101,7 @@ class TestGeoLocationUtility(unittest.TestCase):
 
     def test_special_characters_in_location(self):
         # Test with cities that have special characters in their names
-        locations = ["San José, CA", "São Paulo, SP"]
+        locations = ["San José, CA", "Coeur d'Alene, ID"]
         result = self.geo_util.fetch_location_data(locations[0])
         self.assertIsNotNone(result)
         result = self.geo_util.fetch_location_data(locations[1])
@@ -149,7 +144,7 @@ class TestGeoLocationUtility(unittest.TestCase):
         self.assertEqual(output.strip(), expected_output.strip())
 
     @patch('sys.stdout', new_callable=StringIO)
-    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon', return_value="New York")
+    @patch.object(GeoLocationUtility, 'fetch_state_from_lat_lon', return_value=[{'name': 'New York', 'state': 'New York'}])
     def test_display_location_data_missing_state(self, mock_fetch_state, mock_stdout):
         # Mock location data with missing 'state'
         location_data = [
@@ -179,16 +174,16 @@ class TestGeoLocationUtility(unittest.TestCase):
 
         # Check if the output matches
         self.assertEqual(output.strip(), expected_output.strip())
-        mock_fetch_state.assert_called_once_with({40.7484}, {-73.9967})  # Ensure the fetch_state_from_lat_lon method was called
+        mock_fetch_state.assert_called_once_with(40.7484, -73.9967)  # Ensure the fetch_state_from_lat_lon method was called
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_make_api_request_empty_data(self, mock_get):
         # Simulate an empty response (empty JSON data)
-        mock_response = MagicMock()
-        mock_response.json.return_value = []  # Empty data list
+        mock_response = MagicMock(status_code=200)
+        mock_response.content = b"[]"  # Empty data list
         mock_response.raise_for_status = MagicMock()  # Mock the raise_for_status method to do nothing
 
-        # Mock the requests.get to return this response
+        # Mock the session's get to return this response
         mock_get.return_value = mock_response
 
         geo_util = GeoLocationUtility(api_key="mocked_api_key")
@@ -205,18 +200,18 @@ class TestGeoLocationUtility(unittest.TestCase):
 
 
     def test_fetch_state_from_lat_lon(self):
-        city = self.geo_util.fetch_state_from_lat_lon([40.7484],[-73.9967])
+        city = self.geo_util.fetch_state_from_lat_lon(40.7484, -73.9967)
         self.assertEqual(city[0]['state'], "New York")
 
-        city = self.geo_util.fetch_state_from_lat_lon([""], ["-73.9967"])
+        city = self.geo_util.fetch_state_from_lat_lon("", "-73.9967")
         self.assertIsNotNone(city)
         self.assertEqual(city, [{'cod': '400', 'message': 'Nothing to geocode'}])
 
-        city = self.geo_util.fetch_state_from_lat_lon(["123.123"], [""])
+        city = self.geo_util.fetch_state_from_lat_lon("123.123", "")
         self.assertIsNotNone(city)
         self.assertEqual(city, [{'cod': '400', 'message': 'Nothing to geocode'}])
 
-        city = self.geo_util.fetch_state_from_lat_lon([""], [""])
+        city = self.geo_util.fetch_state_from_lat_lon("", "")
         self.assertIsNotNone(city)
         self.assertEqual(city, [{'cod': '400', 'message': 'Nothing to geocode'}])
 
@@ -0,0 +1,104 @@
+import itertools
+import os
+import sys
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_io import read_locations
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+
+def fake_fetch(location):
+    return [{'name': f"Place {location}", 'state': 'Ohio', 'lat': 1.0, 'lon': 2.0, 'country': 'US'}]
+
+
+class TestReadLocations(unittest.TestCase):
+
+    def test_lines(self):
+        stream = StringIO("12345\n\n  Columbus, OH  \n# a comment\n02135\n")
+        self.assertEqual(list(read_locations(stream)), ["12345", "Columbus, OH", "02135"])
+
+    def test_csv(self):
+        stream = StringIO("city,state\nColumbus,OH\n\"San José\", CA\n12345\n")
+        self.assertEqual(list(read_locations(stream, 'csv')), ["Columbus, OH", "San José, CA", "12345"])
+
+    def test_auto_detects_csv_by_name(self):
+        stream = StringIO("zip\n12345\n02135\n")
+        self.assertEqual(list(read_locations(stream, name="zips.CSV")), ["12345", "02135"])
+
+    def test_is_lazy(self):
+        consumed = []
+
+        def lines():
+            for number in itertools.count():
+                consumed.append(number)
+                yield f"{number}\n"
+
+        reader = read_locations(lines())
+        self.assertEqual(next(reader), "0")
+        self.assertEqual(len(consumed), 1)
+
+
+class TestResolveIter(unittest.TestCase):
+
+    def test_keeps_order_across_chunks(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        locations = [str(i) for i in range(25)]
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=fake_fetch):
+            results = list(geo_util.resolve_iter(locations, max_concurrency=4, chunk_size=7))
+
+        self.assertEqual([result['location'] for result in results], locations)
+
+    def test_consumes_input_lazily(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        consumed = []
+
+        def endless():
+            for number in itertools.count():
+                consumed.append(number)
+                yield str(number)
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=fake_fetch):
+            results = geo_util.resolve_iter(endless(), max_concurrency=2, chunk_size=10)
+            first = list(itertools.islice(results, 5))
+            results.close()
+
+        self.assertEqual([result['location'] for result in first], ["0", "1", "2", "3", "4"])
+        # At most the current chunk and the one being prefetched have been read
+        self.assertLessEqual(len(consumed), 21)
+
+
+class TestCommandLineInput(unittest.TestCase):
+
+    def run_cli(self, argv, stdin=None):
+        with patch.object(sys, 'argv', ["geoloc_util.py"] + argv), \
+                patch('sys.stdin', stdin or StringIO()), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=fake_fetch):
+            CommandLineInterface().run()
+        return mock_stdout.getvalue()
+
+    def test_input_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "locations.csv")
+            with open(path, "w") as input_file:
+                input_file.write("location\n12345\nColumbus,OH\n")
+            output = self.run_cli(["--input", path])
+
+        self.assertIn("Location: Place 12345, Ohio", output)
+        self.assertIn("Location: Place Columbus, OH, Ohio", output)
+
+    def test_input_stdin(self):
+        output = self.run_cli(["--input", "-", "--concurrency", "4"], stdin=StringIO("12345\n02135\n"))
+        self.assertLess(output.index("Place 12345"), output.index("Place 02135"))
+
+    def test_locations_and_input_are_exclusive(self):
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit):
+                self.run_cli(["--locations", "12345", "--input", "-"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_journal import ResultJournal, completed
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_ratelimit import RetryPolicy
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+
+class TestResultJournal(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "run.journal")
+
+    def test_completed(self):
+        self.assertTrue(completed({'location': "12345", 'data': [{'name': "Town"}], 'error': None}))
+        self.assertTrue(completed({'location': "00000", 'data': [{'cod': '404'}], 'error': None}))
+        self.assertFalse(completed({'location': "12345", 'data': [{'cod': 429}], 'error': None}))
+        self.assertFalse(completed({'location': "12345", 'data': None, 'error': None}))
+        self.assertFalse(completed({'location': "12345", 'data': None, 'error': "boom"}))
+
+    def test_reopen_replays_completed_and_forgets_failures(self):
+        with ResultJournal(self.path) as journal:
+            journal.record("zip:12345", {'location': "12345", 'data': [{'name': "Town"}], 'error': None})
+            journal.record("zip:54321", {'location': "54321", 'data': None, 'error': "timed out"})
+            # Readable before the batched sync
+            self.assertEqual(journal.get("zip:12345")['data'], [{'name': "Town"}])
+
+        with ResultJournal(self.path) as journal:
+            self.assertEqual(len(journal), 1)
+            self.assertEqual(journal.get("zip:12345", " 12345 "),
+                             {'location': " 12345 ", 'data': [{'name': "Town"}], 'error': None})
+            self.assertIsNone(journal.get("zip:54321"))
+
+    def test_torn_last_record_is_dropped(self):
+        with ResultJournal(self.path) as journal:
+            journal.record("zip:12345", {'location': "12345", 'data': [{'name': "Town"}], 'error': None})
+        with open(self.path, 'ab') as journal_file:
+            journal_file.write(b'{"key":"zip:54321","loc')  # Crash in the middle of a write
+
+        with ResultJournal(self.path) as journal:
+            journal.record("zip:11111", {'location': "11111", 'data': [{'name': "Other"}], 'error': None})
+        with ResultJournal(self.path) as journal:
+            self.assertEqual(sorted(journal._index), ["zip:11111", "zip:12345"])
+
+    def test_batched_sync(self):
+        with patch('geoloc_journal.os.fsync') as mock_fsync:
+            journal = ResultJournal(self.path, sync_every=3, sync_interval=3600)
+            for number in range(7):
+                journal.record(f"zip:{number}", {'location': str(number), 'data': [{}], 'error': None})
+            self.assertEqual(mock_fsync.call_count, 2)
+            journal.close()
+            self.assertEqual(mock_fsync.call_count, 3)
+
+
+class TestJournaledLookups(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "run.journal")
+
+    def utility(self, journal, **kwargs):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, journal=journal, **kwargs)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_restart_skips_completed_and_retries_failures(self, mock_stderr):
+        locations = ["12345", "Columbus, OH", "54321"]
+        self.server.error_rate = 1.0  # The first run cannot reach the API at all...
+        with ResultJournal(self.path) as journal:
+            geo_util = self.utility(journal, retry_policy=RetryPolicy(max_retries=0))
+            first = geo_util.resolve_many(locations[:1], max_concurrency=1)
+        self.assertIsNone(first[0]['data'])
+
+        self.server.error_rate = 0.0  # ...the second completes everything...
+        with ResultJournal(self.path) as journal:
+            second = self.utility(journal).resolve_many(locations, max_concurrency=2)
+        requests_so_far = sum(self.server.requests.values())
+
+        metrics = Metrics()  # ...and the third is answered from the journal alone
+        with ResultJournal(self.path) as journal:
+            third = self.utility(journal, metrics=metrics).resolve_many(locations + ["columbus, ohio"])
+
+        self.assertEqual(sum(self.server.requests.values()), requests_so_far)
+        self.assertEqual(third[:3], second)
+        self.assertEqual(third[3]['location'], "columbus, ohio")
+        self.assertEqual(third[3]['data'], second[1]['data'])
+        self.assertEqual(metrics.counters['journal_hits'], 3)
+
+    def test_replay_drops_local_names_unless_asked_for(self):
+        columbus = {'name': "Columbus", 'local_names': {'en': "Columbus"}, 'lat': 39.96, 'lon': -83.0,
+                    'country': "US", 'state': "Ohio"}
+        with ResultJournal(self.path) as journal:
+            key = self.utility(journal).location_key("Columbus, OH")
+            journal.record(key, {'location': "Columbus, OH", 'data': [columbus], 'error': None})
+
+        with ResultJournal(self.path) as journal:
+            plain = self.utility(journal).resolve_many(["Columbus, OH"])
+            named = self.utility(journal, local_names=True).resolve_many(["Columbus, OH"])
+
+        self.assertNotIn('local_names', plain[0]['data'][0])
+        self.assertEqual(named[0]['data'][0]['local_names'], {'en': "Columbus"})
+        self.assertEqual(sum(self.server.requests.values()), 0)
+
+    def test_async_utility(self):
+        async def resolve():
+            with ResultJournal(self.path) as journal:
+                async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url,
+                                                   journal=journal) as geo_util:
+                    return await geo_util.resolve_many(["12345", "Columbus, OH"])
+
+        first = asyncio.run(resolve())
+        requests_so_far = sum(self.server.requests.values())
+        self.assertEqual(asyncio.run(resolve()), first)
+        self.assertEqual(sum(self.server.requests.values()), requests_so_far)
+
+    def test_cli_journal(self):
+        argv = ["geoloc_util.py", "--base-url", self.server.url, "--journal", self.path, "--format", "jsonl",
+                "--locations", "12345", "Columbus, OH"]
+        outputs = []
+        for _ in range(2):
+            with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                    patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                CommandLineInterface().run()
+            outputs.append(mock_stdout.getvalue())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(self.server.requests['/zip'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import sys
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_cache import GeoCache
+from geoloc_metrics import NULL_METRICS, Histogram, Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_ratelimit import RetryPolicy
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+        for seconds in [0.0005] * 50 + [0.005] * 49 + [0.05]:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.counts, [50, 49, 1, 0])
+        self.assertLessEqual(histogram.quantile(0.5), 0.001)
+        self.assertAlmostEqual(histogram.quantile(0.99), 0.01)  # Top of the bucket holding the 99th value
+        self.assertEqual(histogram.quantile(1.0), 0.05)
+
+    def test_counters_timers_and_hooks(self):
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(lambda kind, name, value: events.append((kind, name)))
+
+        metrics.increment('requests')
+        metrics.increment('requests', 2)
+        with metrics.timer('network'):
+            pass
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'requests': 3})
+        self.assertEqual(snapshot['phases']['network']['count'], 1)
+        self.assertEqual(events, [('counter', 'requests'), ('counter', 'requests'), ('timer', 'network')])
+
+    def test_prometheus_text(self):
+        metrics = Metrics(buckets=(0.01, 0.1))
+        metrics.increment('cache_hits')
+        metrics.observe('decode', 0.05)
+
+        text = metrics.to_prometheus()
+        self.assertIn("geoloc_cache_hits_total 1\n", text)
+        self.assertIn('geoloc_phase_seconds_bucket{phase="decode",le="0.01"} 0\n', text)
+        self.assertIn('geoloc_phase_seconds_bucket{phase="decode",le="+Inf"} 1\n', text)
+        self.assertIn('geoloc_phase_seconds_count{phase="decode"} 1\n', text)
+
+
+class TestInstrumentedLookups(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+
+    def test_phases_and_counters(self):
+        metrics = Metrics()
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, cache=GeoCache(), metrics=metrics)
+        self.addCleanup(geo_util.close)
+
+        geo_util.resolve_location("12345")
+        geo_util.resolve_location("12345")
+
+        snapshot = metrics.snapshot()
+        # The second lookup is answered from the cache, and so is the reverse lookup that fills in its state
+        self.assertEqual(snapshot['counters'], {'lookups': 2, 'requests': 2, 'cache_misses': 2, 'cache_hits': 2})
+        self.assertEqual(set(snapshot['phases']), {'lookup', 'parse', 'cache', 'network', 'decode', 'enrich'})
+        self.assertEqual(snapshot['phases']['network']['count'], 2)
+
+    @patch('geoloc_util.time.sleep')
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_retries_and_errors(self, mock_stderr, mock_sleep):
+        self.server.throttle_rate = 1.0
+        metrics = Metrics()
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, metrics=metrics,
+                                      retry_policy=RetryPolicy(max_retries=1))
+        self.addCleanup(geo_util.close)
+
+        geo_util.fetch_location_data("12345")
+
+        self.assertEqual(metrics.counters, {'lookups': 1, 'requests': 2, 'retries': 1, 'errors': 1})
+
+    def test_default_records_nothing(self):
+        self.assertIs(GeoLocationUtility(api_key="test-key").metrics, NULL_METRICS)
+
+    def test_cli_stats(self):
+        argv = ["geoloc_util.py", "--base-url", self.server.url, "--stats", "json", "--locations", "12345", "12345"]
+        with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            CommandLineInterface().run()
+
+        stats = json.loads(mock_stderr.getvalue())
+        self.assertEqual(stats['counters']['lookups'], 1)  # The repeated ZIP is deduplicated
+        self.assertEqual(stats['counters']['requests'], 2)
+        self.assertIn("Location: Town 12345", mock_stdout.getvalue())
+        self.assertNotIn("phase", mock_stdout.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
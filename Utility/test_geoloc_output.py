@@ -0,0 +1,116 @@
+import csv
+import json
+import sys
+import unittest
+from io import StringIO
+from unittest.mock import patch, MagicMock
+from geoloc_io import ResultWriter
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+RESULTS = [
+    {'location': "12345", 'data': [{'zip': '12345', 'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396,
+                                    'country': 'US', 'state': 'New York'}], 'error': None},
+    {'location': "12341", 'data': [{'cod': '404', 'message': 'not found'}], 'error': None},
+    {'location': "Madison,WI,US", 'data': None, 'error': "too many values to unpack"},
+    {'location': "qweqeqeqwe,qweqweq", 'data': None, 'error': None},
+]
+
+
+def write_all(output_format, buffer_size=512):
+    stream = StringIO()
+    writer = ResultWriter(stream, output_format, buffer_size=buffer_size)
+    for result in RESULTS:
+        writer.write(result)
+    writer.flush()
+    return stream.getvalue()
+
+
+class TestResultWriter(unittest.TestCase):
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in write_all('jsonl').splitlines()]
+
+        self.assertEqual(rows[0], {'location': '12345', 'name': 'Schenectady', 'state': 'New York', 'country': 'US',
+                                   'lat': 42.8142, 'lon': -73.9396, 'zip': '12345'})
+        self.assertEqual(rows[1], {'location': '12341', 'error': 'not found'})
+        self.assertEqual(rows[2], {'location': 'Madison,WI,US', 'error': 'too many values to unpack'})
+        self.assertEqual(rows[3], {'location': 'qweqeqeqwe,qweqweq', 'error': 'not found'})
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(write_all('csv'))))
+
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['name'], "Schenectady")
+        self.assertEqual(float(rows[0]['lat']), 42.8142)
+        self.assertEqual(rows[0]['error'], "")
+        self.assertEqual(rows[2]['location'], "Madison,WI,US")
+        self.assertEqual(rows[2]['error'], "too many values to unpack")
+
+    def test_text_matches_original_layout(self):
+        lines = write_all('text').splitlines()
+
+        self.assertEqual(lines[:5], [
+            "Location: Schenectady, New York",
+            "Latitude: 42.8142",
+            "Longitude: -73.9396",
+            "Country: US",
+            "=" * 40,
+        ])
+        self.assertEqual(lines[5], "Location: Unknown, Unknown")
+        self.assertEqual(lines[10], "Error: Unable to resolve Madison,WI,US: too many values to unpack")
+        self.assertEqual(len(lines), 11)
+
+    def test_writes_in_bulk(self):
+        stream = MagicMock()
+        stream.isatty.return_value = False
+        writer = ResultWriter(stream, 'jsonl', buffer_size=3)
+        for result in RESULTS * 2:
+            writer.write(result)
+        writer.flush()
+
+        # Eight results with a buffer of three: two full buffers plus the remainder
+        self.assertEqual(stream.write.call_count, 3)
+
+
+class TestStructuredResults(unittest.TestCase):
+
+    def fake_fetch(self, location):
+        return [{'name': f"Place {location}", 'state': 'Ohio', 'lat': 1.0, 'lon': 2.0, 'country': 'US'}]
+
+    def test_process_locations_returns_results(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        stream = StringIO()
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            results = geo_util.process_locations(["1", "2"], output_format='jsonl', stream=stream)
+
+        self.assertEqual([result['data'][0]['name'] for result in results], ["Place 1", "Place 2"])
+        self.assertEqual(len(stream.getvalue().splitlines()), 2)
+
+    def test_cli_format_flag(self):
+        with patch.object(sys, 'argv', ["geoloc_util.py", "--format", "jsonl", "--locations", "1", "2"]), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch.object(GeoLocationUtility, 'fetch_location_data', side_effect=self.fake_fetch):
+            CommandLineInterface().run()
+
+        rows = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Place 1", "Place 2"])
+
+    def test_diagnostics_stay_out_of_structured_output(self):
+        server = MockGeocodingServer().start()
+        self.addCleanup(server.stop)
+        argv = ["geoloc_util.py", "--base-url", server.url, "--format", "csv", "--locations", "12345", "Madison, XX"]
+        with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            CommandLineInterface().run()
+
+        rows = list(csv.DictReader(StringIO(mock_stdout.getvalue())))
+        self.assertEqual([row['location'] for row in rows], ["12345", "Madison, XX"])
+        self.assertEqual(rows[1]['error'], "Invalid State Code: XX")
+        self.assertIn("Invalid location", mock_stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
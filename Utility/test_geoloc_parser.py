@@ -0,0 +1,96 @@
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from parameterized import parameterized
+from geoloc_parser import InvalidLocationError, ParsedLocation, parse_location, parse_many, parse_point
+from geoloc_util import GeoLocationUtility
+
+
+class TestParseLocation(unittest.TestCase):
+
+    @parameterized.expand([
+        ("12345", ('zip', "12345", None)),
+        ("  12345 ", ('zip', "12345", None)),
+        ("12345-6789", ('zip', "12345", None)),
+        ("123456789", ('zip', "12345", None)),
+        ("9 0 2 1 0", ('zip', "90210", None)),
+        ("<<9 0 2 1 0>>", ('zip', "90210", None)),
+        ("Columbus, OH", ('direct', "Columbus", "Ohio")),
+        ("columbus,oh", ('direct', "columbus", "Ohio")),
+        ("Columbus, Ohio", ('direct', "Columbus", "Ohio")),
+        ("Madison,WI,US", ('direct', "Madison", "Wisconsin")),
+        ("St. Louis, MO, USA", ('direct', "St. Louis", "Missouri")),
+        ("New   York, NY", ('direct', "New York", "New York")),
+        ("Coeur d'Alene, ID", ('direct', "Coeur d'Alene", "Idaho")),
+        ("San José, CA", ('direct', "San José", "California")),
+        ("Washington, DC", ('direct', "Washington", "District of Columbia")),
+        ("Washington, District of Columbia", ('direct', "Washington", "District of Columbia")),
+    ])
+    def test_valid(self, location, expected):
+        self.assertEqual(parse_location(location), ParsedLocation(*expected))
+
+    @parameterized.expand([
+        (""), ("   "), ("yellow"), ("H9G1X6"), ("234"), ("100010"), ("9021090210"), ("12%3C%3C%3E%3E345"),
+        ("Columbus OH"), ("Columbus, XX"), ("São Paulo, SP"), ("123, 123"), ("'''', ;;;;"),
+        ("Columbus, OH, CA"), ("a, b, c, d"), ("<script>alert('xss')</script>, OH"),
+    ])
+    def test_invalid(self, location):
+        with self.assertRaises(InvalidLocationError):
+            parse_location(location)
+
+    def test_not_a_string(self):
+        with self.assertRaises(InvalidLocationError):
+            parse_location(None)
+
+    def test_parse_many(self):
+        self.assertEqual(parse_many(["12345", "nope", "Columbus, OH"]),
+                         [('zip', "12345", None), None, ('direct', "Columbus", "Ohio")])
+
+
+class TestParsePoint(unittest.TestCase):
+
+    @parameterized.expand([
+        ("39.96,-83.0", (39.96, -83.0)),
+        (" 39.96 , -83 ", (39.96, -83.0)),
+        ((39.96, -83.0), (39.96, -83.0)),
+        (["-90", "180"], (-90.0, 180.0)),
+    ])
+    def test_valid(self, point, expected):
+        self.assertEqual(parse_point(point), expected)
+
+    @parameterized.expand([
+        ("",), ("39.96",), ("39.96,-83.0,1",), ("north,west",), ("91,0",), ("0,-181",), ("nan,0",),
+        ((1, 2, 3),), (None,), (12.5,),
+    ])
+    def test_invalid(self, point):
+        with self.assertRaises(InvalidLocationError):
+            parse_point(point)
+
+
+class TestUtilityValidation(unittest.TestCase):
+
+    @patch('sys.stderr', new_callable=StringIO)
+    @patch('requests.Session.get')
+    def test_invalid_location_is_not_requested(self, mock_get, mock_stderr):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        self.assertIsNone(geo_util.fetch_location_data("Columbus, XX"))
+        mock_get.assert_not_called()
+        self.assertIn("Invalid State Code: XX", mock_stderr.getvalue())
+
+    def test_get_statecode_from_state_raises(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        self.assertEqual(geo_util.get_statecode_from_state("oh"), "Ohio")
+        with self.assertRaises(ValueError):
+            geo_util.get_statecode_from_state("XX")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_country_suffix_builds_us_query(self, mock_stdout):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        url, cache_key, query = geo_util.build_location_query("Madison, WI, US")
+        self.assertIn("/direct?q=Madison, Wisconsin&", url)
+        self.assertEqual(cache_key, "direct:madison, wisconsin")
+
+
+if __name__ == "__main__":
+    unittest.main()
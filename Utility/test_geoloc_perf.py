@@ -1,25 +1,66 @@
 import pytest
+from io import StringIO
+from geoloc_bench import make_locations
+from geoloc_cache import GeoCache
+from geoloc_mockserver import MockServerProcess
+from geoloc_polygons import StatePolygonIndex
 from geoloc_util import GeoLocationUtility
-import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# The benchmarks run against a local mock of the API (geoloc_mockserver.py), so they need
+# neither network access nor an API key and measure this code rather than internet latency.
+# geoloc_bench.py runs the full suite at larger scales and checks it against a baseline.
+
+
+@pytest.fixture(scope="module")
+def mock_api():
+    with MockServerProcess() as server:
+        yield server.url
 
 
 @pytest.mark.benchmark(group="performance")
-def test_benchmark_multiple_city_requests(benchmark):
-    geo_util = GeoLocationUtility(api_key=os.getenv("API_KEY"))
+def test_benchmark_multiple_city_requests(benchmark, mock_api):
+    geo_util = GeoLocationUtility(api_key="bench-key", base_url=mock_api)
     locations = ["Madison, WI", "Chicago, IL", "New York, NY", "Los Angeles, CA", "San Francisco, CA"]
 
     # Benchmark the process_locations method with a large number of requests
-    benchmark(lambda: geo_util.process_locations(locations))
+    results = benchmark(lambda: geo_util.process_locations(locations, stream=StringIO()))
+    assert all(result['data'] for result in results)
 
 
 @pytest.mark.benchmark(group="performance")
-def test_benchmark_large_zip_codes(benchmark):
-    geo_util = GeoLocationUtility(api_key=os.getenv("API_KEY"))
+def test_benchmark_large_zip_codes(benchmark, mock_api):
+    geo_util = GeoLocationUtility(api_key="bench-key", base_url=mock_api)
     zip_codes = ["12345", "10001", "94105", "60601", "30303"]
 
     # Benchmark the process_locations method with a large number of zip codes
-    benchmark.pedantic(lambda: geo_util.process_locations(zip_codes))
\ No newline at end of file
+    benchmark.pedantic(lambda: geo_util.process_locations(zip_codes, stream=StringIO()), rounds=5)
+
+
+@pytest.mark.benchmark(group="batch")
+def test_benchmark_concurrent_batch(benchmark, mock_api):
+    geo_util = GeoLocationUtility(api_key="bench-key", base_url=mock_api, pool_size=16)
+    locations = make_locations(200)
+
+    results = benchmark.pedantic(lambda: geo_util.resolve_many(locations, max_concurrency=16), rounds=3)
+    assert len(results) == 200
+
+
+@pytest.mark.benchmark(group="batch")
+def test_benchmark_cached_batch(benchmark, mock_api):
+    geo_util = GeoLocationUtility(api_key="bench-key", base_url=mock_api, cache=GeoCache())
+    locations = make_locations(200)
+    geo_util.resolve_many(locations)  # Warm the cache
+
+    benchmark(lambda: geo_util.resolve_many(locations, max_concurrency=1))
+
+
+@pytest.mark.benchmark(group="reverse")
+def test_benchmark_offline_reverse_batch(benchmark):
+    state = {'type': 'Feature', 'properties': {'name': 'Ohio'},
+             'geometry': {'type': 'Polygon', 'coordinates': [[[-84.8, 38.4], [-80.5, 38.9], [-80.5, 41.9],
+                                                              [-84.8, 41.7], [-84.8, 38.4]]]}}
+    geo_util = GeoLocationUtility(api_key="bench-key", state_index=StatePolygonIndex([state]), offline=True)
+    points = [(39.0 + (number % 250) * 0.01, -84.7 + (number // 250) * 0.01) for number in range(30000)]
+
+    results = benchmark.pedantic(lambda: geo_util.reverse_many(points), rounds=3)
+    assert all(result['data'][0]['state'] == 'Ohio' for result in results)
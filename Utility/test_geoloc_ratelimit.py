@@ -0,0 +1,111 @@
+import json
+import time
+import unittest
+from email.utils import formatdate
+from unittest.mock import patch, MagicMock
+from geoloc_ratelimit import RetryPolicy, TokenBucket, parse_rate
+from geoloc_util import GeoLocationUtility
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_throttle(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+        self.assertEqual(bucket._reserve(), 0.0)
+        self.assertEqual(bucket._reserve(), 0.0)
+        # The third request has to wait for a token to be earned at 2 per second
+        self.assertAlmostEqual(bucket._reserve(), 0.5, places=2)
+        self.assertAlmostEqual(bucket._reserve(), 1.0, places=2)
+
+    def test_acquire_holds_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # One token up front, then ten more at 50 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10"), 10.0)
+        self.assertEqual(parse_rate("10/s"), 10.0)
+        self.assertEqual(parse_rate("600/min"), 10.0)
+        self.assertEqual(parse_rate("3600/h"), 1.0)
+        with self.assertRaises(ValueError):
+            parse_rate("10/fortnight")
+        with self.assertRaises(ValueError):
+            parse_rate("0/s")
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retryable_statuses(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.retryable(429))
+        self.assertTrue(policy.retryable(503))
+        self.assertFalse(policy.retryable(200))
+        self.assertFalse(policy.retryable(404))
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(backoff_base=1.0, backoff_max=5.0)
+        for attempt in range(10):
+            delay = policy.delay(attempt)
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, min(5.0, 2 ** attempt))
+
+    def test_retry_after_seconds_and_date(self):
+        policy = RetryPolicy(backoff_max=60.0)
+        self.assertEqual(policy.delay(0, "7"), 7.0)
+        self.assertAlmostEqual(policy.delay(0, formatdate(time.time() + 20, usegmt=True)), 20, delta=2)
+        self.assertEqual(policy.delay(0, "120"), 60.0)
+
+
+class TestGeoLocationUtilityRetry(unittest.TestCase):
+
+    def mock_response(self, status_code, data=None, headers=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.content = b"" if data is None else json.dumps(data).encode()
+        return response
+
+    @patch('geoloc_util.time.sleep')
+    @patch('requests.Session.get')
+    def test_retries_5xx_then_succeeds(self, mock_get, mock_sleep):
+        mock_get.side_effect = [
+            self.mock_response(503),
+            self.mock_response(429, headers={'Retry-After': '1'}),
+            self.mock_response(200, {'zip': '12345', 'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396}),
+        ]
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        result = geo_util.fetch_location_data("12345")
+
+        self.assertEqual(result[0]['name'], "Schenectady")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(mock_sleep.call_args_list[1].args, (1.0,))
+
+    @patch('requests.Session.get')
+    def test_not_found_is_not_retried(self, mock_get):
+        mock_get.return_value = self.mock_response(404, {'cod': '404', 'message': 'not found'})
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        result = geo_util.fetch_location_data("12341")
+
+        self.assertEqual(result, [{'cod': '404', 'message': 'not found'}])
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_rate_limiter_is_used_for_every_attempt(self, mock_get):
+        mock_get.return_value = self.mock_response(200, [{'name': 'Columbus', 'state': 'Ohio'}])
+        rate_limiter = MagicMock()
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", rate_limiter=rate_limiter)
+
+        geo_util.fetch_location_data("Columbus, OH")
+        geo_util.fetch_location_data("Chicago, IL")
+
+        self.assertEqual(rate_limiter.acquire.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
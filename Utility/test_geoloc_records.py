@@ -0,0 +1,158 @@
+import copy
+import importlib.util
+import json
+import math
+import pickle
+import tracemalloc
+import unittest
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_records import ApiError, Location, LocationBatch, encode_default, to_records
+from geoloc_util import GeoLocationUtility
+
+BOSTON = {
+    'name': 'Boston',
+    'local_names': {'ru': 'Бостон', 'fr': 'Boston', 'nl': 'Boston', 'fi': 'Boston', 'de': 'Boston', 'ro': 'Boston',
+                    'pt': 'Boston', 'es': 'Boston', 'sv': 'Boston', 'ja': 'ボストン', 'ga': 'Bostún', 'ar': 'بوسطن',
+                    'zh': '波士顿', 'he': 'בוסטון', 'sr': 'Бостон', 'oc': 'Boston', 'en': 'Boston', 'it': 'Boston',
+                    'fa': 'بوستون', 'mk': 'Бостон', 'uk': 'Бостон', 'pl': 'Boston', 'ko': '보스턴', 'eo': 'Bostono',
+                    'bn': 'বোস্টন', 'ta': 'பாஸ்டன்'},
+    'lat': 42.3554334,
+    'lon': -71.060511,
+    'country': 'US',
+    'state': 'Massachusetts',
+}
+
+ZIP = {'zip': '12345', 'name': 'Schenectady', 'lat': 42.8142, 'lon': -73.9396, 'country': 'US'}
+
+
+class TestLocation(unittest.TestCase):
+
+    def test_reads_like_the_response(self):
+        record = Location.from_dict(ZIP)
+
+        self.assertEqual(record['name'], 'Schenectady')
+        self.assertEqual(record.get('state', 'Unknown'), 'Unknown')
+        self.assertNotIn('state', record)
+        self.assertNotIn('cod', record)
+        self.assertEqual(record, ZIP)
+        self.assertEqual(dict(record.items()), ZIP)
+        with self.assertRaises(KeyError):
+            record['state']
+
+    def test_state_can_be_filled_in(self):
+        record = Location.from_dict(ZIP)
+        record['state'] = 'New York'
+
+        self.assertEqual(record.state, 'New York')
+        self.assertEqual(record.to_dict(), dict(ZIP, state='New York'))
+        with self.assertRaises(KeyError):
+            record['population'] = 1
+
+    def test_unused_fields_are_dropped(self):
+        record = Location.from_dict(dict(BOSTON, population=650000))
+        self.assertEqual(record, BOSTON)
+
+    def test_local_names_are_decoded_on_access(self):
+        record = Location.from_dict(BOSTON)
+
+        self.assertIsInstance(record._local_names, bytes)
+        self.assertEqual(record['local_names']['ja'], 'ボストン')
+        self.assertEqual(record.local_names, BOSTON['local_names'])
+
+    def test_error_payloads_become_api_errors(self):
+        records = to_records([BOSTON, {'cod': '404', 'message': 'not found'}])
+
+        self.assertIsInstance(records[0], Location)
+        self.assertIsInstance(records[1], ApiError)
+        self.assertEqual(records[1], {'cod': '404', 'message': 'not found'})
+        self.assertEqual(records[1].status, 404)
+        self.assertEqual(to_records({'cod': 401, 'message': 'Invalid API key.'}), [ApiError(401, 'Invalid API key.')])
+        self.assertIsNone(to_records(None))
+
+    def test_local_names_can_be_left_out(self):
+        record = Location.from_dict(BOSTON, local_names=False)
+
+        self.assertNotIn('local_names', record)
+        self.assertEqual(record, {key: value for key, value in BOSTON.items() if key != 'local_names'})
+
+    def test_copies_and_json(self):
+        record = Location.from_dict(BOSTON)
+
+        self.assertEqual(pickle.loads(pickle.dumps(record)), BOSTON)
+        self.assertEqual(copy.deepcopy(record), BOSTON)
+        self.assertEqual(json.loads(json.dumps([record], default=encode_default)), [BOSTON])
+
+    def test_uses_a_fraction_of_the_memory(self):
+        encoded = json.dumps([BOSTON])
+
+        def traced_size(decode):
+            tracemalloc.start()
+            try:
+                kept = [decode(encoded) for _ in range(1000)]  # Kept alive while measured
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        dict_size = traced_size(json.loads)
+        record_size = traced_size(lambda text: to_records(json.loads(text)))
+        self.assertLess(record_size, dict_size / 4)
+
+
+class TestLocationBatch(unittest.TestCase):
+
+    RESULTS = [
+        {'location': "Boston, MA", 'data': to_records([BOSTON]), 'error': None},
+        {'location': "12345", 'data': [dict(ZIP, state='New York')], 'error': None},
+        {'location': "00000", 'data': [{'cod': '404', 'message': 'not found'}], 'error': None},
+        {'location': "Nowhere, OH", 'data': None, 'error': None},
+        {'location': "54321", 'data': None, 'error': "deadline exceeded"},
+    ]
+
+    def test_columns(self):
+        batch = LocationBatch.from_results(self.RESULTS)
+        columns = batch.columns()
+
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(list(columns), list(LocationBatch.COLUMNS))
+        self.assertEqual(columns['name'], ['Boston', 'Schenectady', None, None, None])
+        self.assertEqual(columns['state'], ['Massachusetts', 'New York', None, None, None])
+        self.assertEqual(columns['zip'], [None, '12345', None, None, None])
+        self.assertEqual(columns['error'], [None, None, 'not found', 'not found', 'deadline exceeded'])
+        self.assertEqual(columns['lat'].typecode, 'd')
+        self.assertEqual(columns['lat'][1], 42.8142)
+        self.assertTrue(math.isnan(columns['lon'][4]))
+
+    def test_rows(self):
+        rows = list(LocationBatch.from_results(self.RESULTS).rows())
+
+        self.assertEqual(rows[1], {'location': "12345", 'name': 'Schenectady', 'state': 'New York', 'country': 'US',
+                                   'lat': 42.8142, 'lon': -73.9396, 'zip': '12345', 'error': None})
+        self.assertIsNone(rows[2]['lat'])
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), "numpy is not installed")
+    def test_to_numpy(self):
+        arrays = LocationBatch.from_results(self.RESULTS).to_numpy()
+
+        self.assertEqual(str(arrays['lat'].dtype), 'float64')
+        self.assertEqual(arrays['name'][0], 'Boston')
+
+
+class TestUtilityRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        self.geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url)
+        self.addCleanup(self.geo_util.close)
+
+    def test_results_hold_locations(self):
+        results = self.geo_util.resolve_many(["12345", "Columbus, OH"])
+
+        self.assertTrue(all(isinstance(result['data'][0], Location) for result in results))
+        self.assertIsNotNone(results[0]['data'][0]['state'])  # Filled in by the enrichment pass
+        batch = LocationBatch.from_results(results)
+        self.assertEqual(batch.name, ["Town 12345", "Columbus"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_cache import GeoCache
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_polygons import PolygonIndex, StatePolygonIndex
+from geoloc_util import CommandLineInterface, GeoLocationUtility
+
+SQUARE_STATE = {
+    'type': 'Feature',
+    'properties': {'name': 'Ohio'},
+    'geometry': {'type': 'Polygon', 'coordinates': [[[-84, 38], [-80, 38], [-80, 42], [-84, 42], [-84, 38]]]},
+}
+
+TOWN = {
+    'type': 'Feature',
+    'properties': {'name': 'Columbus'},
+    'geometry': {'type': 'Polygon', 'coordinates': [[[-83.2, 39.8], [-82.8, 39.8], [-82.8, 40.1], [-83.2, 40.1],
+                                                     [-83.2, 39.8]]]},
+}
+
+
+class TestReverseMany(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+
+    def utility(self, **kwargs):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, **kwargs)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    def test_nearby_points_share_one_lookup(self):
+        points = ["39.96001,-83.00002", (39.96004, -83.00001), "39.9614,-83.0", "39.96001,-83.00002"]
+
+        results = self.utility().reverse_many(points, max_concurrency=4)
+
+        self.assertEqual(self.server.requests['/reverse'], 2)
+        self.assertEqual([result['location'] for result in results],
+                         ["39.96001,-83.00002", "39.96004,-83.00001", "39.9614,-83.0", "39.96001,-83.00002"])
+        self.assertEqual(results[0]['data'], results[1]['data'])
+        self.assertEqual(results[0]['data'][0]['lat'], 39.96)
+        self.assertNotEqual(results[0]['data'], results[2]['data'])
+
+    def test_snapped_points_share_the_cache(self):
+        geo_util = self.utility(cache=GeoCache(), reverse_precision=2)
+        geo_util.reverse_many(["40.001,-83.001"])
+        results = geo_util.reverse_many(["40.004,-82.998", "39.996,-83.003"])
+
+        self.assertEqual(self.server.requests['/reverse'], 1)
+        self.assertTrue(all(result['data'] for result in results))
+
+    def test_invalid_points_are_not_requested(self):
+        results = self.utility().reverse_many(["north,west", "91,0", "39.96,-83.0"])
+
+        self.assertEqual(self.server.requests['/reverse'], 1)
+        self.assertIn("Invalid coordinates", results[0]['error'])
+        self.assertIn("out of range", results[1]['error'])
+        self.assertIsNone(results[2]['error'])
+
+    def test_polygon_indexes_answer_offline(self):
+        metrics = Metrics()
+        geo_util = self.utility(state_index=StatePolygonIndex([SQUARE_STATE]), place_index=PolygonIndex([TOWN]),
+                                metrics=metrics)
+
+        results = geo_util.reverse_many(["39.96,-83.0", "39.0,-81.0", "45.0,-90.0"])
+
+        self.assertEqual(results[0]['data'], [{'name': "Columbus", 'lat': 39.96, 'lon': -83.0, 'country': 'US',
+                                               'state': "Ohio"}])
+        # Outside every known place, and outside every state: both are left to the API
+        self.assertEqual(self.server.requests['/reverse'], 2)
+        self.assertEqual(metrics.counters['offline_hits'], 1)
+
+    def test_state_index_alone(self):
+        geo_util = self.utility(state_index=StatePolygonIndex([SQUARE_STATE]))
+
+        results = geo_util.reverse_many(["39.0,-81.0"])
+
+        self.assertEqual(results[0]['data'], [{'lat': 39.0, 'lon': -81.0, 'country': 'US', 'state': "Ohio"}])
+        self.assertEqual(self.server.requests['/reverse'], 0)
+
+    def test_reverse_iter(self):
+        points = (f"{30 + number * 0.01:.2f},-90" for number in range(600))
+
+        results = list(self.utility().reverse_iter(points, max_concurrency=4, chunk_size=256))
+
+        self.assertEqual(len(results), 600)
+        self.assertEqual(results[-1]['location'], "35.99,-90")
+        self.assertEqual(self.server.requests['/reverse'], 600)
+
+    def test_async_utility(self):
+        async def reverse():
+            async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url,
+                                               state_index=StatePolygonIndex([SQUARE_STATE])) as geo_util:
+                return await geo_util.reverse_many(["39.0,-81.0", "45.00001,-90.0", "45.0,-90.00001", "x"])
+
+        results = asyncio.run(reverse())
+
+        self.assertEqual(results[0]['data'][0]['state'], "Ohio")
+        self.assertEqual(results[1]['data'], results[2]['data'])
+        self.assertIsNotNone(results[3]['error'])
+        self.assertEqual(self.server.requests['/reverse'], 1)
+
+    def test_cli_reverse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, "points.csv")
+            with open(input_path, 'w', encoding='utf-8') as input_file:
+                input_file.write("lat,lon\n39.96,-83.0\n39.96001,-83.0\n")
+            argv = ["geoloc_util.py", "--base-url", self.server.url, "--reverse", "--input", input_path,
+                    "--format", "jsonl", "--concurrency", "2"]
+            with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                    patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                CommandLineInterface().run()
+
+        rows = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+        self.assertEqual([row['location'] for row in rows], ["39.96, -83.0", "39.96001, -83.0"])
+        self.assertEqual(rows[0]['state'], rows[1]['state'])
+        self.assertEqual(self.server.requests['/reverse'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
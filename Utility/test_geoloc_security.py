@@ -1,6 +1,6 @@
-import pytest
 import unittest
 import os
+from io import StringIO
 from unittest.mock import patch
 from dotenv import load_dotenv
 from geoloc_util import GeoLocationUtility
@@ -11,7 +11,7 @@ load_dotenv()
 
 class TestGeoLocationUtilitySecurity(unittest.TestCase):
     # Test for input sanitization (e.g., checking for XSS or other malicious input)
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_input_validation_city(self, mock_get):
         mock_get.return_value.status_code = 200
         geo_util = GeoLocationUtility(api_key=os.getenv("API_KEY"))
@@ -21,20 +21,41 @@ class TestGeoLocationUtilitySecurity(unittest.TestCase):
         assert result is None
 
     # Test for rate-limiting behavior (simulate too many requests)
-    @patch('requests.get')
-    def test_rate_limiting(self, mock_get):
+    @patch('geoloc_util.time.sleep')
+    @patch('requests.Session.get')
+    def test_rate_limiting(self, mock_get, mock_sleep):
         mock_get.return_value.status_code = 429  # Too Many Requests
+        mock_get.return_value.headers = {'Retry-After': '2'}
         geo_util = GeoLocationUtility(api_key=os.getenv("API_KEY"))
 
         result = geo_util.fetch_location_data("Madison, WI")
         assert result is None
 
+        # The 429 is retried (honoring Retry-After) before giving up, and the body is never decoded
+        assert mock_get.call_count == geo_util.retry_policy.max_retries + 1
+        assert all(call.args == (2.0,) for call in mock_sleep.call_args_list)
+        mock_get.return_value.json.assert_not_called()
+
     # Test for checking API key leakage in logs or error messages
-    @patch('requests.get')
-    def test_api_key_security(self, mock_get):
+    @patch('sys.stderr', new_callable=StringIO)
+    @patch('requests.Session.get')
+    def test_api_key_security(self, mock_get, mock_stderr):
         mock_get.return_value.status_code = 403  # Forbidden (invalid API key)
+        mock_get.return_value.content = b'{"cod": 403, "message": "Forbidden"}'
         geo_util = GeoLocationUtility(api_key="invalid_api_key")
 
         # Ensure that the API key isn't exposed in logs or errors
-        with pytest.raises(Exception):
-            geo_util.fetch_location_data("Madison,WI,US")
+        result = geo_util.fetch_location_data("Madison,WI,US")
+        assert result == [{'cod': 403, 'message': 'Forbidden'}]
+        assert "invalid_api_key" not in mock_stderr.getvalue()
+        assert "invalid_api_key" not in geo_util.location_key("Madison,WI,US")
+
+    # Input that can't be a location is rejected before any request is sent
+    @patch('sys.stderr', new_callable=StringIO)
+    @patch('requests.Session.get')
+    def test_invalid_input_never_reaches_the_api(self, mock_get, mock_stderr):
+        geo_util = GeoLocationUtility(api_key=os.getenv("API_KEY"))
+
+        for location in ["", "Madison, XX", "12345' OR '1'='1", "../../etc/passwd, WI", "Madison, WI, FR"]:
+            assert geo_util.fetch_location_data(location) is None
+        mock_get.assert_not_called()
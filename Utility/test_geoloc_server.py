@@ -0,0 +1,231 @@
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_cache import GeoCache
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_server import GeoLocationServer, UnixGeoLocationServer
+from geoloc_util import GeoLocationUtility, parse_address
+
+UTILITY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def request(connection, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = connection.getresponse()
+    payload = response.read()
+    if response.getheader('Content-Type', '').startswith('application/json'):
+        payload = json.loads(payload)
+    return response.status, payload
+
+
+class TestGeoLocationServer(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = MockGeocodingServer().start()
+        self.addCleanup(self.mock.stop)
+        self.geo_util = GeoLocationUtility(api_key="test-key", base_url=self.mock.url, cache=GeoCache(),
+                                           metrics=Metrics())
+        self.addCleanup(self.geo_util.close)
+        self.server = GeoLocationServer(self.geo_util, max_batch=5).start()
+        self.addCleanup(self.server.stop)
+        host, port = self.server.server_address[:2]
+        self.connection = http.client.HTTPConnection(host, port, timeout=10)
+        self.addCleanup(self.connection.close)
+
+    def test_single_lookup(self):
+        status, body = request(self.connection, 'GET', "/lookup?location=12345")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['location'], "12345")
+        self.assertEqual(body['data'][0]['name'], "Town 12345")
+        self.assertIsNotNone(body['data'][0]['state'])
+
+    def test_warm_cache_is_shared_between_requests(self):
+        request(self.connection, 'GET', "/lookup?location=Columbus,%20OH")
+        other = http.client.HTTPConnection(*self.server.server_address[:2], timeout=10)
+        self.addCleanup(other.close)
+        status, body = request(other, 'GET', "/lookup?location=columbus,%20ohio")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data'][0]['name'], "Columbus")
+        self.assertEqual(self.mock.requests['/direct'], 1)
+
+    def test_batch_lookup(self):
+        status, body = request(self.connection, 'POST', "/lookup",
+                               {'locations': ["12345", "Columbus, OH", "12345", "nowhere"]})
+
+        self.assertEqual(status, 200)
+        results = body['results']
+        self.assertEqual([result['location'] for result in results], ["12345", "Columbus, OH", "12345", "nowhere"])
+        self.assertEqual(results[0]['data'], results[2]['data'])
+        self.assertIsNone(results[3]['data'])
+        self.assertEqual(self.mock.requests['/zip'], 1)  # Repeats in a batch are looked up once
+
+    def test_batch_lookup_by_query_string(self):
+        status, body = request(self.connection, 'GET', "/lookup?location=12345&location=54321")
+        self.assertEqual(status, 200)
+        self.assertEqual([result['data'][0]['zip'] for result in body['results']], ["12345", "54321"])
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_bad_requests(self, mock_stdout):
+        self.assertEqual(request(self.connection, 'GET', "/lookup")[0], 400)
+        self.assertEqual(request(self.connection, 'POST', "/lookup", {'locations': "12345"})[0], 400)
+        self.assertEqual(request(self.connection, 'POST', "/lookup", {'locations': ["12345"] * 6})[0], 413)
+        self.assertEqual(request(self.connection, 'GET', "/nope")[0], 404)
+
+        self.connection.request('POST', "/lookup", body=b"{not json")
+        response = self.connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+        self.assertEqual(request(self.connection, 'GET', "/healthz"), (200, {'status': 'ok'}))
+
+    def test_bad_content_length(self):
+        for length in ["abc", "-1"]:
+            self.connection.putrequest('POST', "/lookup")
+            self.connection.putheader('Content-Length', length)
+            self.connection.endheaders()
+            response = self.connection.getresponse()
+            self.assertEqual(response.status, 400)
+            self.assertIn(b"Content-Length", response.read())
+
+        self.assertEqual(request(self.connection, 'GET', "/healthz"), (200, {'status': 'ok'}))
+
+    def test_stats(self):
+        request(self.connection, 'GET', "/lookup?location=12345")
+
+        status, stats = request(self.connection, 'GET', "/stats")
+        self.assertEqual(status, 200)
+        self.assertEqual(stats['counters']['lookups'], 1)
+
+        status, text = request(self.connection, 'GET', "/stats?format=prometheus")
+        self.assertIn(b"geoloc_lookups_total 1\n", text)
+
+    def test_stop_finishes_requests_in_progress(self):
+        self.mock.latency = 0.3
+        outcome = {}
+        client = threading.Thread(target=lambda: outcome.update(
+            result=request(self.connection, 'GET', "/lookup?location=12345")))
+        client.start()
+        time.sleep(0.1)
+
+        self.server.stop()
+        client.join()
+        self.assertEqual(outcome['result'][0], 200)
+
+    def test_stop_closes_idle_keepalive_connections(self):
+        request(self.connection, 'GET', "/healthz")  # Leaves a keep-alive connection open
+
+        start = time.perf_counter()
+        self.server.stop()
+        self.assertLess(time.perf_counter() - start, 5)
+
+
+class TestUnixSocketServer(unittest.TestCase):
+
+    def test_lookup_over_unix_socket(self):
+        with MockGeocodingServer() as mock, tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "geoloc.sock")
+            geo_util = GeoLocationUtility(api_key="test-key", base_url=mock.url)
+            with UnixGeoLocationServer(geo_util, path):
+                connection = UnixHTTPConnection(path)
+                status, body = request(connection, 'GET', "/lookup?location=12345")
+                connection.close()
+
+            self.assertEqual(status, 200)
+            self.assertEqual(body['data'][0]['zip'], "12345")
+            self.assertFalse(os.path.exists(path))
+            geo_util.close()
+
+    def test_only_a_stale_socket_is_replaced(self):
+        geo_util = GeoLocationUtility(api_key="test-key")
+        self.addCleanup(geo_util.close)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "geoloc.sock")
+
+        with open(path, "w") as regular_file:
+            regular_file.write("keep me")
+        with self.assertRaises(FileExistsError):
+            UnixGeoLocationServer(geo_util, path)
+        with open(path) as regular_file:
+            self.assertEqual(regular_file.read(), "keep me")
+        os.unlink(path)
+
+        with UnixGeoLocationServer(geo_util, path):
+            with self.assertRaises(OSError):  # Still listening, so not taken over
+                UnixGeoLocationServer(geo_util, path)
+            self.assertTrue(os.path.exists(path))
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)  # Closed without removing its file, like a server that crashed
+        stale.close()
+        with UnixGeoLocationServer(geo_util, path):
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path))
+
+
+class TestServeCommand(unittest.TestCase):
+
+    def test_serve_until_sigterm(self):
+        with MockGeocodingServer() as mock:
+            process = subprocess.Popen(
+                [sys.executable, "geoloc_util.py", "--serve", "127.0.0.1:0", "--base-url", mock.url],
+                cwd=UTILITY_DIR, env=dict(os.environ, API_KEY="test-key"),
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            try:
+                banner = process.stderr.readline()
+                host, port = banner.rsplit("http://", 1)[1].strip().rsplit(":", 1)
+                connection = http.client.HTTPConnection(host, int(port), timeout=10)
+                status, body = request(connection, 'GET', "/lookup?location=12345")
+                connection.close()
+
+                process.send_signal(signal.SIGTERM)
+                self.assertEqual(process.wait(timeout=10), 0)
+            finally:
+                process.kill()
+                process.stderr.close()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data'][0]['zip'], "12345")
+
+
+class TestParseAddress(unittest.TestCase):
+
+    def test_addresses(self):
+        self.assertEqual(parse_address("8080"), ("127.0.0.1", 8080))
+        self.assertEqual(parse_address("0.0.0.0:8080"), ("0.0.0.0", 8080))
+        self.assertEqual(parse_address("[::1]:8080"), ("::1", 8080))
+        self.assertEqual(parse_address("unix:/tmp/geoloc.sock"), "/tmp/geoloc.sock")
+
+    def test_invalid_addresses(self):
+        for value in ("unix:", "host:port", "70000"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_address(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from geoloc_util import GeoLocationUtility
+
+
+class TestGeoLocationUtilitySession(unittest.TestCase):
+
+    def test_uses_https(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        self.assertTrue(geo_util.base_url.startswith("https://"))
+
+    def test_pool_size_is_configurable(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key", pool_size=32)
+        adapter = geo_util.session.get_adapter(geo_util.base_url)
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter._pool_connections, 32)
+
+    @patch('requests.Session.get')
+    def test_requests_share_one_session(self, mock_get):
+        mock_response = MagicMock(status_code=200)
+        mock_response.content = b'{"zip": "12345", "name": "Schenectady", "lat": 42.8142, "lon": -73.9396}'
+        mock_get.return_value = mock_response
+
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        session = geo_util.session
+        geo_util.fetch_location_data("12345")
+        geo_util.fetch_location_data("10001")
+
+        self.assertIs(geo_util.session, session)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_context_manager_closes_session(self):
+        with patch('requests.Session.close') as mock_close:
+            with GeoLocationUtility(api_key="mocked_api_key") as geo_util:
+                self.assertIsInstance(geo_util, GeoLocationUtility)
+                geo_util.session  # Created on first use
+            mock_close.assert_called_once()
+
+    def test_session_is_created_lazily(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        self.assertIsNone(geo_util._session)
+        geo_util.close()  # Nothing to close yet
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from geoloc_singleflight import SingleFlight
+from geoloc_util import GeoLocationUtility
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow_lookup(key):
+            calls.append(key)
+            release.wait(1)
+            return [{'name': key}]
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(flight.do, "zip:12345,us", slow_lookup, "12345") for _ in range(5)]
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(calls, ["12345"])
+        self.assertEqual(flight.shared, 4)
+        self.assertTrue(all(result == [{'name': '12345'}] for result in results))
+        # Waiting callers get their own copy
+        self.assertEqual(len({id(result) for result in results}), 5)
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing_lookup():
+            release.wait(1)
+            raise ValueError("upstream exploded")
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(flight.do, "key", failing_lookup) for _ in range(3)]
+            time.sleep(0.05)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+    def test_sequential_calls_are_not_merged(self):
+        flight = SingleFlight()
+        fn = MagicMock(return_value=1)
+        flight.do("key", fn)
+        flight.do("key", fn)
+        self.assertEqual(fn.call_count, 2)
+
+
+class TestLocationDeduplication(unittest.TestCase):
+
+    def test_location_key_normalization(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        keys = {geo_util.location_key(location) for location in
+                ["columbus, oh", "Columbus,OH", "Columbus, Ohio", "  COLUMBUS ,  ohio "]}
+        self.assertEqual(keys, {"direct:columbus, ohio"})
+        self.assertEqual(geo_util.location_key(" 12345 "), "zip:12345,us")
+        self.assertEqual(geo_util.location_key("Madison,WI,US"), geo_util.location_key("madison, wisconsin"))
+        self.assertIsNone(geo_util.location_key("Madison, XX"))
+
+    def test_batch_fetches_each_key_once(self):
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+        fetch = MagicMock(side_effect=lambda location: [{'name': 'Columbus', 'state': 'Ohio', 'lat': 1.0, 'lon': 2.0}])
+        locations = ["Columbus, OH", "columbus, oh", "12345", "Columbus, Ohio", "12345", "Madison,WI,US"]
+
+        with patch.object(GeoLocationUtility, 'fetch_location_data', fetch):
+            results = geo_util.resolve_many(locations, max_concurrency=4)
+
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual([result['location'] for result in results], locations)
+        self.assertEqual(results[1]['data'][0]['name'], "Columbus")
+
+        results[0]['data'][0]['name'] = "Edited"  # Each repeat has its own copy of the shared result
+        self.assertEqual(results[1]['data'][0]['name'], "Columbus")
+        self.assertIsNot(results[2]['data'], results[4]['data'])
+
+    @patch('requests.Session.get')
+    def test_concurrent_callers_share_request(self, mock_get):
+        def slow_get(url, timeout):
+            time.sleep(0.1)
+            response = MagicMock()
+            response.status_code = 200
+            response.content = b'{"zip": "12345", "name": "Schenectady", "lat": 42.8142, "lon": -73.9396}'
+            return response
+        mock_get.side_effect = slow_get
+        geo_util = GeoLocationUtility(api_key="mocked_api_key")
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(geo_util.fetch_location_data, ["12345", " 12345", "12345 ", "12345"]))
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(all(result[0]['name'] == "Schenectady" for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_cache import GeoCache
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_snapshot import Snapshot, export_snapshot, import_snapshot, write_snapshot
+from geoloc_util import CommandLineInterface
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "hot.snap")
+        self.later = time.time() + 3600
+        self.entries = [
+            ("zip:12345,us", self.later, json.dumps({'zip': '12345', 'name': "Schenectady"})),
+            ("direct:columbus, ohio", self.later, json.dumps([{'name': "Columbus", 'state': "Ohio"}])),
+            ("direct:zürich, ohio", self.later, "null"),
+            ("direct:gone, ohio", time.time() - 1, "[]"),
+        ]
+
+    def open(self):
+        snapshot = Snapshot(self.path)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_round_trip(self):
+        self.assertEqual(write_snapshot(self.entries, self.path), 4)
+        snapshot = self.open()
+
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.get_entry("direct:zürich, ohio"), (self.later, "null"))
+        self.assertEqual(json.loads(snapshot.get_entry("zip:12345,us")[1])['name'], "Schenectady")
+        self.assertIsNone(snapshot.get_entry("zip:54321,us"))
+        self.assertEqual([key for key, _, _ in snapshot.entries("direct:")],
+                         ["direct:columbus, ohio", "direct:gone, ohio", "direct:zürich, ohio"])
+
+    def test_empty_snapshot(self):
+        write_snapshot([], self.path)
+        snapshot = self.open()
+
+        self.assertEqual(len(snapshot), 0)
+        self.assertIsNone(snapshot.get_entry("zip:12345,us"))
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as bogus_file:
+            bogus_file.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+    def test_cache_reads_through_to_the_snapshot(self):
+        write_snapshot(self.entries, self.path)
+        cache = GeoCache(snapshot=self.open())
+
+        self.assertEqual(cache.get("direct:columbus, ohio"), (True, [{'name': "Columbus", 'state': "Ohio"}]))
+        self.assertEqual(cache.get("direct:zürich, ohio"), (True, None))  # Negative entries too
+        self.assertEqual(cache.get("direct:gone, ohio"), (False, None))
+        self.assertEqual(cache.get_stale("direct:gone, ohio"), (True, []))
+        self.assertEqual(cache.stats()['snapshot_hits'], 2)
+        self.assertEqual(cache.stats()['memory_entries'], 2)  # Promoted on their first hit
+
+    def test_export_prefers_the_upper_tiers(self):
+        write_snapshot(self.entries, self.path)
+        cache = GeoCache(snapshot=self.open())
+        cache.set("zip:12345,us", {'zip': '12345', 'name': "Town 12345"})
+        cache.set("zip:54321,us", {'zip': '54321', 'name': "Town 54321"})
+        layered = os.path.join(self.tmp, "layered.snap")
+
+        self.assertEqual(export_snapshot(cache, layered), 4)  # The expired entry is left out
+        with Snapshot(layered) as snapshot:
+            self.assertEqual(json.loads(snapshot.get_entry("zip:12345,us")[1])['name'], "Town 12345")
+            self.assertIsNotNone(snapshot.get_entry("direct:columbus, ohio"))
+
+    def test_import_keeps_newer_entries(self):
+        write_snapshot(self.entries, self.path)
+        cache = GeoCache(path=os.path.join(self.tmp, "cache.sqlite"), ttl=7200)
+        self.addCleanup(cache.close)
+        cache.set("zip:12345,us", {'zip': '12345', 'name': "Newer"})
+
+        self.assertEqual(import_snapshot(cache, self.path), 2)
+
+        self.assertEqual(cache.get("zip:12345,us")[1]['name'], "Newer")
+        self.assertEqual(cache.get("direct:zürich, ohio"), (True, None))
+        self.assertEqual(cache.get("direct:gone, ohio"), (False, None))
+
+
+class TestWarmCli(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def run_cli(self, *args):
+        argv = ["geoloc_util.py", "--base-url", self.server.url, *args]
+        with patch.object(sys, 'argv', argv), patch.dict('os.environ', {'API_KEY': 'test-key'}), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            CommandLineInterface().run()
+        return mock_stdout.getvalue(), mock_stderr.getvalue()
+
+    def test_warm_export_and_start_from_the_snapshot(self):
+        path = os.path.join(self.tmp, "hot.snap")
+        locations = ["--locations", "12345", "Columbus, OH", "Madison, WI"]
+
+        stdout, stderr = self.run_cli("--warm", "--export-snapshot", path, "--concurrency", "4", *locations)
+
+        self.assertEqual(stdout, "")
+        self.assertIn("Warmed the cache with 3 locations", stderr)
+        warm_requests = sum(self.server.requests.values())
+        self.assertEqual(warm_requests, 4)  # The ZIP's state came from /reverse, which is cached as well
+
+        stdout, _ = self.run_cli("--snapshot", path, "--format", "jsonl", *locations)
+
+        rows = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Town 12345", "Columbus", "Madison"])
+        self.assertIsNotNone(rows[0]['state'])
+        self.assertEqual(sum(self.server.requests.values()), warm_requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
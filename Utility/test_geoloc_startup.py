@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import unittest
+
+UTILITY_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules that only some runs need; importing geoloc_util or printing --help must not load them
+DEFERRED_MODULES = ('requests', 'urllib3', 'dotenv', 'asyncio', 'sqlite3', 'email')
+# Cumulative import time of geoloc_util, which measures about 25 ms; an eager `import requests`
+# alone takes about 100 ms, so this leaves room for a slower runner but not for a regression
+IMPORT_BUDGET_MICROSECONDS = 60000
+
+
+def import_times(*args):
+    """Runs python -X importtime with args and returns {module: cumulative microseconds}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=UTILITY_DIR,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():  # Skips the column header
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+def imported_modules(*args):
+    """Runs python -X importtime with args and returns the top-level packages it imported."""
+    return {module.split(".")[0] for module in import_times(*args)}
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_defers_heavy_modules(self):
+        modules = imported_modules("-c", "import geoloc_util")
+        self.assertIn("geoloc_util", modules)
+        self.assertEqual(modules & set(DEFERRED_MODULES), set())
+
+    def test_help_defers_heavy_modules(self):
+        modules = imported_modules("geoloc_util.py", "--help")
+        self.assertEqual(modules & set(DEFERRED_MODULES), set())
+
+    def test_import_is_fast(self):
+        # The fastest of a few runs, so one descheduled run doesn't fail the build
+        fastest = min(import_times("-c", "import geoloc_util")["geoloc_util"] for _ in range(3))
+        self.assertLess(fastest, IMPORT_BUDGET_MICROSECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest.mock import patch
+from geoloc_cache import GeoCache
+from geoloc_gazetteer import Gazetteer, build_gazetteer
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_server import GeoLocationServer
+from geoloc_suggest import CityIndex, edit_distance, normalize
+from geoloc_util import GeoLocationUtility
+
+CITIES = [
+    ("Columbus", "OH", 39.9612, -82.9988),
+    ("Columbia", "SC", 34.0007, -81.0348),
+    ("Columbiana", "OH", 40.8884, -80.6940),
+    ("Cleveland", "OH", 41.4993, -81.6944),
+    ("Cincinnati", "OH", 39.1031, -84.5120),
+    ("Springfield", "OH", 39.9242, -83.8088),
+    ("Springfield", "IL", 39.7817, -89.6501),
+    ("Springdale", "AR", 36.1867, -94.1288),
+    ("St. Louis", "MO", 38.6270, -90.1994),
+    ("Winston-Salem", "NC", 36.0999, -80.2442),
+]
+
+SAMPLE_CSV = """zip,city,state_id,lat,lng
+43215,Columbus,OH,39.9612,-82.9988
+44114,Cleveland,OH,41.4993,-81.6944
+"""
+
+
+class TestCityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CityIndex()
+        self.index.add_many(CITIES)
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  St. Louis "), "st louis")
+        self.assertEqual(normalize("Winston-Salem"), "winston salem")
+        self.assertEqual(normalize("Coeur d'Alene"), "coeur dalene")
+
+    def test_edit_distance(self):
+        self.assertEqual(edit_distance("colombus", "columbus", 2), 1)
+        self.assertEqual(edit_distance("culombus", "columbus", 2), 2)
+        self.assertEqual(edit_distance("clomubus", "columbus", 1), 2)  # Over the limit: limit + 1
+        self.assertEqual(edit_distance("cincinatti", "cincinnati", 2), 2)
+        self.assertEqual(edit_distance("colm", "columbus", 1, prefix=True), 1)
+
+    def test_prefix_in_alphabetical_order(self):
+        names = [(city['name'], city['state']) for city in self.index.suggest("colum")]
+        self.assertEqual(names, [("Columbia", "South Carolina"), ("Columbiana", "Ohio"), ("Columbus", "Ohio")])
+
+    def test_state_and_k(self):
+        self.assertEqual([city['name'] for city in self.index.suggest("col", state="OH", k=1)], ["Columbiana"])
+        self.assertEqual([city['name'] for city in self.index.suggest("spring", state="Illinois")], ["Springfield"])
+        self.assertEqual(self.index.suggest("col", state="Atlantis"), [])
+
+    def test_suggest_fills_with_near_misses(self):
+        names = [city['name'] for city in self.index.suggest("sprinfgi", k=3)]
+        self.assertEqual(names, ["Springfield", "Springfield"])  # Both states, one transposition from "springfi"
+
+    def test_records_look_like_the_api(self):
+        self.assertEqual(self.index.suggest("st lou"), [{'name': "St. Louis", 'lat': 38.627, 'lon': -90.1994,
+                                                         'country': 'US', 'state': "Missouri"}])
+
+    def test_correct(self):
+        self.assertEqual(self.index.correct("Colombus", "OH")['name'], "Columbus")
+        self.assertEqual(self.index.correct("Cincinatti")['name'], "Cincinnati")
+        self.assertEqual(self.index.correct("winston salem", "NC")['name'], "Winston-Salem")
+        self.assertIsNone(self.index.correct("Colombus", "TX"))
+        self.assertIsNone(self.index.correct("Akron", "OH"))
+        self.assertIsNone(self.index.correct("Clevelnd", "Atlantis"))
+
+    def test_ambiguous_correction_is_none(self):
+        self.index.add("Columbas", "OH", 0.0, 0.0)
+        self.assertIsNone(self.index.correct("Columbis", "OH"))  # One edit from both
+
+    def test_short_names_are_not_corrected(self):
+        self.index.add("Ada", "OH", 40.7695, -83.8227)
+        self.assertIsNone(self.index.correct("Aba", "OH"))
+
+    def test_add_ignores_duplicates_and_unknown_states(self):
+        self.assertFalse(self.index.add("columbus", "Ohio", 0.0, 0.0))
+        self.assertFalse(self.index.add("Nowhere", None, 0.0, 0.0))
+        self.assertEqual(self.index.add_many([("Dayton", "OH", 39.7589, -84.1916)] * 40), 1)
+        self.assertEqual(len(self.index), len(CITIES) + 1)
+
+    def test_from_sources(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        csv_path = os.path.join(tmp, "zips.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+        build_gazetteer(csv_path, os.path.join(tmp, "zips.gaz"))
+        gazetteer = Gazetteer(os.path.join(tmp, "zips.gaz"))
+        self.addCleanup(gazetteer.close)
+        cache = GeoCache()
+        cache.set("direct:dayton, ohio", [{'name': "Dayton", 'lat': 39.7589, 'lon': -84.1916, 'country': 'US',
+                                          'state': "Ohio"}])
+        cache.set("direct:nowhere, ohio", None)
+
+        index = CityIndex.from_sources(gazetteer, cache)
+
+        self.assertEqual([city['name'] for city in index.suggest("c")], ["Cleveland", "Columbus"])
+        self.assertEqual(index.correct("Daytin", "OH")['name'], "Dayton")
+
+
+class TestCorrection(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer().start()
+        self.addCleanup(self.server.stop)
+        stderr = patch('sys.stderr', new_callable=StringIO)
+        stderr.start()
+        self.addCleanup(stderr.stop)
+        self.index = CityIndex()
+        self.index.add_many(CITIES)
+
+    def utility(self, **kwargs):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, city_index=self.index, **kwargs)
+        self.addCleanup(geo_util.close)
+        return geo_util
+
+    def gazetteer(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        csv_path = os.path.join(tmp, "zips.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+        build_gazetteer(csv_path, os.path.join(tmp, "zips.gaz"))
+        gazetteer = Gazetteer(os.path.join(tmp, "zips.gaz"))
+        self.addCleanup(gazetteer.close)
+        return gazetteer
+
+    def test_misspelled_city_is_answered_without_a_request(self):
+        gazetteer = self.gazetteer()
+        self.index = CityIndex.from_sources(gazetteer)
+        metrics = Metrics()
+
+        results = self.utility(gazetteer=gazetteer, metrics=metrics).resolve_many(["Colombus, OH", "Akron, OH"])
+
+        self.assertEqual(results[0]['data'][0]['name'], "Columbus")
+        self.assertEqual(results[0]['data'][0]['lat'], 39.9612)
+        self.assertEqual(self.server.requests['/direct'], 1)  # Only Akron
+        self.assertEqual(metrics.counters['corrected'], 1)
+
+    def test_learned_cities_do_not_preempt_the_api(self):
+        self.index.add("Austin", "TX", 30.2672, -97.7431)
+        geo_util = self.utility()
+
+        self.assertIsNone(geo_util.lookup_offline("Justin, TX"))
+        self.assertEqual(geo_util.fetch_location_data("Justin, TX")[0]['name'], "Justin")
+        self.assertEqual(self.server.requests['/direct'], 1)
+
+    def test_corrected_once_the_api_finds_nothing(self):
+        metrics = Metrics()
+        geo_util = self.utility(metrics=metrics)
+
+        with patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.content = b"[]"
+            result = geo_util.fetch_location_data("Colombus, OH")
+
+        self.assertEqual(result[0]['name'], "Columbus")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(metrics.counters['corrected'], 1)
+
+    def test_cities_found_by_the_api_are_learned(self):
+        geo_util = self.utility()
+        geo_util.resolve_many(["Akron, OH"])
+
+        self.assertEqual(self.index.suggest("akr", state="OH")[0]['name'], "Akron")
+
+    def test_suggest_route(self):
+        server = GeoLocationServer(self.utility()).start()
+        self.addCleanup(server.stop)
+        connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+        self.addCleanup(connection.close)
+
+        connection.request('GET', "/suggest?q=colu&state=OH&k=5")
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual([city['name'] for city in json.loads(response.read())], ["Columbiana", "Columbus"])
+
+        connection.request('GET', "/suggest?k=5")
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
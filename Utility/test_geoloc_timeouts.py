@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest.mock import MagicMock, patch
+from geoloc_async import AsyncGeoLocationUtility
+from geoloc_backends import BackendRouter, MockBackend
+from geoloc_metrics import Metrics
+from geoloc_mockserver import MockGeocodingServer
+from geoloc_timeouts import DeadlineExceeded, HedgePolicy, deadline, propagate, remaining, request_timeout
+from geoloc_util import GeoLocationUtility
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_request_timeout_is_cut_short_by_the_deadline(self):
+        self.assertEqual(request_timeout(5, 10), (5, 10))
+        with deadline(2):
+            connect, read = request_timeout(5, 10)
+            self.assertLessEqual(read, 2)
+            self.assertEqual(connect, read)
+        with deadline(0.0), self.assertRaises(DeadlineExceeded):
+            request_timeout(5, 10)
+
+    def test_nested_deadlines_keep_the_earliest(self):
+        with deadline(1):
+            with deadline(60):
+                self.assertLessEqual(remaining(), 1)
+            with deadline(None):
+                self.assertLessEqual(remaining(), 1)
+        self.assertIsNone(remaining())
+
+    def test_propagate_to_worker_threads(self):
+        with deadline(30), ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertIsNone(executor.submit(remaining).result())
+            self.assertGreater(executor.submit(propagate(remaining)).result(), 29)
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def test_delay_follows_the_percentile(self):
+        hedge = HedgePolicy(percentile=0.9, initial_delay=2.0, min_samples=20)
+        self.assertEqual(hedge.delay(), 2.0)
+        for number in range(1, 33):
+            hedge.observe(number / 100)
+        self.assertAlmostEqual(hedge.delay(), 0.29)
+
+    def test_budget(self):
+        hedge = HedgePolicy(max_ratio=0.1, min_samples=20)
+        self.assertEqual(sum(hedge.should_hedge() for _ in range(10)), 2)
+        for _ in range(100):
+            hedge.observe(0.01)
+        self.assertEqual(sum(hedge.should_hedge() for _ in range(10)), 8)
+
+
+class TestRequestTimeouts(unittest.TestCase):
+
+    @patch('requests.Session.get')
+    def test_connect_and_read_timeouts(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, ok=True, content=b'[{"name": "X"}]')
+        geo_util = GeoLocationUtility(api_key="test-key", connect_timeout=1.5, read_timeout=4)
+
+        geo_util.fetch_location_data("Columbus, OH")
+        self.assertEqual(mock_get.call_args.kwargs['timeout'], (1.5, 4))
+
+
+class TestBatchDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockGeocodingServer(latency=0.1).start()
+        self.addCleanup(self.server.stop)
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_read_timeout(self, mock_stderr):
+        self.server.latency = 0.5
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, read_timeout=0.05)
+        self.addCleanup(geo_util.close)
+
+        start = time.perf_counter()
+        self.assertIsNone(geo_util.fetch_location_data("12345"))
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertIn("Read timed out", mock_stderr.getvalue())
+
+    def test_sync_batch_deadline(self):
+        geo_util = GeoLocationUtility(api_key="test-key", base_url=self.server.url, batch_deadline=0.35)
+        self.addCleanup(geo_util.close)
+        locations = [f"{10000 + number}" for number in range(10)]
+
+        start = time.perf_counter()
+        results = geo_util.resolve_many(locations, max_concurrency=1)
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertIsNotNone(results[0]['data'])
+        self.assertEqual(results[-1]['error'], "deadline exceeded")
+        self.assertEqual([result['location'] for result in results], locations)
+
+    def test_async_batch_deadline(self):
+        async def resolve():
+            async with AsyncGeoLocationUtility(api_key="test-key", base_url=self.server.url, max_concurrency=1,
+                                               batch_deadline=0.35) as geo_util:
+                return await geo_util.resolve_many([f"{10000 + number}" for number in range(10)])
+
+        results = asyncio.run(resolve())
+        self.assertIsNotNone(results[0]['data'])
+        self.assertEqual(results[-1]['error'], "deadline exceeded")
+
+
+    def test_in_process_backends_keep_the_deadline(self):
+        backend = MockBackend(latency=0.1)
+        geo_util = GeoLocationUtility(api_key=None, router=BackendRouter([backend]), batch_deadline=0.25)
+        self.addCleanup(geo_util.close)
+        locations = [f"{10000 + number}" for number in range(10)]
+
+        results = geo_util.resolve_many(locations, max_concurrency=1)
+        self.assertIsNotNone(results[0]['data'])
+        self.assertEqual(results[-1]['error'], "deadline exceeded")
+        self.assertLess(backend.requests['/zip'], 5)
+
+
+class TestHedgedRequests(unittest.TestCase):
+
+    def test_slow_request_is_hedged(self):
+        calls = []
+        lock = threading.Lock()
+
+        def get(url, timeout):
+            with lock:
+                calls.append(url)
+                first = len(calls) == 1
+            time.sleep(1.0 if first else 0.01)  # Only the first copy stalls
+            return MagicMock(status_code=200, ok=True, content=b'{"zip": "12345", "name": "X"}')
+
+        metrics = Metrics()
+        geo_util = GeoLocationUtility(api_key="test-key", metrics=metrics, hedge=HedgePolicy(initial_delay=0.05))
+        self.addCleanup(geo_util.close)
+        with patch.object(geo_util.session, 'get', side_effect=get):
+            start = time.perf_counter()
+            data = geo_util.fetch_location_data("12345")
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(data[0]['name'], "X")
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(metrics.counters['hedges'], 1)
+        self.assertEqual(metrics.counters['hedge_wins'], 1)
+
+    def test_fast_request_is_not_hedged(self):
+        with MockGeocodingServer() as server:
+            geo_util = GeoLocationUtility(api_key="test-key", base_url=server.url,
+                                          hedge=HedgePolicy(initial_delay=1.0))
+            geo_util.fetch_location_data("12345")
+            geo_util.close()
+            self.assertEqual(server.requests['/zip'], 1)
+            self.assertEqual(geo_util.hedge.hedges, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()